@@ -0,0 +1,151 @@
+"""
+Agreement of the stabilizer backend with NetSquid.
+
+The "fast" backend (see fast_backend.py) runs the unmodified `GraphStateDistribution`
+programs on a stabilizer tableau with the NetSquid noise and timing models. `agreement`
+runs the same seeded star requests on both backends and compares, per request:
+
+- the distribution of every leaf's Bell-state case and of every merge measurement outcome
+  of the center, by their total variation distance,
+- the mean simulated duration, by its relative difference,
+- the classical messages, which do not depend on the random outcomes and must match exactly.
+
+Requires NetSquid and SquidASM; without them (as in the test suite's default environment)
+the check is skipped, so the agreement is only established where it has been run. Usage::
+
+    python backend_agreement.py network_configs/smallworld_config_ideal.yaml --requests 5 --leaves 3 --seeds 50
+"""
+import argparse
+import random
+from collections import Counter
+
+import numpy as np
+
+from yaml_to_nx import node_order, yaml_to_nx
+
+
+def random_requests(config_file, count, num_leaves, seed=0):
+    """
+    Seeded star requests on the nodes of a network configuration.
+
+    :return: List of (center, leaves) tuples.
+    """
+    nodes = sorted(yaml_to_nx(config_file).nodes(), key=node_order)
+    rng = random.Random(seed)
+    requests = []
+    for _ in range(count):
+        selection = rng.sample(nodes, min(num_leaves + 1, len(nodes)))
+        requests.append((selection[0], selection[1:]))
+    return requests
+
+
+def total_variation(a, b):
+    """
+    Total variation distance between the empirical distributions of two samples.
+    """
+    counts_a, counts_b = Counter(a), Counter(b)
+    return 0.5 * sum(abs(counts_a[value] / len(a) - counts_b[value] / len(b)) for value in counts_a | counts_b)
+
+
+def compare_runs(runs_a, runs_b):
+    """
+    Compare the results of the same request and seeds on two backends.
+
+    :param runs_a: Results of `batch_runner.StarRequestRunner.run_request`, one per seed.
+    :param runs_b: Results of the same request and seeds on the other backend.
+    :return: Dictionary with the largest total variation distance of the "cases" and "outcomes"
+        distributions over the positions of the star, the relative difference of the mean
+        "sim_time" and the mean "messages" of both backends.
+    """
+    def distance(key):
+        positions = len(runs_a[0][key])
+        return max((total_variation([run[key][i] for run in runs_a], [run[key][i] for run in runs_b])
+                    for i in range(positions)), default=0.)
+
+    sim_time_a = np.mean([run["sim_time"] for run in runs_a])
+    sim_time_b = np.mean([run["sim_time"] for run in runs_b])
+    return {
+        "cases": distance("cases"),
+        "outcomes": distance("outcomes"),
+        "sim_time": float(abs(sim_time_a / sim_time_b - 1) if sim_time_b else abs(sim_time_a)),
+        "messages": (float(np.mean([run["messages"] for run in runs_a])),
+                     float(np.mean([run["messages"] for run in runs_b]))),
+    }
+
+
+def agreement(config_file, requests, seeds=range(50), **runner_kwargs):
+    """
+    Run requests on the "fast" and the NetSquid backend with the same seeds and compare them.
+
+    :param config_file: Path to the YAML network configuration.
+    :param requests: List of (center, leaves) tuples, e.g. from `random_requests`.
+    :param seeds: Seeds every request runs with on both backends.
+    :param runner_kwargs: Passed on to both `batch_runner.StarRequestRunner` (e.g. protocol).
+    :return: List of dictionaries with the request's "center" and "leaves" and the comparison
+        of `compare_runs`.
+    """
+    from batch_runner import StarRequestRunner
+
+    runners = {backend: StarRequestRunner(config_file, backend=backend, **runner_kwargs)
+               for backend in ("fast", "netsquid")}
+    report = []
+    for center, leaves in requests:
+        runs = {backend: [runner.run_request(center, leaves, seed=seed) for seed in seeds]
+                for backend, runner in runners.items()}
+        report.append({"center": center, "leaves": leaves, **compare_runs(runs["fast"], runs["netsquid"])})
+    return report
+
+
+def disagreements(report, max_distance=0.2, max_time_error=0.05):
+    """
+    Requests of an `agreement` report on which the backends disagree.
+
+    :param max_distance: Largest total variation distance of the case and outcome distributions.
+    :param max_time_error: Largest relative difference of the mean simulated duration.
+    :return: List of (row, reason) tuples.
+    """
+    failures = []
+    for row in report:
+        for key in ("cases", "outcomes"):
+            if row[key] > max_distance:
+                failures.append((row, f"{key} distributions differ by {row[key]:.3f}"))
+        if row["sim_time"] > max_time_error:
+            failures.append((row, f"sim_time differs by {row['sim_time']:.1%}"))
+        if row["messages"][0] != row["messages"][1]:
+            failures.append((row, f"messages {row['messages'][0]:g} (fast) / {row['messages'][1]:g} (netsquid)"))
+    return failures
+
+
+def main():
+    import sys
+
+    import tracing
+
+    parser = argparse.ArgumentParser(description="Compare the stabilizer backend with NetSquid on seeded star requests.")
+    parser.add_argument("configs", nargs="+", help="YAML network configurations.")
+    parser.add_argument("--requests", type=int, default=5, help="Random star requests per configuration.")
+    parser.add_argument("--leaves", type=int, default=3, help="Leaves of every request.")
+    parser.add_argument("--seeds", type=int, default=50, help="Runs of every request per backend.")
+    parser.add_argument("--protocol", default="sequential", choices=["sequential", "fusion"])
+    parser.add_argument("--max-distance", type=float, default=0.2,
+                        help="Largest total variation distance of the case and outcome distributions.")
+    parser.add_argument("--max-time-error", type=float, default=0.05,
+                        help="Largest relative difference of the mean simulated duration.")
+    args = parser.parse_args()
+
+    tracing.disable()
+    failed = False
+    for config_file in args.configs:
+        report = agreement(config_file, random_requests(config_file, args.requests, args.leaves),
+                           range(args.seeds), protocol=args.protocol)
+        for row in report:
+            print(f"{config_file} {row['center']} -> {len(row['leaves'])} leaves: cases {row['cases']:.3f}, "
+                  f"outcomes {row['outcomes']:.3f}, sim_time {row['sim_time']:.1%}, messages {row['messages']}")
+        for row, reason in disagreements(report, args.max_distance, args.max_time_error):
+            failed = True
+            print(f"DISAGREE {config_file} {row['center']} -> {row['leaves']}: {reason}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
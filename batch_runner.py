@@ -0,0 +1,545 @@
+import json
+import os
+import random
+import time
+from collections import defaultdict
+
+import numpy as np
+import netsquid as ns
+
+from squidasm.run.stack.config import CLinkConfig, LinkConfig, StackNetworkConfig
+from squidasm.run.stack.run import run
+
+from fast_backend import FastNetwork
+import graphapplication
+from graphapplication import GraphStateDistribution
+from memprofile import MemoryProfiler, fast_inspector, netsquid_inspector
+from planner import GraphPlanner
+from profiling import profile_program, write_profiles
+from results import config_hash
+from routing import DynamicTopology, RoutingTable, routes_file
+from verification import star_qubits, tableau_graph_verification, tableau_verification
+from watchdog import FastTimer, NetSquidTimer, SimulationStalled
+from yaml_to_nx import node_order, yaml_to_nx
+
+
+def get_peers(cfg: StackNetworkConfig):
+    """
+    Build the sorted list of directly connected peers of every node in the network configuration.
+    """
+    peers = defaultdict(set)
+    for link in cfg.links:
+        peers[link.stack1].add(link.stack2)
+        peers[link.stack2].add(link.stack1)
+    for node in peers:
+        peers[node] = sorted(peers[node], key=node_order)
+    return peers
+
+
+# squidasm versions whose `run` is `_setup_network` followed by `_run` (see `run_keeping_network`)
+SQUIDASM_PRIVATE_API = ("0.12.", "0.13.")
+
+
+def _squidasm_private_api():
+    """
+    squidasm's stack run module, after checking that its private API is the one
+    `run_keeping_network` relies on.
+    """
+    import importlib
+
+    import squidasm
+
+    stack_run = importlib.import_module("squidasm.run.stack.run")
+
+    version = getattr(squidasm, "__version__", "unknown")
+    if not version.startswith(SQUIDASM_PRIVATE_API):
+        raise RuntimeError(f"Memory profiling on NetSquid supports squidasm {', '.join(v + 'x' for v in SQUIDASM_PRIVATE_API)}, "
+                           f"not {version}")
+    return stack_run
+
+
+def run_keeping_network(cfg: StackNetworkConfig, programs: dict, on_setup=None):
+    """
+    Run the programs once like squidasm's `run`, keeping the stack network to inspect it.
+
+    squidasm offers no public access to the network of a run, so this is the one place that
+    uses its private `_setup_network` and `_run`, for the versions in `SQUIDASM_PRIVATE_API`.
+
+    :param cfg: The stack network configuration.
+    :param programs: Dictionary node name -> program.
+    :param on_setup: Optional function called with the stack network before the run starts.
+    :return: Tuple (results as returned by `run`, stack network).
+    """
+    stack_run = _squidasm_private_api()
+    stack_network = stack_run._setup_network(cfg)
+    if on_setup is not None:
+        on_setup(stack_network)
+    for name, program in programs.items():
+        stack_network.stacks[name].host.enqueue_program(program, 1)
+    return stack_run._run(stack_network), stack_network
+
+
+def link_cutoffs(cfg: StackNetworkConfig, cutoff=None):
+    """
+    Cutoff time (ns) of every link of the network configuration that has one.
+
+    A link's own ``cutoff_time`` in its ``cfg`` is used unless `cutoff` sets it, as a dictionary
+    (a, b) -> cutoff time of single links or a cutoff time for all links.
+
+    :return: Dictionary (stack1, stack2) -> cutoff time, or None if no link has one.
+    """
+    cutoffs = {}
+    for link in cfg.links:
+        link_cfg = link.cfg if isinstance(link.cfg, dict) else vars(link.cfg or {})
+        if isinstance(cutoff, dict):
+            value = cutoff.get((link.stack1, link.stack2), cutoff.get((link.stack2, link.stack1)))
+        else:
+            value = cutoff
+        if value is None:
+            value = link_cfg.get("cutoff_time")
+        if value is not None:
+            cutoffs[(link.stack1, link.stack2)] = value
+    return cutoffs or None
+
+
+def read_requests(filename):
+    """
+    Read star graph requests from a JSONL file.
+
+    Every non-empty line is a JSON object with a "center" node, a list of "leaves" and,
+    optionally, a "seed" and an "id". Requests without an id are numbered by line. A graph
+    request has a list of "edges" ([a, b] node pairs) instead of a center and leaves. Lines
+    with an "event" change the topology for the requests that follow (see
+    `StarRequestRunner.apply_event`).
+
+    :param filename: Path to the JSONL request file.
+    :return: A generator of request dictionaries.
+    """
+    with open(filename, 'r') as f:
+        for line_number, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            request = json.loads(line)
+            request.setdefault("id", line_number)
+            request.setdefault("seed", None)
+            yield request
+
+
+def netsquid_events():
+    """
+    Events processed by the NetSquid simulator since its last `ns.sim_reset()`, from `ns.sim_stats()`.
+    """
+    return int(ns.sim_stats().data["events_processed"])
+
+
+class StarRequestRunner:
+    """
+    Run a stream of star graph requests on one network inside a single process.
+
+    The stack configuration, the topology graph, the routing table and the node programs
+    are built once; the routing table is loaded from `routing.routes_file` if it was
+    precomputed next to the configuration (see topologies.py). Each request then only resets
+    the simulation state (time, events and random state) before running, so the setup cost
+    is shared by all requests.
+
+    Note that squidasm's `run` instantiates the network components from the configuration
+    on every call, since they hold the simulation state that has to start fresh.
+
+    Links can fail or be added between requests (`fail_link`, `add_link`). The topology is
+    a `routing.DynamicTopology`, so only the routes through a changed link are recomputed,
+    and its subscribers (the node programs' peers, the backend's links and the planner's
+    cached routes) follow every change. A request always runs to completion on the topology
+    it started with.
+
+    :param config_file: Path to the YAML network configuration.
+    :param aggregate_messages: Passed on to every `GraphStateDistribution` program.
+    :param backend: "netsquid" to run on squidasm/NetSquid, or "fast" to run the same programs
+        on the stabilizer-tableau backend (see fast_backend.py).
+    :param verify: If True, verify the produced star state after every request (see
+        verification.py): exactly from the tableau on the "fast" backend, and by local
+        measurements, alternating between the two settings per request, on NetSquid.
+    :param protocol: Star generation protocol of the node programs, "sequential" or "fusion"
+        (see `GraphStateDistribution`).
+    :param profile_dir: If given, profile the node programs (see profiling.py) and write the
+        profiles of every request to a numbered subdirectory ``run_<n>`` of this directory.
+    :param watchdog: Optional `watchdog.Watchdog` watching the node programs, whose `timer` is
+        set for the backend. A request whose programs stall then raises `watchdog.SimulationStalled`.
+    :param memory_profile: If True, sample the process RSS, the live qubits of every node and
+        the size of the largest combined quantum state after every protocol step (see
+        memprofile.py), and add the peaks and samples to every result as "memory".
+    :param early_swap: Passed on to every `GraphStateDistribution` program: generate the links of
+        every EPR chain in two rounds and swap as soon as a repeater's pairs are there.
+    :param cutoff: Cutoff time (ns) after which an unused EPR pair is discarded and generated
+        again, for every link, or a dictionary (a, b) -> cutoff time of single links. The
+        `GraphStateDistribution` programs apply it to the pairs of their EPR chains on NetSquid
+        (see `GraphStateDistribution.any_node_epr_pair`); the "fast" backend discards expired
+        pairs itself, also those held after a chain (see fast_backend.py).
+    :param redundancy: Passed on to every `GraphStateDistribution` program: number of node-disjoint
+        routes every leaf attachment tries at once (see `GraphStateDistribution.attach_pair`).
+    :param loss: Probability that a generated EPR pair is lost, for every link, or a dictionary
+        (a, b) -> loss probability of single links (see fast_backend.py). Only supported by the
+        "fast" backend.
+    """
+
+    def __init__(self, config_file: str, aggregate_messages: bool = True, backend: str = "netsquid",
+                 verify: bool = False, protocol: str = "sequential", profile_dir: str = None, watchdog=None,
+                 memory_profile: bool = False, early_swap: bool = False, cutoff=None, redundancy: int = 1,
+                 loss=None):
+        if backend not in ("netsquid", "fast"):
+            raise ValueError(f"Unknown backend {backend!r}")
+        self.config_file = config_file
+        self.config_hash = config_hash(config_file)
+        self.backend = backend
+        self.verify = verify
+        self._verify_counts = defaultdict(int)
+        self.G = yaml_to_nx(config_file)
+        if os.path.exists(routes_file(config_file)):
+            self.routing = RoutingTable.load(self.G, routes_file(config_file))
+        else:
+            self.routing = RoutingTable(self.G)
+        self.topology = DynamicTopology(self.G, self.routing)
+        self.topology.subscribe(self._topology_changed)
+        if isinstance(cutoff, dict):
+            for a, b in cutoff:
+                if not self.G.has_edge(a, b):
+                    raise ValueError(f"No link between {a} and {b}")
+        program_cutoff = None
+        if backend == "fast":
+            self.cfg = None
+            self.network = FastNetwork(config_file)
+            self.peers = self.network.peers
+            nodes = list(self.network.devices)
+            for name, value in (("cutoff", cutoff), ("prob_loss", loss)):
+                if isinstance(value, dict):
+                    for (a, b), link_value in value.items():
+                        if frozenset((a, b)) not in self.network.links:
+                            raise ValueError(f"No link between {a} and {b}")
+                        setattr(self.network.links[frozenset((a, b))], name, link_value)
+            self.network.cutoff = None if isinstance(cutoff, dict) else cutoff
+            self.network.loss = None if isinstance(loss, dict) else loss
+        elif loss is not None:
+            raise ValueError("Link losses are only supported by the fast backend")
+        else:
+            self.cfg = StackNetworkConfig.from_file(config_file)
+            self.network = None
+            # The programs discard expired pairs, the fast backend does natively
+            program_cutoff = link_cutoffs(self.cfg, cutoff)
+            self.peers = get_peers(self.cfg)
+            nodes = [stack.name for stack in self.cfg.stacks]
+        self.programs = {
+            node: GraphStateDistribution(node_name=node, peer_names=self.peers[node], graph=self.G,
+                                         routing=self.routing, aggregate_messages=aggregate_messages,
+                                         protocol=protocol, early_swap=early_swap, redundancy=redundancy,
+                                         cutoff=program_cutoff)
+            for node in nodes
+        }
+        self._planner = None
+        self.profile_dir = profile_dir
+        self.profilers = None
+        self._profiled_runs = 0
+        if profile_dir is not None:
+            self.profilers = {node: profile_program(program) for node, program in self.programs.items()}
+        self.watchdog = watchdog
+        if watchdog is not None:
+            watchdog.timer = FastTimer(self.network) if backend == "fast" else NetSquidTimer()
+            for program in self.programs.values():
+                watchdog.watch(program)
+        self.memory_profiler = None
+        if memory_profile:
+            self.memory_profiler = MemoryProfiler()
+            for program in self.programs.values():
+                self.memory_profiler.watch(program)
+            if backend == "fast":
+                self.memory_profiler.inspector = fast_inspector(self.network)
+            else:
+                # Fail before the first run on an unsupported squidasm version
+                _squidasm_private_api()
+
+    @property
+    def planner(self):
+        """
+        `planner.GraphPlanner` for the graph requests on this network, built on first use.
+        """
+        if self._planner is None:
+            self._planner = GraphPlanner(self.config_file, routing=self.routing, network=self.network)
+        return self._planner
+
+    def fail_link(self, a: str, b: str):
+        """
+        Remove the quantum and classical link between `a` and `b` for the following requests.
+
+        :return: The `routing.TopologyChange`, listing the sources whose routes changed.
+        """
+        for network in self._fast_networks():
+            network.remove_link(a, b)
+        if self.cfg is not None:
+            self.cfg.links = [link for link in self.cfg.links if {link.stack1, link.stack2} != {a, b}]
+            self.cfg.clinks = [clink for clink in self.cfg.clinks if {clink.stack1, clink.stack2} != {a, b}]
+        return self.topology.fail_link(a, b)
+
+    def add_link(self, a: str, b: str, typ: str = "perfect", cfg: dict = None,
+                 clink_typ: str = None, clink_cfg: dict = None):
+        """
+        Add a quantum and a classical link between `a` and `b` for the following requests.
+
+        :param typ: Type of the quantum link, as in the ``links`` of a network configuration.
+        :param cfg: Configuration of the quantum link.
+        :param clink_typ: Type of the classical link. By default "instant" for a perfect link and
+            otherwise "default" with the length of the quantum link, as in topologies.py.
+        :param clink_cfg: Configuration of the classical link.
+        :return: The `routing.TopologyChange`, listing the sources whose routes changed.
+        """
+        if clink_typ is None:
+            clink_typ = "instant" if typ == "perfect" else "default"
+            clink_cfg = None if typ == "perfect" else {"length": (cfg or {}).get("length", 0)}
+        for network in self._fast_networks():
+            network.add_link(a, b, typ, cfg, clink_typ, clink_cfg)
+        if self.cfg is not None:
+            self.cfg.links.append(LinkConfig(stack1=a, stack2=b, typ=typ, cfg=cfg))
+            self.cfg.clinks.append(CLinkConfig(stack1=a, stack2=b, typ=clink_typ, cfg=clink_cfg))
+        return self.topology.add_link(a, b)
+
+    def apply_event(self, event: dict):
+        """
+        Apply a topology event read from a requests file: ``{"event": "fail_link", "link": [a, b]}``
+        or ``{"event": "add_link", "link": [a, b], "typ": ..., "cfg": ...}`` (optionally with
+        "clink_typ" and "clink_cfg", see `add_link`).
+
+        :return: The `routing.TopologyChange`.
+        """
+        a, b = event["link"]
+        if event["event"] == "fail_link":
+            return self.fail_link(a, b)
+        if event["event"] == "add_link":
+            return self.add_link(a, b, typ=event.get("typ", "perfect"), cfg=event.get("cfg"),
+                                 clink_typ=event.get("clink_typ"), clink_cfg=event.get("clink_cfg"))
+        raise ValueError(f"Unknown topology event {event['event']!r}")
+
+    def _fast_networks(self):
+        networks = [self.network] if self.network is not None else []
+        if self._planner is not None and self._planner.model.network is not self.network:
+            networks.append(self._planner.model.network)
+        return networks
+
+    def _topology_changed(self, change):
+        self.peers = self.network.peers if self.network is not None else get_peers(self.cfg)
+        for a, b in (change.link, change.link[::-1]):
+            program = self.programs[a]
+            program.peer_names = self.peers[a]
+            setattr(program, f"csocket_{b}", None)
+            setattr(program, f"epr_socket_{b}", None)
+        if self._planner is not None:
+            self._planner.model.invalidate(change.affected)
+
+    def run_request(self, center: str, leaves: list, seed=None):
+        """
+        Generate one star graph state.
+
+        :param center: The center node of the star.
+        :param leaves: The leaf nodes of the star, in integration order.
+        :param seed: Seed for the backend's and Python's random number generators. If None the
+            random state simply continues from the previous request.
+        :return: Dictionary with the simulated and wall-clock duration, the classical traffic, the
+            center's merge measurement outcomes and step completion times, and the final Bell-state
+            case (packed, see `messages.pack_case`), the duration ("chain_latencies", ns) and the
+            number of rounds ("attachment_rounds") of every leaf's attachment, and the EPR pairs discarded
+            at the cutoff ("epr_discarded"). On the "fast" backend, also the EPR pairs generated
+            ("epr_pairs") and lost ("epr_lost"). With verification,
+            also the exact "generator_values" and "fidelity" ("fast" backend) or the "verify_setting"
+            and the "verify_outcomes" of the star qubits, center first (NetSquid).
+        """
+        verify_setting = None
+        if self.verify and self.backend == "netsquid":
+            key = (center, tuple(leaves))
+            verify_setting = self._verify_counts[key] % 2
+            self._verify_counts[key] += 1
+        for program in self.programs.values():
+            program.set_request(center, leaves, verify_setting=verify_setting)
+
+        node_results, sim_time, wall_time = self._simulate(seed)
+        result = {
+            "sim_time": sim_time,
+            "wall_time": wall_time,
+            "messages": sum(result["messages"] for result in node_results.values()),
+            "payloads": sum(result["payloads"] for result in node_results.values()),
+            "outcomes": node_results[center]["outcomes"],
+            "cases": [node_results[leaf]["cases"][0] for leaf in leaves],
+            "step_times": node_results[center]["step_times"],
+            "chain_latencies": node_results[center]["chain_latencies"],
+            "attachment_rounds": node_results[center]["attachment_rounds"],
+            "epr_discarded": self._discarded(node_results),
+        }
+        if self.backend == "fast":
+            result.update(epr_pairs=self.network.stats["epr_pairs"], epr_lost=self.network.stats["epr_lost"])
+        if self.memory_profiler is not None:
+            result["memory"] = self.memory_profiler.summary()
+        if self.verify and self.backend == "fast":
+            qubits = star_qubits(self.programs, center, leaves)
+            values, fidelity = tableau_verification(self.network.tableau, qubits[0].index,
+                                                    [qubit.index for qubit in qubits[1:]])
+            result.update(generator_values=values.tolist(), fidelity=fidelity)
+        elif self.verify:
+            result.update(verify_setting=verify_setting,
+                          verify_outcomes=[node_results[node]["verify_outcome"] for node in [center] + leaves])
+        return result
+
+    def _discarded(self, node_results):
+        """
+        EPR pairs discarded at the cutoff in the last run, by the programs or the "fast" backend.
+        """
+        discarded = sum(result["discarded"] for result in node_results.values())
+        if self.backend == "fast":
+            discarded += self.network.stats["epr_discarded"]
+        return discarded
+
+    def run_graph_request(self, plan, seed=None):
+        """
+        Generate an arbitrary graph state following a plan of `planner.GraphPlanner`.
+
+        :param plan: `planner.GraphPlan` of the request.
+        :param seed: As for `run_request`.
+        :return: Dictionary with the simulated and wall-clock duration, the classical traffic, the
+            time every exchange of the plan completed on all nodes, the duration ("chain_latencies", ns)
+            and number of rounds ("attachment_rounds") of every attachment, by start node, the EPR pairs
+            discarded at the cutoff ("epr_discarded"), and on the "fast" backend the EPR pairs generated
+            ("epr_pairs") and lost ("epr_lost"). With verification on the "fast" backend, also the exact
+            "generator_values" (in the order of the plan's target vertices) and "fidelity" of
+            the requested graph state; NetSquid runs are not verified.
+        """
+        for program in self.programs.values():
+            program.set_request(None, [], layers=plan.layers, corrections=plan.corrections)
+
+        node_results, sim_time, wall_time = self._simulate(seed)
+        result = {
+            "sim_time": sim_time,
+            "wall_time": wall_time,
+            "messages": sum(result["messages"] for result in node_results.values()),
+            "payloads": sum(result["payloads"] for result in node_results.values()),
+            "step_times": [max(times) for times in zip(*(result["step_times"] for result in node_results.values()))],
+            "chain_latencies": [latency for result in node_results.values() for latency in result["chain_latencies"]],
+            "attachment_rounds": [rounds for result in node_results.values() for rounds in result["attachment_rounds"]],
+            "epr_discarded": self._discarded(node_results),
+        }
+        if self.backend == "fast":
+            result.update(epr_pairs=self.network.stats["epr_pairs"], epr_lost=self.network.stats["epr_lost"])
+        if self.memory_profiler is not None:
+            result["memory"] = self.memory_profiler.summary()
+        if self.verify and self.backend == "fast":
+            qubits = {node: self.programs[node].graph_qubit.index for node in plan.target.vertices}
+            values, fidelity = tableau_graph_verification(self.network.tableau, qubits, plan.target.edges())
+            result.update(generator_values=values.tolist(), fidelity=fidelity)
+        return result
+
+    def _simulate(self, seed=None):
+        """
+        Run the node programs on the current requests.
+
+        :return: Tuple (dictionary node -> program result, simulated time, wall time).
+        """
+        if seed is not None:
+            random.seed(seed)
+            np.random.seed(seed)
+        if self.watchdog is not None:
+            self.watchdog.reset()
+        if self.memory_profiler is not None:
+            self.memory_profiler.reset()
+        if self.backend == "fast":
+            wall_start = time.perf_counter()
+            try:
+                node_results = self.network.run(self.programs, seed=seed)
+            except RuntimeError as error:
+                if self.watchdog is not None and not isinstance(error, SimulationStalled):
+                    # Blocked programs: raise with the waits of the nodes instead
+                    self.watchdog.check()
+                raise
+            wall_time = time.perf_counter() - wall_start
+            sim_time = self.network.stats["sim_time"]
+        else:
+            ns.sim_reset()
+            if seed is not None:
+                ns.set_random_state(seed=seed)
+            wall_start = time.perf_counter()
+            if self.memory_profiler is None:
+                stack_results = run(config=self.cfg, programs=self.programs, num_times=1)
+            else:
+                def inspect(stack_network):
+                    self.memory_profiler.inspector = netsquid_inspector(stack_network)
+                stack_results, _ = run_keeping_network(self.cfg, self.programs, on_setup=inspect)
+            wall_time = time.perf_counter() - wall_start
+            if self.watchdog is not None:
+                self.watchdog.check()
+            node_results = {results[0]["name"]: results[0] for results in stack_results}
+            sim_time = ns.sim_time()
+
+        if self.profilers is not None:
+            events = self.network.stats["events"] if self.backend == "fast" else netsquid_events()
+            write_profiles(self.profilers, os.path.join(self.profile_dir, f"run_{self._profiled_runs:05d}"), events)
+            for profiler in self.profilers.values():
+                profiler.reset()
+            self._profiled_runs += 1
+        return node_results, sim_time, wall_time
+
+    def run_example(self, seed=None):
+        """
+        Run the example star request defined in graphapplication.py (see `run_request`).
+        """
+        return self.run_request(graphapplication.center, graphapplication.leaves, seed=seed)
+
+    def run_record(self, request: dict):
+        """
+        Run one star or graph request (see `read_requests`) and build its result record.
+
+        :return: Dictionary with the request's id, seed, the configuration hash and the result of
+            `run_request` or `run_graph_request`. With a watchdog, a stalled request instead gets an
+            "error" and the waits of its nodes (see `watchdog.SimulationStalled`).
+        """
+        try:
+            if "edges" in request:
+                plan = self.planner.plan([tuple(edge) for edge in request["edges"]])
+                result = self.run_graph_request(plan, seed=request.get("seed"))
+                record = {"id": request.get("id"), "edges": request["edges"], "stars": plan.stars,
+                          "seed": request.get("seed"), "config_hash": self.config_hash, **result}
+            else:
+                result = self.run_request(request["center"], request["leaves"], seed=request.get("seed"))
+                record = {"id": request.get("id"), "center": request["center"], "leaves": request["leaves"],
+                          "seed": request.get("seed"), "config_hash": self.config_hash, **result}
+        except SimulationStalled as stall:
+            record = {"id": request.get("id"), "seed": request.get("seed"), "config_hash": self.config_hash,
+                      "error": "stalled", **stall.to_dict()}
+        if self.topology.version:
+            record["topology_version"] = self.topology.version
+        return record
+
+    def run_requests(self, requests, output_file, store=None):
+        """
+        Run requests back to back and append one JSON line per finished request to `output_file`.
+        With a watchdog, a stalled request gets a line with an "error" and the waits of its
+        nodes instead (see `watchdog.SimulationStalled`), and the batch goes on.
+
+        :param requests: Iterable of request dictionaries, e.g. from `read_requests`.
+        :param output_file: Path of the JSONL results file. Results are flushed after every request.
+        :param store: Optional `results.ResultsStore` that additionally receives every run record.
+        :return: Number of requests run.
+        """
+        count = 0
+        with open(output_file, 'a') as out:
+            for request in requests:
+                if "event" in request:
+                    change = self.apply_event(request)
+                    out.write(json.dumps({"id": request.get("id"), "event": request["event"],
+                                          "link": list(change.link), "topology_version": change.version,
+                                          "rerouted_sources": len(change.affected)}) + "\n")
+                    out.flush()
+                    continue
+                record = self.run_record(request)
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                if "error" in record:
+                    continue
+                if store is not None:
+                    store.append(record)
+                count += 1
+        if store is not None:
+            store.flush()
+        return count
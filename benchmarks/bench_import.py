@@ -0,0 +1,67 @@
+"""
+Measure the import time of the simulation entry points in fresh interpreters.
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_import --repeat 5 graphapplication batch_runner yaml_to_nx
+
+Each module is imported ``--repeat`` times in a new ``python -X importtime`` process. The
+script reports the median cumulative import time, the slowest top-level dependencies and
+whether matplotlib was loaded, which simulation workers should never need.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+
+def import_profile(module):
+    """
+    Import `module` in a fresh interpreter.
+
+    :return: Tuple (cumulative time of `module` in microseconds, {package: cumulative us},
+        whether matplotlib ended up in sys.modules).
+    """
+    code = f"import sys, {module}; print('matplotlib' in sys.modules)"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          capture_output=True, text=True, check=True)
+    packages = {}
+    total = None
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, raw_name = line[len("import time:"):].split("|")
+        cumulative, name = cumulative.strip(), raw_name.strip()
+        if not cumulative.isdigit():
+            continue
+        # Nesting is encoded as two spaces of indentation per level
+        depth = (len(raw_name) - len(raw_name.lstrip()) - 1) // 2
+        if depth == 0 and name == module:
+            total = int(cumulative)
+        elif depth == 1:
+            packages[name] = int(cumulative)
+    return total, packages, proc.stdout.strip() == "True"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=["graphapplication", "batch_runner", "yaml_to_nx"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="Number of slowest dependencies to list.")
+    args = parser.parse_args()
+
+    for module in args.modules:
+        try:
+            runs = [import_profile(module) for _ in range(args.repeat)]
+        except subprocess.CalledProcessError as error:
+            print(f"{module}: import failed\n{error.stderr.strip().splitlines()[-1]}")
+            continue
+        median_ms = statistics.median(total for total, _, _ in runs) / 1000
+        print(f"{module}: {median_ms:.1f} ms (median of {args.repeat}), matplotlib loaded: {runs[-1][2]}")
+        slowest = sorted(runs[-1][1].items(), key=lambda item: item[1], reverse=True)[:args.top]
+        for name, cumulative in slowest:
+            print(f"    {name:<40} {cumulative / 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Compare classical traffic and simulated time of a star request with and without
+per-hop message aggregation.
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_messages --config network_configs/smallworld_config_noisy.yaml \
+        --center node_1 --leaves node_0 node_3 node_8
+
+With ``--plan-only`` the synchronization traffic is counted from the routes alone,
+without running a simulation (only networkx is needed in that case). ``--backend fast``
+simulates on the stabilizer backend (fast_backend.py) instead of NetSquid.
+"""
+import argparse
+
+import tracing
+from messages import FrameSchedule
+from routing import RoutingTable
+from yaml_to_nx import yaml_to_nx
+
+
+def planned_sync_traffic(G, center, leaves, aggregate):
+    """
+    Count the classical messages and payload hops spent on step synchronization.
+
+    :return: Tuple (messages, payload hops) summed over all steps of the request.
+    """
+    routing = RoutingTable(G)
+    messages = 0
+    payloads = 0
+    for leaf in leaves:
+        if aggregate:
+            for node in G.nodes():
+                schedule = FrameSchedule(node, routing, broadcasts=[center, leaf])
+                messages += schedule.num_frames()
+                payloads += schedule.num_payloads()
+        else:
+            for source in (center, leaf):
+                hops = sum(len(routing.path(source, node)) - 1 for node in G.nodes() if node != source)
+                messages += hops
+                payloads += hops
+    return messages, payloads
+
+
+def simulate(config_file, center, leaves, aggregate, backend="netsquid"):
+    """
+    Run one star request and return (simulated time, messages sent, payload hops sent).
+
+    :param backend: "netsquid" or "fast", as in StarRequestRunner.
+    """
+    from batch_runner import StarRequestRunner
+
+    runner = StarRequestRunner(config_file, backend=backend, aggregate_messages=aggregate)
+    result = runner.run_request(center, leaves, seed=0)
+    return result["sim_time"], result["messages"], result["payloads"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="network_configs/network_config_noisy.yaml")
+    parser.add_argument("--center", default="node_1")
+    parser.add_argument("--leaves", nargs="+", default=["node_0", "node_3", "node_8"])
+    parser.add_argument("--plan-only", action="store_true", help="Count synchronization traffic without simulating.")
+    parser.add_argument("--backend", default="netsquid", choices=["netsquid", "fast"],
+                        help="Simulate with NetSquid, or with the stabilizer-tableau backend (fast_backend.py).")
+    args = parser.parse_args()
+    tracing.disable()
+
+    G = yaml_to_nx(args.config)
+    print(f"{args.config}: center {args.center}, {len(args.leaves)} leaves")
+    for aggregate in (False, True):
+        label = "aggregated" if aggregate else "per-message"
+        messages, payloads = planned_sync_traffic(G, args.center, args.leaves, aggregate)
+        print(f"  {label:>11} sync traffic: {messages} messages, {payloads} payload hops")
+        if not args.plan_only:
+            sim_time, messages, payloads = simulate(args.config, args.center, args.leaves, aggregate, args.backend)
+            print(f"  {label:>11} simulation:   {sim_time:.0f} ns, {messages} messages, {payloads} payload hops")
+
+
+if __name__ == "__main__":
+    main()
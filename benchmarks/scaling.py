@@ -0,0 +1,219 @@
+"""
+Scaling benchmark of star graph generation across topology size and number of leaves.
+
+Usage (from the repository root):
+
+    python -m benchmarks.scaling run --output benchmarks/baseline.json
+    python -m benchmarks.scaling run --sizes 10 100 --leaves 2 10 --output current.json
+    python -m benchmarks.scaling compare benchmarks/baseline.json current.json --tolerance 0.25
+
+``run`` generates seeded topologies (see topologies.py), writes each one as a network
+configuration and runs one star request per (topology, size, leaves) case on the chosen
+backend. It records the wall time (best of ``--repeat``), the peak traced memory of one
+extra run, and the simulated time, EPR pairs and classical messages of the request, and
+writes everything as JSON, with the backend and the environment in its "meta" entry.
+``benchmarks/baseline.json`` is such a file for the "fast" backend.
+
+``compare`` matches the cases of two such files, and refuses files of different backends.
+Wall time and peak memory regress when they grow by more than the relative tolerance (wall
+times under ``--min-time`` are ignored as noise); the simulated quantities are seeded and
+must match exactly, so any change is reported. The exit status is 1 if anything regressed,
+and 2 if the files cannot be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import tracing
+from topologies import TOPOLOGIES, write_network
+
+TIMED_METRICS = ("wall_time", "peak_memory")
+EXACT_METRICS = ("sim_time", "epr_pairs", "messages")
+
+
+def pick_request(num_nodes, num_leaves, seed):
+    """
+    Seeded choice of a center and `num_leaves` distinct leaves.
+    """
+    nodes = random.Random(seed).sample(range(num_nodes), num_leaves + 1)
+    return f"node_{nodes[0]}", [f"node_{node}" for node in nodes[1:]]
+
+
+def run_case(topology, num_nodes, num_leaves, seed, backend, noisy, repeat, directory):
+    """
+    Benchmark one star request on a freshly generated topology.
+
+    :return: Dictionary with the case parameters and the measured metrics.
+    """
+    from batch_runner import StarRequestRunner
+
+    config_file = os.path.join(directory, f"{topology}_{num_nodes}.yaml")
+    if not os.path.exists(config_file):
+        links = TOPOLOGIES[topology](num_nodes, seed=seed)
+        write_network(config_file, num_nodes, links, noisy=noisy)
+
+    setup_start = time.perf_counter()
+    runner = StarRequestRunner(config_file, backend=backend)
+    setup_time = time.perf_counter() - setup_start
+    center, leaves = pick_request(num_nodes, num_leaves, seed)
+
+    wall_times = []
+    for _ in range(repeat):
+        result = runner.run_request(center, leaves, seed=seed)
+        wall_times.append(result["wall_time"])
+
+    tracemalloc.start()
+    runner.run_request(center, leaves, seed=seed)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "topology": topology,
+        "nodes": num_nodes,
+        "leaves": num_leaves,
+        "seed": seed,
+        "backend": backend,
+        "setup_time": setup_time,
+        "wall_time": min(wall_times),
+        "peak_memory": peak_memory,
+        "sim_time": result["sim_time"],
+        "epr_pairs": runner.network.stats["epr_pairs"] if runner.network is not None else None,
+        "messages": result["messages"],
+    }
+
+
+def case_key(case):
+    return case["topology"], case["nodes"], case["leaves"], case["seed"], case["backend"]
+
+
+def results_backend(results):
+    """
+    Backend of a benchmark result dictionary: the one in its "meta" entry or, for files
+    written without it, the one all its cases ran on.
+    """
+    backend = results.get("meta", {}).get("backend")
+    if backend is None:
+        backends = {case["backend"] for case in results["cases"]}
+        backend = backends.pop() if len(backends) == 1 else None
+    return backend
+
+
+def compare(baseline, current, tolerance, min_time=0.05):
+    """
+    Compare two benchmark result dictionaries. Wall times below `min_time` seconds are too
+    noisy to compare and are skipped.
+
+    :return: List of (case key, metric, baseline value, current value, kind) for every
+        regression ("slower"/"more memory") or change ("changed") found.
+    :raises ValueError: If the results are of different (or unknown) backends, whose wall
+        times and simulated quantities are not comparable.
+    """
+    backends = results_backend(baseline), results_backend(current)
+    if backends[0] is None or backends[0] != backends[1]:
+        raise ValueError(f"Cannot compare results of the {backends[0]} backend (baseline) "
+                         f"with results of the {backends[1]} backend")
+    baseline_cases = {case_key(case): case for case in baseline["cases"]}
+    findings = []
+    for case in current["cases"]:
+        reference = baseline_cases.get(case_key(case))
+        if reference is None:
+            continue
+        for metric in TIMED_METRICS:
+            if metric == "wall_time" and case[metric] < min_time:
+                continue
+            if reference[metric] and case[metric] > reference[metric] * (1 + tolerance):
+                findings.append((case_key(case), metric, reference[metric], case[metric],
+                                 "slower" if metric == "wall_time" else "more memory"))
+        for metric in EXACT_METRICS:
+            if case[metric] != reference[metric]:
+                findings.append((case_key(case), metric, reference[metric], case[metric], "changed"))
+    return findings
+
+
+def main_run(args):
+    tracing.disable()
+    cases = []
+    with tempfile.TemporaryDirectory() as directory:
+        for topology in args.topologies:
+            for num_nodes in args.sizes:
+                for num_leaves in args.leaves:
+                    if num_leaves >= num_nodes:
+                        continue
+                    case = run_case(topology, num_nodes, num_leaves, args.seed, args.backend, args.noisy,
+                                    args.repeat, directory)
+                    cases.append(case)
+                    print(f"{topology:<12} {num_nodes:>5} nodes {num_leaves:>4} leaves: "
+                          f"{case['wall_time']:8.3f} s {case['peak_memory'] / 2 ** 20:8.1f} MiB "
+                          f"sim {case['sim_time']:.3g} ns, {case['epr_pairs']} EPR pairs, {case['messages']} messages")
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "backend": args.backend,
+            "noisy": args.noisy,
+            "repeat": args.repeat,
+        },
+        "cases": cases,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print(f"Wrote {len(cases)} cases to {args.output}")
+
+
+def main_compare(args):
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    with open(args.current, 'r') as f:
+        current = json.load(f)
+    try:
+        findings = compare(baseline, current, args.tolerance, args.min_time)
+    except ValueError as error:
+        print(f"Error: {error}", file=sys.stderr)
+        sys.exit(2)
+    for key, metric, before, after, kind in findings:
+        topology, nodes, leaves, _, _ = key
+        print(f"{kind.upper():<12} {topology} {nodes} nodes {leaves} leaves: {metric} {before} -> {after}")
+    print(f"{len(findings)} regressions or changes (tolerance {args.tolerance:.0%})")
+    sys.exit(1 if findings else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmark cases and write their results.")
+    run_parser.add_argument("--topologies", nargs="+", default=list(TOPOLOGIES), choices=list(TOPOLOGIES))
+    run_parser.add_argument("--sizes", nargs="+", type=int, default=[10, 30, 100, 300, 1000])
+    run_parser.add_argument("--leaves", nargs="+", type=int, default=[2, 10, 30, 100])
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--backend", default="fast", choices=["fast", "netsquid"])
+    run_parser.add_argument("--noisy", action="store_true", help="Use noisy devices and depolarising links.")
+    run_parser.add_argument("--repeat", type=int, default=1, help="Timed runs per case; the best is kept.")
+    run_parser.add_argument("--output", default="benchmarks/baseline.json")
+    run_parser.set_defaults(func=main_run)
+
+    compare_parser = subparsers.add_parser("compare", help="Flag regressions of a run against a baseline.")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--tolerance", type=float, default=0.2,
+                                help="Allowed relative growth of wall time and peak memory.")
+    compare_parser.add_argument("--min-time", type=float, default=0.05,
+                                help="Wall times below this many seconds are not compared.")
+    compare_parser.set_defaults(func=main_compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
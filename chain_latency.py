@@ -0,0 +1,145 @@
+"""
+Latency distributions of the EPR chains under different generation policies.
+
+Every leaf attachment of a request (see `GraphStateDistribution.attach_pair`) reports its
+duration, from the start node entering it until it holds its corrected half of the pair, in
+the "chain_latencies" of the request's result. On lossy links (``prob_success`` well below
+1) these durations have a long tail, which the generation policies of `StarRequestRunner`
+address:
+
+- ``early_swap``: the links of a chain are generated in two rounds instead of one after
+  another, and every repeater swaps as soon as its two pairs are there,
+- ``cutoff``: pairs left unused for longer than the cutoff time (ns) are discarded and
+  generated again, which bounds the memory decoherence of the
+  stored pairs at the price of extra generation time.
+
+`compare_policies` runs a batch of requests over several seeds under every policy and
+`latency_report` summarizes the chain latencies per number of hops. Usage::
+
+    python chain_latency.py network_configs/smallworld_config_noisy.yaml requests.jsonl --seeds 50 \\
+        --policy baseline --policy early_swap --policy early_swap+cutoff=1e6
+"""
+import argparse
+
+import numpy as np
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def latency_distribution(latencies, quantiles=QUANTILES):
+    """
+    Summary of a latency sample.
+
+    :param latencies: Chain latencies (ns).
+    :param quantiles: Quantiles to report, as "p50", "p90", ... entries.
+    :return: Dictionary with the "count", "mean", the quantiles and the "max".
+    """
+    latencies = np.asarray(latencies, dtype=float)
+    if not len(latencies):
+        return {"count": 0}
+    summary = {"count": len(latencies), "mean": float(latencies.mean())}
+    for q, value in zip(quantiles, np.quantile(latencies, quantiles)):
+        summary[f"p{100 * q:g}"] = float(value)
+    summary["max"] = float(latencies.max())
+    return summary
+
+
+def latency_report(records, routing=None, quantiles=QUANTILES):
+    """
+    Chain latency distributions of result records.
+
+    :param records: Result records (see `batch_runner.StarRequestRunner.run_record`); error
+        records are skipped.
+    :param routing: `routing.RoutingTable` of the network. If given, the chains of star requests
+        are also summarized per number of hops.
+    :return: Dictionary "all" -> distribution (see `latency_distribution`), and number of
+        hops -> distribution.
+    """
+    latencies, by_hops = [], {}
+    for record in records:
+        if "error" in record:
+            continue
+        latencies += record["chain_latencies"]
+        if routing is not None and "leaves" in record:
+            for leaf, latency in zip(record["leaves"], record["chain_latencies"]):
+                hops = len(routing.path(record["center"], leaf)) - 1
+                by_hops.setdefault(hops, []).append(latency)
+    report = {"all": latency_distribution(latencies, quantiles)}
+    for hops in sorted(by_hops):
+        report[hops] = latency_distribution(by_hops[hops], quantiles)
+    return report
+
+
+def parse_policy(policy):
+    """
+    Runner options of a policy string: "baseline", or options joined by "+", each either
+    "early_swap" or "cutoff=<ns>", e.g. "early_swap+cutoff=1e6".
+    """
+    options = {}
+    for option in policy.split("+"):
+        if option == "baseline":
+            continue
+        if option == "early_swap":
+            options["early_swap"] = True
+        elif option.startswith("cutoff="):
+            options["cutoff"] = float(option[len("cutoff="):])
+        else:
+            raise ValueError(f"Unknown policy option {option!r}")
+    return options
+
+
+def compare_policies(config_file, requests, policies, seeds=range(10), quantiles=QUANTILES, **runner_kwargs):
+    """
+    Chain latency distributions of a batch of requests under several policies.
+
+    :param config_file: Path to the YAML network configuration.
+    :param requests: List of star or graph request dictionaries (see `batch_runner.read_requests`).
+    :param policies: Dictionary name -> runner options (e.g. from `parse_policy`).
+    :param seeds: Seeds every request runs with, the same under every policy.
+    :param runner_kwargs: Passed on to every `batch_runner.StarRequestRunner` (e.g. backend, protocol).
+    :return: Dictionary name -> (report, see `latency_report`, and the mean sim_time of the requests).
+    """
+    from batch_runner import StarRequestRunner
+
+    results = {}
+    for name, options in policies.items():
+        runner = StarRequestRunner(config_file, **runner_kwargs, **options)
+        records = [runner.run_record({**request, "seed": seed}) for request in requests for seed in seeds]
+        sim_times = [record["sim_time"] for record in records if "error" not in record]
+        results[name] = (latency_report(records, runner.routing, quantiles),
+                         float(np.mean(sim_times)) if sim_times else float("nan"))
+    return results
+
+
+def main():
+    import tracing
+    from batch_runner import read_requests
+
+    parser = argparse.ArgumentParser(description="Compare EPR chain latency distributions under generation policies.")
+    parser.add_argument("config", help="YAML network configuration.")
+    parser.add_argument("requests", help="JSONL file of requests (see batch_runner.read_requests).")
+    parser.add_argument("--policy", action="append", default=None,
+                        help='Policy, e.g. "baseline", "early_swap" or "early_swap+cutoff=1e6" (repeatable).')
+    parser.add_argument("--seeds", type=int, default=10, help="Runs of every request per policy.")
+    parser.add_argument("--backend", default="fast", choices=["netsquid", "fast"])
+    parser.add_argument("--protocol", default="sequential", choices=["sequential", "fusion"])
+    args = parser.parse_args()
+
+    tracing.disable()
+    requests = [request for request in read_requests(args.requests) if "event" not in request]
+    policies = {policy: parse_policy(policy) for policy in (args.policy or ["baseline", "early_swap"])}
+    results = compare_policies(args.config, requests, policies, range(args.seeds),
+                               backend=args.backend, protocol=args.protocol)
+    for name, (report, sim_time) in results.items():
+        print(f"{name}: mean request time {sim_time:.4g} ns")
+        for hops, summary in report.items():
+            if not summary["count"]:
+                continue
+            label = "all chains" if hops == "all" else f"{hops} hops"
+            quantiles = ", ".join(f"{key} {value:.4g}" for key, value in summary.items() if key.startswith("p"))
+            print(f"  {label:>10}: {summary['count']} chains, mean {summary['mean']:.4g}, {quantiles}, "
+                  f"max {summary['max']:.4g} ns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,852 @@
+"""
+Stabilizer-tableau simulation backend for the graph-state protocols.
+
+Every quantum operation used by `GraphStateDistribution` is a Clifford operation
+(H, X, Y, Z, CNOT, CZ, rotations by multiples of pi/2 and Pauli measurements), so the
+programs can run on a `stabilizer.StabilizerTableau` instead of NetSquid's general
+quantum-state simulation. `FastNetwork` reads the same YAML network configuration as
+squidasm and runs the unmodified node programs on a small event-driven runtime that
+provides the parts of squidasm's `ProgramContext` the programs use: classical sockets,
+EPR sockets, qubits and a connection whose `flush()` executes the queued operations.
+
+Timing follows the squidasm stack:
+
+- operations queued before a `flush()` run one after another on the node, taking the
+  gate, initialization and measurement times of the qdevice configuration,
+- an EPR request waits until the peer issued the matching request. A "perfect" link
+  then delivers after ``state_delay``, a "depolarise" link after a geometric number of
+  attempts of ``t_cycle`` each (derived from the link length if not given),
+- classical messages arrive after the clink delay (derived from the length for "default"
+  clinks, zero for "instant" ones).
+
+A link can have a cutoff time (``cutoff_time`` in its ``cfg``, or `FastNetwork.cutoff` for
+all links without one): a delivered pair that neither end operated on within the cutoff is
+discarded and generated again on the same memory positions, and an operation on one of its
+qubits waits until the new pair is there. This also covers pairs held after an EPR chain, which
+the program-level cutoff of NetSquid runs does not (see `GraphStateDistribution.any_node_epr_pair`).
+A link can also lose pairs (``prob_loss`` in its
+``cfg``, or `FastNetwork.loss`): a lost pair is heralded, so both ends learn of the loss when
+it is delivered and hold an unentangled qubit marked ``lost`` instead (see
+`GraphStateDistribution.attach_pair`). squidasm's links have neither option natively.
+
+Noise is the Pauli version of the NetSquid models: gate depolarization with the
+configured probabilities, EPR pairs that are Werner states of the link fidelity, and
+T1/T2 memory decoherence approximated by its Pauli twirl. This follows the models'
+documentation; how closely the results agree with NetSquid runs is what backend_agreement.py
+measures, and no such run is recorded in this repository.
+
+Example
+-------
+>>> network = FastNetwork("network_configs/network_config_noisy.yaml")
+>>> results = network.run(programs, seed=7)   # node name -> return value of Program.run
+>>> network.stats["sim_time"], network.stats["epr_pairs"]
+>>> network.load["links"], network.load["nodes"]   # per link and per node resource usage
+"""
+import heapq
+import itertools
+from collections import deque
+
+import numpy as np
+import yaml
+
+from stabilizer import StabilizerTableau
+from yaml_to_nx import YamlLoader, node_order
+
+# Signal speed in fibre (km/s), used to derive delays from link lengths
+SPEED_OF_LIGHT = 200000
+# Delivery time (ns) of an EPR pair on a "perfect" link without explicit state_delay
+PERFECT_LINK_STATE_DELAY = 1000.
+
+
+class QDeviceModel:
+    """
+    Timing and noise parameters of a generic qdevice, read from a stack's ``qdevice_cfg``.
+    """
+
+    def __init__(self, cfg):
+        cfg = cfg or {}
+        self.num_qubits = cfg.get("num_qubits", 4)
+        self.T1 = cfg.get("T1", 0)
+        self.T2 = cfg.get("T2", 0)
+        self.init_time = cfg.get("init_time", 0)
+        self.single_qubit_gate_time = cfg.get("single_qubit_gate_time", 0)
+        self.two_qubit_gate_time = cfg.get("two_qubit_gate_time", 0)
+        self.measure_time = cfg.get("measure_time", 0)
+        self.single_qubit_gate_depolar_prob = cfg.get("single_qubit_gate_depolar_prob", 0.)
+        self.two_qubit_gate_depolar_prob = cfg.get("two_qubit_gate_depolar_prob", 0.)
+
+    def idle_pauli_probs(self, duration):
+        """
+        Probabilities (p_x, p_y, p_z) of the Pauli-twirled T1/T2 channel acting for `duration` ns.
+        A coherence time of 0 disables the corresponding decay, as in NetSquid.
+        """
+        if duration <= 0 or (not self.T1 and not self.T2):
+            return None
+        gamma = 1 - np.exp(-duration / self.T1) if self.T1 else 0.
+        coherence = np.exp(-duration / self.T2) if self.T2 else np.sqrt(1 - gamma)
+        p_xy = gamma / 4
+        return p_xy, p_xy, max(0., (2 - 2 * coherence - gamma) / 4)
+
+
+class LinkModel:
+    """
+    EPR generation model of one quantum link, read from a ``links`` entry.
+    """
+
+    def __init__(self, typ, cfg):
+        cfg = cfg or {}
+        self.typ = typ
+        if typ == "perfect":
+            self.fidelity = 1.
+            self.prob_success = 1.
+            self.t_cycle = cfg.get("state_delay", PERFECT_LINK_STATE_DELAY)
+        elif typ == "depolarise":
+            self.fidelity = cfg.get("fidelity", 1.)
+            self.prob_success = cfg.get("prob_success", 1.)
+            t_cycle = cfg.get("t_cycle")
+            if t_cycle is None:
+                t_cycle = cfg.get("length", 0) / cfg.get("speed_of_light", SPEED_OF_LIGHT) * 1e9
+            self.t_cycle = t_cycle
+        else:
+            raise ValueError(f"Link type {typ!r} is not supported by the stabilizer backend")
+        # Werner state: with this probability a uniformly random Pauli hits one qubit of the pair
+        self.prob_max_mixed = (1 - self.fidelity) * 4 / 3
+        # Time (ns) after which an unused pair is discarded and generated again, or None
+        self.cutoff = cfg.get("cutoff_time")
+        # Probability that a generated pair is lost (heralded), or None
+        self.prob_loss = cfg.get("prob_loss")
+
+    def sample_attempts(self, rng):
+        if self.prob_success >= 1:
+            return 1
+        return int(rng.geometric(self.prob_success))
+
+
+def clink_delay(typ, cfg):
+    """
+    Delay (ns) of a classical link, read from a ``clinks`` entry.
+    """
+    cfg = cfg or {}
+    if typ == "instant":
+        return 0.
+    if "delay" in cfg:
+        return cfg["delay"]
+    return cfg.get("length", 0) / cfg.get("speed_of_light", SPEED_OF_LIGHT) * 1e9
+
+
+class FastNetwork:
+    """
+    Network described by a squidasm YAML configuration, simulated with a stabilizer tableau.
+
+    The configuration is parsed once; every call to `run` starts from a fresh simulation
+    (time zero, all qubits free), like squidasm's `run`.
+
+    :param config: Path of the YAML network configuration, or the already loaded dictionary.
+    :param seed: Seed of the random state used by runs that are not seeded themselves.
+    """
+
+    def __init__(self, config, seed=None):
+        if isinstance(config, str):
+            with open(config, 'r') as f:
+                config = yaml.load(f, Loader=YamlLoader)
+        self.devices = {stack["name"]: QDeviceModel(stack.get("qdevice_cfg")) for stack in config["stacks"]}
+        self.links = {}
+        for link in config.get("links", []):
+            self.links[frozenset((link["stack1"], link["stack2"]))] = LinkModel(link["typ"], link.get("cfg"))
+        self.clink_delays = {}
+        for clink in config.get("clinks", []):
+            self.clink_delays[frozenset((clink["stack1"], clink["stack2"]))] = clink_delay(clink["typ"], clink.get("cfg"))
+
+        self._update_peers()
+
+        self.rng = np.random.default_rng(seed)
+        self.stats = {}
+        self.load = {}
+        self.tableau = None
+        # Track which qubits NetSquid would hold in one combined state (see `StateGroups`)
+        self.track_states = False
+        self.runtime = None
+        # Cutoff time (ns) and loss probability of the links that do not configure their own
+        self.cutoff = None
+        self.loss = None
+
+    def _update_peers(self):
+        peers = {name: set() for name in self.devices}
+        for pair in self.links:
+            a, b = tuple(pair)
+            peers[a].add(b)
+            peers[b].add(a)
+        self.peers = {node: sorted(nodes, key=node_order) for node, nodes in peers.items()}
+
+    def add_link(self, a, b, typ, cfg=None, clink_typ="instant", clink_cfg=None):
+        """
+        Add a quantum link and its classical link between two nodes, from the next run on.
+        The arguments are the ``typ`` and ``cfg`` of a ``links`` and of a ``clinks`` entry.
+        """
+        key = frozenset((a, b))
+        self.links[key] = LinkModel(typ, cfg)
+        self.clink_delays[key] = clink_delay(clink_typ, clink_cfg)
+        self._update_peers()
+
+    def remove_link(self, a, b):
+        """
+        Remove the quantum and classical link between two nodes, from the next run on.
+        """
+        key = frozenset((a, b))
+        del self.links[key]
+        self.clink_delays.pop(key, None)
+        self._update_peers()
+
+    def run(self, programs, seed=None):
+        """
+        Run one program per node until all of them have returned.
+
+        :param programs: Dictionary node name -> `Program`. Programs get their `clock` and
+            `qubit_factory` attributes pointed at this backend.
+        :param seed: Seed of this run. If None the network's random state continues.
+        :return: Dictionary node name -> return value of the program's `run`. The final state
+            stays available in `tableau` until the next run, indexed by the qubits' `index`,
+            and the resources every link and node used in `load` (see `_Runtime.load`).
+        """
+        rng = np.random.default_rng(seed) if seed is not None else self.rng
+        runtime = self.runtime = _Runtime(self, rng)
+        results = runtime.run(programs)
+        self.stats = runtime.stats()
+        self.load = runtime.load()
+        self.tableau = runtime.tableau
+        return results
+
+
+# ----------------------------------------------------------------------
+# Runtime
+# ----------------------------------------------------------------------
+class StateGroups:
+    """
+    Groups of qubits that share a combined quantum state the way NetSquid combines them: a
+    new qubit and a fresh EPR pair form their own state, a two-qubit gate merges the states
+    of its qubits, and a qubit leaves its state when it is measured out or freed.
+
+    The stabilizer tableau always holds all qubits, so this only reports how large NetSquid's
+    states would grow.
+    """
+
+    def __init__(self):
+        self.group = {}
+
+    def new(self, *qubits):
+        group = set(qubits)
+        for qubit in qubits:
+            self.group[qubit] = group
+
+    def merge(self, a, b):
+        group_a, group_b = self.group[a], self.group[b]
+        if group_a is group_b:
+            return
+        if len(group_a) < len(group_b):
+            group_a, group_b = group_b, group_a
+        group_a |= group_b
+        for qubit in group_b:
+            self.group[qubit] = group_a
+
+    def remove(self, qubit):
+        group = self.group.pop(qubit, None)
+        if group is not None:
+            group.discard(qubit)
+
+    def largest(self):
+        """
+        Number of qubits of the largest combined state.
+        """
+        return max((len(group) for group in self.group.values()), default=0)
+
+
+class _Event:
+    """
+    One-shot event a node process can wait on by yielding it.
+    """
+
+    __slots__ = ("runtime", "triggered", "value", "waiters")
+
+    def __init__(self, runtime):
+        self.runtime = runtime
+        self.triggered = False
+        self.value = None
+        self.waiters = []
+
+    def succeed(self, value=None):
+        self.triggered = True
+        self.value = value
+        for process in self.waiters:
+            self.runtime.call_at(self.runtime.now, self.runtime.resume, process, value)
+        self.waiters = []
+
+
+class _Process:
+
+    __slots__ = ("name", "generator", "done", "result", "waiting")
+
+    def __init__(self, name, generator):
+        self.name = name
+        self.generator = generator
+        self.done = False
+        self.result = None
+        self.waiting = None
+
+
+class _Runtime:
+    """
+    State of a single run: clock, event queue, tableau and node processes.
+    """
+
+    def __init__(self, network, rng):
+        self.network = network
+        self.rng = rng
+        self.tableau = StabilizerTableau(capacity=64, rng=rng)
+        self.now = 0.
+        self._queue = []
+        self._sequence = itertools.count()
+        self.nodes = {}
+        self.epr_links = {}
+        self.num_events = 0
+        self.num_messages = 0
+        self.num_epr_pairs = 0
+        self.num_epr_attempts = 0
+        self.num_epr_discarded = 0
+        self.num_epr_lost = 0
+        # Queued passive events (cutoff checks, watchdog timers), which alone cannot wake a program
+        self.passive_events = 0
+        self.states = StateGroups() if network.track_states else None
+
+    def clock(self):
+        return self.now
+
+    def call_at(self, time, function, *args):
+        heapq.heappush(self._queue, (time, next(self._sequence), function, args))
+
+    def call_passive(self, time, function, *args):
+        """
+        Schedule an event that alone does not keep the run going: the run ends once only such
+        events are left.
+        """
+        self.passive_events += 1
+        self.call_at(time, self._passive, function, args)
+
+    def _passive(self, function, args):
+        self.passive_events -= 1
+        function(*args)
+
+    def timeout(self, delay):
+        event = _Event(self)
+        self.call_at(self.now + delay, event.succeed)
+        return event
+
+    def resume(self, process, value=None):
+        process.waiting = None
+        try:
+            event = process.generator.send(value)
+        except StopIteration as stop:
+            process.done = True
+            process.result = stop.value
+            return
+        if event.triggered:
+            self.call_at(self.now, self.resume, process, event.value)
+        else:
+            process.waiting = event
+            event.waiters.append(process)
+
+    def epr_link(self, a, b):
+        key = frozenset((a, b))
+        link = self.epr_links.get(key)
+        if link is None:
+            link = self.epr_links[key] = _EPRLink(self, a, b, self.network.links[key])
+        return link
+
+    def run(self, programs):
+        processes = []
+        for name, program in programs.items():
+            node = self.nodes[name] = _FastNode(self, name, self.network.devices[name])
+            meta = program.meta
+            csockets = {peer: FastCSocket(node, peer, self.network.clink_delays.get(frozenset((name, peer)), 0.))
+                        for peer in meta.csockets}
+            epr_sockets = {peer: FastEPRSocket(node, peer) for peer in meta.epr_sockets}
+            context = FastContext(node.connection, csockets, epr_sockets)
+            program.clock = self.clock
+            program.qubit_factory = FastQubit
+            processes.append(_Process(name, program.run(context)))
+        for node in self.nodes.values():
+            for peer, socket in node.csockets.items():
+                socket.remote = self.nodes[peer].csockets[node.name]
+
+        for process in processes:
+            self.call_at(0., self.resume, process)
+        while len(self._queue) > self.passive_events:
+            self.now, _, function, args = heapq.heappop(self._queue)
+            self.num_events += 1
+            function(*args)
+
+        blocked = [process.name for process in processes if not process.done]
+        if blocked:
+            raise RuntimeError(f"Simulation ended at {self.now} ns with blocked node programs: {', '.join(blocked)}")
+        return {process.name: process.result for process in processes}
+
+    def stats(self):
+        return {
+            "sim_time": self.now,
+            "events": self.num_events,
+            "messages": self.num_messages,
+            "epr_pairs": self.num_epr_pairs,
+            "epr_attempts": self.num_epr_attempts,
+            "epr_discarded": self.num_epr_discarded,
+            "epr_lost": self.num_epr_lost,
+            "max_qubits": self.tableau.n,
+        }
+
+    def load(self):
+        """
+        Resources used per link and per node during the run.
+
+        :return: Dictionary with "links": frozenset((a, b)) -> {"epr_pairs", "busy_time" (ns spent
+            generating pairs), "messages" (frames sent in either direction), "discarded" (pairs
+            dropped at the cutoff) and "lost" (pairs lost, both included in "epr_pairs")}, and "nodes":
+            name -> {"messages" (frames sent), "slot_time" (ns qubits spent in memory)}.
+            Only links and nodes that were used are listed.
+        """
+        links = {}
+        for key, link in self.epr_links.items():
+            links[key] = {"epr_pairs": link.pairs, "busy_time": link.busy_time, "messages": 0,
+                          "discarded": link.discarded, "lost": link.lost}
+        nodes = {}
+        for name, node in self.nodes.items():
+            slot_time = node.slot_time + sum(self.now - qubit.placed_at for qubit in node.live)
+            sent = 0
+            for peer, socket in node.csockets.items():
+                if socket.sent:
+                    sent += socket.sent
+                    key = frozenset((name, peer))
+                    links.setdefault(key, {"epr_pairs": 0, "busy_time": 0., "messages": 0, "discarded": 0,
+                                           "lost": 0})["messages"] += socket.sent
+            if sent or slot_time:
+                nodes[name] = {"messages": sent, "slot_time": slot_time}
+        return {"links": links, "nodes": nodes}
+
+
+class _EPRLink:
+    """
+    Pairs the EPR requests of both ends of a quantum link in order and generates the pairs
+    one after another. With a cutoff, pairs left unused for that long are generated again.
+    With a loss probability, delivered pairs may be lost instead of entangled.
+    """
+
+    def __init__(self, runtime, a, b, model):
+        self.runtime = runtime
+        self.model = model
+        self.cutoff = model.cutoff if model.cutoff is not None else runtime.network.cutoff
+        prob_loss = model.prob_loss if model.prob_loss is not None else runtime.network.loss
+        self.prob_loss = prob_loss or 0.
+        self.ends = (a, b)
+        self.pending = {a: deque(), b: deque()}
+        self.busy_until = 0.
+        self.pairs = 0
+        self.busy_time = 0.
+        self.discarded = 0
+        self.lost = 0
+
+    def request(self, node, qubit):
+        event = _Event(self.runtime)
+        other = self.ends[1] if node.name == self.ends[0] else self.ends[0]
+        if not self.pending[other]:
+            self.pending[node.name].append((node, qubit, event))
+            return event
+        other_node, other_qubit, other_event = self.pending[other].popleft()
+        self._generate(self._deliver, ((node, qubit, event), (other_node, other_qubit, other_event)))
+        return event
+
+    def _generate(self, function, ends):
+        # Attempts until success, after the pairs already being generated on this link
+        runtime = self.runtime
+        attempts = self.model.sample_attempts(runtime.rng)
+        runtime.num_epr_attempts += attempts
+        self.busy_time += attempts * self.model.t_cycle
+        done = max(runtime.now, self.busy_until) + attempts * self.model.t_cycle
+        self.busy_until = done
+        runtime.call_at(done, function, ends)
+
+    def _deliver(self, ends):
+        (node_a, qubit_a, event_a), (node_b, qubit_b, event_b) = ends
+        node_a.place(qubit_a)
+        node_b.place(qubit_b)
+        runtime = self.runtime
+        if self.prob_loss and runtime.rng.random() < self.prob_loss:
+            # Heralded loss: both ends keep their qubit in |0> and learn that it is not entangled
+            qubit_a.lost = qubit_b.lost = True
+            runtime.num_epr_pairs += 1
+            runtime.num_epr_lost += 1
+            self.pairs += 1
+            self.lost += 1
+        else:
+            if runtime.states is not None:
+                runtime.states.new(qubit_a, qubit_b)
+            self._entangle(qubit_a, qubit_b)
+            self._store((qubit_a, qubit_b))
+        event_a.succeed()
+        event_b.succeed()
+
+    def _entangle(self, qubit_a, qubit_b):
+        runtime = self.runtime
+        tableau = runtime.tableau
+        tableau.h(qubit_a.index)
+        tableau.cnot(qubit_a.index, qubit_b.index)
+        if self.model.prob_max_mixed and runtime.rng.random() < self.model.prob_max_mixed:
+            tableau.pauli(qubit_b.index, "IXYZ"[runtime.rng.integers(4)])
+        runtime.num_epr_pairs += 1
+        self.pairs += 1
+
+    def _store(self, pair):
+        if self.cutoff is not None:
+            qubit_a, qubit_b = pair
+            qubit_a.stored = qubit_b.stored = pair
+            self.runtime.call_passive(self.runtime.now + self.cutoff, self._expire, pair)
+
+    def _expire(self, pair):
+        # Discard the pair if neither qubit was used since it arrived, and generate it again
+        runtime = self.runtime
+        qubit_a, qubit_b = pair
+        if qubit_a.stored is not pair or qubit_b.stored is not pair:
+            return
+        for qubit in pair:
+            if runtime.tableau.measure(qubit.index):
+                runtime.tableau.x_gate(qubit.index)
+            qubit.regenerating = _Event(runtime)
+        runtime.num_epr_discarded += 1
+        self.discarded += 1
+        self._generate(self._regenerate, pair)
+
+    def _regenerate(self, pair):
+        qubit_a, qubit_b = pair
+        for qubit in pair:
+            qubit.last_access = self.runtime.now
+        self._entangle(qubit_a, qubit_b)
+        # Unless an operation is already waiting for it, the new pair is subject to the cutoff again
+        if qubit_a.stored is pair and qubit_b.stored is pair:
+            self._store(pair)
+        for qubit in pair:
+            event, qubit.regenerating = qubit.regenerating, None
+            event.succeed()
+
+
+class _FastNode:
+    """
+    Quantum memory and operation execution of one node.
+    """
+
+    def __init__(self, runtime, name, device):
+        self.runtime = runtime
+        self.name = name
+        self.device = device
+        self.live = set()
+        self.connection = FastConnection(self)
+        self.csockets = {}
+        # Time the released qubits spent in memory
+        self.slot_time = 0.
+
+    def place(self, qubit):
+        if len(self.live) >= self.device.num_qubits:
+            raise RuntimeError(f"{self.name}: out of qubit memory ({self.device.num_qubits} positions)")
+        qubit.index = self.runtime.tableau.allocate()
+        qubit.last_access = qubit.placed_at = self.runtime.now
+        self.live.add(qubit)
+        if self.runtime.states is not None:
+            self.runtime.states.new(qubit)
+
+    def _release(self, qubit):
+        qubit.stored = None
+        if qubit in self.live:
+            self.slot_time += self.runtime.now - qubit.placed_at
+        if self.runtime.states is not None:
+            self.runtime.states.remove(qubit)
+        self.live.discard(qubit)
+        self.runtime.tableau.release(qubit.index)
+        qubit.index = None
+
+    def _touch(self, qubit):
+        # Memory decoherence since the qubit was last operated on
+        qubit.stored = None
+        runtime = self.runtime
+        probs = self.device.idle_pauli_probs(runtime.now - qubit.last_access)
+        qubit.last_access = runtime.now
+        if probs is not None:
+            u = runtime.rng.random()
+            p_x, p_y, p_z = probs
+            if u < p_x:
+                runtime.tableau.x_gate(qubit.index)
+            elif u < p_x + p_y:
+                runtime.tableau.y_gate(qubit.index)
+            elif u < p_x + p_y + p_z:
+                runtime.tableau.z_gate(qubit.index)
+
+    def _depolarize(self, qubit, prob):
+        rng = self.runtime.rng
+        if prob and rng.random() < prob:
+            self.runtime.tableau.pauli(qubit.index, "IXYZ"[rng.integers(4)])
+
+    def _check(self, qubit):
+        if qubit.index is None or qubit not in self.live:
+            raise RuntimeError(f"{self.name}: operation on a qubit that is not in memory")
+
+    def execute(self, op):
+        """
+        Execute one queued operation. Returns an event to wait for, or None if it took no time.
+        """
+        runtime, tableau, device = self.runtime, self.runtime.tableau, self.device
+        kind = op[0]
+        if kind == "init":
+            self.place(op[1])
+            duration = device.init_time
+        elif kind == "epr":
+            _, peer, qubit = op
+            return runtime.epr_link(self.name, peer).request(self, qubit)
+        elif kind == "gate":
+            _, gates, qubit = op
+            self._check(qubit)
+            self._touch(qubit)
+            for gate in gates:
+                getattr(tableau, gate)(qubit.index)
+            self._depolarize(qubit, device.single_qubit_gate_depolar_prob)
+            duration = device.single_qubit_gate_time
+        elif kind == "gate2":
+            _, gate, control, target = op
+            self._check(control)
+            self._check(target)
+            self._touch(control)
+            self._touch(target)
+            getattr(tableau, gate)(control.index, target.index)
+            if runtime.states is not None:
+                runtime.states.merge(control, target)
+            self._depolarize(control, device.two_qubit_gate_depolar_prob)
+            self._depolarize(target, device.two_qubit_gate_depolar_prob)
+            duration = device.two_qubit_gate_time
+        elif kind == "measure":
+            _, qubit, future, inplace = op
+            self._check(qubit)
+            self._touch(qubit)
+            future.value = tableau.measure(qubit.index)
+            if not inplace:
+                self._release(qubit)
+            duration = device.measure_time
+        elif kind == "free":
+            self._release(op[1])
+            return None
+        else:
+            raise ValueError(f"Unknown operation {kind!r}")
+        return runtime.timeout(duration) if duration else None
+
+
+# ----------------------------------------------------------------------
+# Program-facing API (subset of squidasm's ProgramContext)
+# ----------------------------------------------------------------------
+class FastContext:
+    """
+    Stand-in for squidasm's `ProgramContext`.
+    """
+
+    def __init__(self, connection, csockets, epr_sockets, app_id=0):
+        self.connection = connection
+        self.csockets = csockets
+        self.epr_sockets = epr_sockets
+        self.app_id = app_id
+
+
+class FastConnection:
+    """
+    Queues quantum operations until `flush()` executes them in order.
+    """
+
+    def __init__(self, node):
+        self.node = node
+        self.ops = []
+
+    def flush(self):
+        ops, self.ops = self.ops, []
+        for op in ops:
+            # The qubits are in use from now on. Wait for pairs that are being generated again
+            # after their cutoff
+            qubits = [qubit for qubit in op[1:] if isinstance(qubit, FastQubit)]
+            for qubit in qubits:
+                qubit.stored = None
+            for qubit in qubits:
+                if qubit.regenerating is not None:
+                    yield qubit.regenerating
+            event = self.node.execute(op)
+            if event is not None:
+                yield event
+
+
+class FastCSocket:
+    """
+    Classical socket to a neighbouring node. Messages arrive in order after the clink delay.
+    """
+
+    def __init__(self, node, peer, delay):
+        self.node = node
+        self.peer = peer
+        self.delay = delay
+        self.remote = None
+        self.sent = 0
+        self.inbox = deque()
+        self._arrival = None
+        node.csockets[peer] = self
+
+    def send(self, msg):
+        runtime = self.node.runtime
+        runtime.num_messages += 1
+        self.sent += 1
+        runtime.call_at(runtime.now + self.delay, self.remote._deliver, msg)
+
+    def _deliver(self, msg):
+        self.inbox.append(msg)
+        if self._arrival is not None:
+            event, self._arrival = self._arrival, None
+            event.succeed()
+
+    def recv(self):
+        while not self.inbox:
+            self._arrival = _Event(self.node.runtime)
+            yield self._arrival
+        return self.inbox.popleft()
+
+
+class FastEPRSocket:
+    """
+    EPR socket to a neighbouring node. Requests of both ends are paired in order.
+    """
+
+    def __init__(self, node, peer):
+        self.node = node
+        self.peer = peer
+
+    def _request(self, number):
+        qubits = [FastQubit(self.node.connection, initialize=False) for _ in range(number)]
+        self.node.connection.ops.extend(("epr", self.peer, qubit) for qubit in qubits)
+        return qubits
+
+    def create_keep(self, number=1, **kwargs):
+        return self._request(number)
+
+    def recv_keep(self, number=1, **kwargs):
+        return self._request(number)
+
+
+class FastFuture:
+    """
+    Measurement outcome that becomes available once the connection is flushed.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = None
+
+    def __int__(self):
+        if self.value is None:
+            raise RuntimeError("Measurement outcome read before the connection was flushed")
+        return self.value
+
+    __index__ = __int__
+
+    def __eq__(self, other):
+        return int(self) == other
+
+    def __hash__(self):
+        return hash(int(self))
+
+    def __str__(self):
+        return str(int(self))
+
+    def __repr__(self):
+        return f"FastFuture({self.value})"
+
+    def __format__(self, spec):
+        return format(int(self), spec)
+
+
+def _quarter_turns(n, d, angle):
+    if angle is None:
+        angle = n * np.pi / 2 ** d
+    turns = angle / (np.pi / 2)
+    if abs(turns - round(turns)) > 1e-9:
+        raise ValueError(f"Rotation by {angle} is not a Clifford operation")
+    return round(turns) % 4
+
+
+_Z_ROTATIONS = {0: (), 1: ("s",), 2: ("z_gate",), 3: ("sdg",)}
+
+
+class FastQubit:
+    """
+    Qubit handle with the netqasm `Qubit` operations used by the protocols. Operations are
+    queued on the connection and executed on `flush()`.
+
+    :param conn: The node's `FastConnection`.
+    :param initialize: If True, a fresh qubit in |0> is allocated when the connection is flushed.
+    """
+
+    def __init__(self, conn, initialize=True):
+        self._conn = conn
+        self.index = None
+        self.last_access = self.placed_at = 0.
+        # Pair awaiting its cutoff, and the event of its generation after one (see `_EPRLink`)
+        self.stored = None
+        self.regenerating = None
+        # Set when the EPR pair this qubit was delivered as was lost
+        self.lost = False
+        if initialize:
+            conn.ops.append(("init", self))
+
+    def _gate(self, *gates):
+        self._conn.ops.append(("gate", gates, self))
+
+    def X(self):
+        self._gate("x_gate")
+
+    def Y(self):
+        self._gate("y_gate")
+
+    def Z(self):
+        self._gate("z_gate")
+
+    def H(self):
+        self._gate("h")
+
+    def S(self):
+        self._gate("s")
+
+    def K(self):
+        # K = S H S^dagger up to phase, maps Y <-> Z
+        self._gate("sdg", "h", "s")
+
+    def T(self):
+        raise ValueError("The T gate is not a Clifford operation")
+
+    def rot_Z(self, n=0, d=0, angle=None):
+        self._gate(*_Z_ROTATIONS[_quarter_turns(n, d, angle)])
+
+    def rot_X(self, n=0, d=0, angle=None):
+        self._gate("h", *_Z_ROTATIONS[_quarter_turns(n, d, angle)], "h")
+
+    def rot_Y(self, n=0, d=0, angle=None):
+        # R_Y = S R_X S^dagger
+        self._gate("sdg", "h", *_Z_ROTATIONS[_quarter_turns(n, d, angle)], "h", "s")
+
+    def cnot(self, target):
+        self._conn.ops.append(("gate2", "cnot", self, target))
+
+    def cphase(self, target):
+        self._conn.ops.append(("gate2", "cz", self, target))
+
+    def measure(self, future=None, inplace=False, **kwargs):
+        future = FastFuture()
+        self._conn.ops.append(("measure", self, future, inplace))
+        return future
+
+    def free(self):
+        self._conn.ops.append(("free", self))
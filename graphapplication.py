@@ -8,7 +8,11 @@ from squidasm.sim.stack.common import LogManager
 
 from squidasm.util.routines import measXY
 
-from yaml_to_nx import shortest_path
+from routing import RoutingTable
+from tracing import get_tracer
+from verification import measurement_basis
+from messages import (OP_SYNC, OP_CONFIRMATION, OP_CASE, OP_OUTCOME, OP_FAILURE, OP_CUTOFF, OP_ROUTE, FrameSchedule,
+                      encode, decode, encode_frame, decode_frame, pack_case, unpack_case, combine_case)
 
 import netsquid as ns
 
@@ -18,27 +22,117 @@ leaves = ["node_0","node_3","node_8","node_9","node_7","node_6","node_5","node_2
 
 class GraphStateDistribution(Program):
     
-    def __init__(self, node_name: str, peer_names: list, graph, center: str = center, leaves: list = leaves):
+    def __init__(self, node_name: str, peer_names: list, graph, center: str = center, leaves: list = leaves,
+                 routing: Optional[RoutingTable] = None, aggregate_messages: bool = True,
+                 protocol: str = "sequential", fusion_batch: int = 3, early_swap: bool = False,
+                 redundancy: int = 1, cutoff=None):
         """
         Initialize the GraphStateDistribution program.
 
         :param node_name: Name of the current node in the quantum network.
         :param peer_names: List of all the peer node names (neighbors) that this node is directly connected to.
         :param graph: A networkx graph structure representing the topology of the quantum network.
+        :param center: The center node of the requested star graph.
+        :param leaves: The leaf nodes of the requested star graph, in integration order.
+        :param routing: Shortest-path cache shared by the node programs. Built from `graph` if not given.
+        :param aggregate_messages: If True, synchronization messages that cross the same link in the same
+            round are combined into one frame. If False, every message is relayed on its own.
+        :param protocol: "sequential" to integrate the leaves one by one (`gen_star_graph`), or "fusion"
+            to fuse batches of Bell pairs at the center (`gen_star_graph_fusion`).
+        :param fusion_batch: Number of Bell pairs the center fuses at once with the "fusion" protocol. The
+            center holds this many qubits plus its star qubit, so it is bounded by its memory. With
+            `redundancy` k, batches are k - 1 pairs smaller to leave room for the extra routes.
+        :param early_swap: If True, the links of an EPR chain are generated in two rounds instead of
+            one after another, and every repeater swaps as soon as its two pairs are there (see
+            `any_node_epr_pair`).
+        :param redundancy: Number of node-disjoint routes every leaf attachment tries at once, so
+            that a lost link pair on one of them does not cost a whole new round (see `attach_pair`).
+            The end nodes of an attachment hold one qubit per route until it completes.
+        :param cutoff: Cutoff time (ns) after which an unused link pair of an EPR chain is discarded
+            and generated again, for every link, or a dictionary (a, b) -> cutoff time of single
+            links, applied by the program itself (see `any_node_epr_pair`). The stabilizer backend
+            discards expired pairs natively, so this is meant for NetSquid runs.
         """
-        
+        if protocol not in ("sequential", "fusion"):
+            raise ValueError(f"Unknown protocol {protocol!r}")
+        if redundancy < 1:
+            raise ValueError(f"Redundancy must be at least 1, got {redundancy}")
+
         self.node_name = node_name
         self.peer_names = peer_names
         self.G = graph
-        
+        self.routing = routing if routing is not None else RoutingTable(graph)
+        self.aggregate_messages = aggregate_messages
+        self.protocol = protocol
+        self.fusion_batch = fusion_batch
+        self.early_swap = early_swap
+        self.redundancy = redundancy
+        self.cutoff = cutoff
+        self.set_request(center, leaves)
+
         # Create attributes for classical and EPR sockets dynamically based on peer names.
         for peer in peer_names:
             setattr(self,f"csocket_{peer}", None)
             setattr(self,f"epr_socket_{peer}", None)
       
+        # Simulation clock and local qubit constructor. NetSquid's by default; the stabilizer
+        # backend (fast_backend.py) replaces them with its own when it runs the program.
+        self.clock = ns.sim_time
+        self.qubit_factory = Qubit
+
         # Initialize logger for this node
         self.logger = LogManager.get_stack_logger(f"{self.node_name} program")
 
+        # Level-gated tracers for the protocol subsystems (see tracing.py)
+        self.trace_star = get_tracer(node_name, "star", self.sim_time, self.logger)
+        self.trace_epr = get_tracer(node_name, "epr", self.sim_time, self.logger)
+        self.trace_correction = get_tracer(node_name, "correction", self.sim_time, self.logger)
+
+    def set_request(self, center: str, leaves: list, verify_setting: Optional[int] = None,
+                    layers: Optional[list] = None, corrections: Optional[dict] = None):
+        """
+        Set the star graph request served by the next run of the program and reset the
+        per-run counters, so the same program instance can serve a stream of requests.
+
+        :param center: The center node of the requested star graph.
+        :param leaves: The leaf nodes of the requested star graph, in integration order.
+        :param verify_setting: If given, the star qubits are measured in the bases of this
+            verification setting (see verification.py) once the star is complete.
+        :param layers: If given, generate the graph state planned as these layers of (center, leaves)
+            stars instead of the star (see `gen_graph` and planner.py); `center` and `leaves` are ignored.
+        :param corrections: Local gates per node finishing a graph request (see `gen_graph`).
+        """
+        self.center = center
+        self.leaves = list(leaves)
+        self.verify_setting = verify_setting
+        self.layers = layers
+        self.corrections = corrections
+        self.verify_outcome = None
+
+        # Classical traffic counters: csocket sends and the logical payloads they carry
+        self.messages_sent = 0
+        self.payloads_sent = 0
+
+        # Per-run record: merge measurement outcomes, packed Bell-state cases of the chains
+        # ending at this node and the simulation time at which each step completed
+        self.outcomes = []
+        self.cases = []
+        self.step_times = []
+        self.last_case = None
+        # Durations of the leaf attachments starting at this node, from the node entering the
+        # attachment until it holds its corrected half of the pair, and the rounds each took
+        self.chain_latencies = []
+        self.attachment_rounds = []
+        self.chain_lost = False
+        # Link pairs this node discarded at the program-level cutoff, counted at the creating end
+        self.pairs_discarded = 0
+
+    def sim_time(self):
+        """
+        Current simulation time of the backend running this program.
+        """
+        return self.clock()
+
     @property
     def meta(self) -> ProgramMeta:
 
@@ -55,21 +149,39 @@ class GraphStateDistribution(Program):
         
         In this demostration this method:
         - Sets up sockets.
-        - Generates a star graph state from the example leaves
+        - Generates a star graph state from the requested center and leaves
 
         :param context: ProgramContext provided by the runtime, containing sockets and other runtime info.
-        :return: A dictionary storing simulation times for each node
+        :return: A dictionary with this node's measurement outcomes, chain cases, step completion
+            times, chain latencies and rounds, classical traffic counters and verification outcome
         """
-        #run_time = ns.sim_time()
-        
-        logger = self.logger
-        logger.info(f"{self.node_name}")
+
+        self.trace_star.debug("[%s] Program started.", self.node_name)
 
         self.setup_sockets(context)
         
-        yield from self.gen_star_graph(context,center_node=center,leaves=leaves)
+        if self.layers is not None:
+            yield from self.gen_graph(context, self.layers, self.corrections)
+        elif self.protocol == "fusion":
+            yield from self.gen_star_graph_fusion(context, self.center, self.leaves)
+        else:
+            yield from self.gen_star_graph(context,center_node=self.center,leaves=self.leaves)
+
+        if self.verify_setting is not None:
+            yield from self.measure_star_qubit(context)
         
-        return {} #{"name": self.node_name, "run_time": run_time}
+        return {
+            "name": self.node_name,
+            "outcomes": self.outcomes,
+            "cases": self.cases,
+            "step_times": self.step_times,
+            "chain_latencies": self.chain_latencies,
+            "attachment_rounds": self.attachment_rounds,
+            "discarded": self.pairs_discarded,
+            "messages": self.messages_sent,
+            "payloads": self.payloads_sent,
+            "verify_outcome": self.verify_outcome,
+        }
     
     def gen_star_graph(self, context: ProgramContext, center_node: str, leaves: list):
         """
@@ -123,13 +235,6 @@ class GraphStateDistribution(Program):
         >>> # in a star-shaped graph state.
         """
         
-        # Precompute shortest paths for synchronization messages between center node and all other nodes.
-        center_sync_paths = []
-        for sync_node in self.G.nodes():
-            if sync_node != center_node:
-                sync_path = shortest_path(self.G,(center_node,sync_node))
-                center_sync_paths.append(sync_path)
-        
         # A counter is defined so that each node's operation properly aligns with each step
         # Steps proceed in increments for each new leaf that is integrated into the star state.
         counter = 0 
@@ -137,16 +242,9 @@ class GraphStateDistribution(Program):
         # Generate EPR pairs from center_node to each leaf and merge qubits at center node
         # Iterate over each leaf we want to entangle with the center.
         for leaf in leaves:
-            
-            # For each leaf, precompute shortest paths for synchronization messages between that leaf and all other nodes.
-            leaf_sync_paths = []
-            for sync_node in self.G.nodes():
-                if sync_node != leaf:
-                    sync_path = shortest_path(self.G,(leaf,sync_node))
-                    leaf_sync_paths.append(sync_path)
-        
+
             # Shortest path from center node to this leaf — used for EPR distribution.
-            path = shortest_path(self.G,(center_node, leaf))
+            path = self.routing.path(center_node, leaf)
 
             # ------------------------------------------------------------
             # If the current node is the CENTER node, handle star-creation.
@@ -156,9 +254,9 @@ class GraphStateDistribution(Program):
                 if counter == 0:
                     # Step 0: Generate the first EPR pair with the first leaf.
                     
-                    print(f"{ns.sim_time()}us: [CENTER {self.node_name}] Step 0: Integrating first leaf {leaf} into star graph.")
-                    yield from self.any_node_epr_pair(context,path,qubit_start="center_qubit")
-                    print(f"{ns.sim_time()}us: [CENTER {self.node_name}] Step 0 complete: Generated EPR pair with leaf {leaf}. ----------------------")
+                    self.trace_star.info("[CENTER %s] Step 0: Integrating first leaf %s into star graph.", self.node_name, leaf)
+                    yield from self.attach_pair(context,path,qubit_start="center_qubit")
+                    self.trace_star.info("[CENTER %s] Step 0 complete: Generated EPR pair with leaf %s. ----------------------", self.node_name, leaf)
                 
                 elif counter == 1:
                     # Step 1: Merge a second leaf, forming a 3-node graph state.
@@ -166,14 +264,15 @@ class GraphStateDistribution(Program):
                     # - Perform a CNOT from center_qubit onto epr_qubit_1 (the new EPR).
                     # - Measure epr_qubit_1 and send the measurement result to the second leaf for further corrections.
                     
-                    print(f"{ns.sim_time()}us: [CENTER {self.node_name}] Step 1: Integrating second leaf {leaf} into star graph.")
-                    yield from self.any_node_epr_pair(context,path)
+                    self.trace_star.info("[CENTER %s] Step 1: Integrating second leaf %s into star graph.", self.node_name, leaf)
+                    yield from self.attach_pair(context,path)
                     self.center_qubit.cnot(self.epr_qubit_1)
                     r_1 = self.epr_qubit_1.measure()
                     yield from context.connection.flush()
-                    print(f"{ns.sim_time()}us: [CENTER {self.node_name}] Step 1: Measured qubit (result {r_1}). Sending measurement outcome to leaf {path[-1]} for correction.")
-                    yield from self.send_msg_to_any_node(context,path,str(r_1))
-                    print(f"{ns.sim_time()}us: [CENTER {self.node_name}] Step 1 complete: Merged second leaf. Currently forming a 3-node graph. ----------------------")
+                    self.outcomes.append(int(r_1))
+                    self.trace_star.info("[CENTER %s] Step 1: Measured qubit (result %s). Sending measurement outcome to leaf %s for correction.", self.node_name, r_1, path[-1])
+                    yield from self.send_msg_to_any_node(context,path,encode(OP_OUTCOME,int(r_1)))
+                    self.trace_star.info("[CENTER %s] Step 1 complete: Merged second leaf. Currently forming a 3-node graph. ----------------------", self.node_name)
                 
                 elif counter > 1:
                     # For more leaves:
@@ -185,10 +284,10 @@ class GraphStateDistribution(Program):
                     # Perform a Y measurement to effectively swap the entanglement and have the center qubit entangled with the new leaf
                     # Obtain measurements to perform correction (not yet implemented)
                     
-                    print(f"{ns.sim_time()}us: [CENTER {self.node_name}] Step {counter}: Integrating leaf {leaf} into star graph.")
+                    self.trace_star.info("[CENTER %s] Step %s: Integrating leaf %s into star graph.", self.node_name, counter, leaf)
                     
-                    yield from self.any_node_epr_pair(context,path)
-                    local_qubit = Qubit(context.connection) # We generate an auxiliary qubit to perform entanglement swapping with the current center of the graph state
+                    yield from self.attach_pair(context,path)
+                    local_qubit = self.qubit_factory(context.connection) # We generate an auxiliary qubit to perform entanglement swapping with the current center of the graph state
                     local_qubit.H() # Perform an H gate to produce a |+> state
                     self.epr_qubit_1.H() # self.epr_qubit_1 is part of a |phi+> state with current node from leaves. Apply H gate to produce a graph state CZ|+>|+>
                     local_qubit.cphase(self.epr_qubit_1) # Add an edge from the auxiliary qubit to the pair from the leaf
@@ -199,15 +298,14 @@ class GraphStateDistribution(Program):
                     meas_2 = measXY(self.epr_qubit_1,angle=np.pi/2)
                     
                     yield from context.connection.flush()
-                    print(f"{ns.sim_time()}us: [CENTER {self.node_name}] Step {counter}: Measured qubits: (Auxiliary qubit: {meas_1})(EPR qubit from {leaf}: {meas_2}). (Correction pending)")
-                    print(f"{ns.sim_time()}us: [CENTER {self.node_name}] Step {counter} complete: Integrated leaf {leaf}. Star graph now includes {counter + 1} leaves. ----------------------")
+                    self.outcomes += [int(meas_1), int(meas_2)]
+                    self.trace_star.info("[CENTER %s] Step %s: Measured qubits: (Auxiliary qubit: %s)(EPR qubit from %s: %s). (Correction pending)", self.node_name, counter, meas_1, leaf, meas_2)
+                    self.trace_star.info("[CENTER %s] Step %s complete: Integrated leaf %s. Star graph now includes %s leaves. ----------------------", self.node_name, counter, leaf, counter + 1)
 
                 # After each leaf-integration step, sync messages with all nodes to ensure global consistency.
-                for sync_path in center_sync_paths:
-                    yield from self.send_msg_to_any_node(context, sync_path, "confirm")
-                for sync_path in leaf_sync_paths:
-                    yield from self.send_msg_to_any_node(context, sync_path)
+                yield from self.sync_step(context, center_node, leaf)
                 #print(f"{ns.sim_time()}us: [CENTER {self.node_name}] has synced after step {counter}.")
+                self.step_times.append(self.sim_time())
                 counter += 1
             
             # -----------------------------------------------------------------------------
@@ -221,42 +319,42 @@ class GraphStateDistribution(Program):
                     if counter == 0:
                         # At step 0 the first leaf just produces a Bell pair
                         
-                        print(f"{ns.sim_time()}us: [LEAF {self.node_name}] Step 0: Integrating first leaf {leaf} into star graph.")
-                        yield from self.any_node_epr_pair(context,path,qubit_start="center_qubit")
-                        print(f"{ns.sim_time()}us: [LEAF {self.node_name}] Step 0 complete: Established an EPR pair with center {center_node}.")
+                        self.trace_star.info("[LEAF %s] Step 0: Integrating first leaf %s into star graph.", self.node_name, leaf)
+                        yield from self.attach_pair(context,path,qubit_start="center_qubit")
+                        self.trace_star.info("[LEAF %s] Step 0 complete: Established an EPR pair with center %s.", self.node_name, center_node)
                         
                     elif counter == 1:
                         # At step 1 (second leaf): perform a protocol to merge the second and first step Bells pair into a three-node graph state.
                         # This involves receiving a measurement result from the center node and applying corrections.
                         
-                        print(f"{ns.sim_time()}us: [LEAF {self.node_name}] Step 1: Integrating second leaf {leaf} into star graph.")
-                        yield from self.any_node_epr_pair(context,path)
-                        print(f"{ns.sim_time()}us: [LEAF {self.node_name}] Step 1: Established an EPR pair with center {center_node}.")
+                        self.trace_star.info("[LEAF %s] Step 1: Integrating second leaf %s into star graph.", self.node_name, leaf)
+                        yield from self.attach_pair(context,path)
+                        self.trace_star.info("[LEAF %s] Step 1: Established an EPR pair with center %s.", self.node_name, center_node)
                         msg = yield from self.send_msg_to_any_node(context,path)
-                        print(f"{ns.sim_time()}us: [LEAF {self.node_name}] Step 1: EPR pair established with {center_node}. Received measurement outcome '{msg}' from center.")
-                        if msg == "0":
-                            print(f"{ns.sim_time()}us: [LEAF {self.node_name}] Step 1: Measurement is 0. Applies H gate to produce three node graph state.")
+                        _, outcome = decode(msg)
+                        self.trace_star.info("[LEAF %s] Step 1: EPR pair established with %s. Received measurement outcome '%s' from center.", self.node_name, center_node, outcome)
+                        if outcome == 0:
+                            self.trace_star.info("[LEAF %s] Step 1: Measurement is 0. Applies H gate to produce three node graph state.", self.node_name)
                             self.epr_qubit_0.H()
                         else:
-                            print(f"{ns.sim_time()}us: [LEAF {self.node_name}] Step 1: Measurement is 1. Applies correction X and then H gate to produce three node graph state.")
+                            self.trace_star.info("[LEAF %s] Step 1: Measurement is 1. Applies correction X and then H gate to produce three node graph state.", self.node_name)
                             self.epr_qubit_0.X()
                             self.epr_qubit_0.H()
                         yield from context.connection.flush()
-                        print(f"{ns.sim_time()}us: [LEAF {self.node_name}] Step 1 complete: Merged second leaf. Currently forming a 3-node graph.")
+                        self.trace_star.info("[LEAF %s] Step 1 complete: Merged second leaf. Currently forming a 3-node graph.", self.node_name)
 
                     elif counter > 1:
                         # For subsequent leaves, the process can be generalized and extended.
                         # The leaves keep receiving EPR pairs from center_node
                         # The states from the leaves are transformed into CZ|+>|+> and merged into the first state from that center node
                         
-                        yield from self.any_node_epr_pair(context,path)
-                        print(f"{ns.sim_time()}us: [LEAF {self.node_name}] Step {counter}: Established an EPR pair with center {center_node}.")
+                        yield from self.attach_pair(context,path)
+                        self.trace_star.info("[LEAF %s] Step %s: Established an EPR pair with center %s.", self.node_name, counter, center_node)
 
-                    for sync_path in center_sync_paths:
-                        yield from self.send_msg_to_any_node(context, sync_path)
-                    for sync_path in leaf_sync_paths:
-                        yield from self.send_msg_to_any_node(context, sync_path,"confirm")
+                    self.cases.append(self.last_case)
+                    yield from self.sync_step(context, center_node, leaf)
                     #print(f"{ns.sim_time()}us: [LEAF {self.node_name}] has synced after step {counter}.")
+                    self.step_times.append(self.sim_time())
                     counter += 1
            
             # --------------------------------------------------------
@@ -266,21 +364,186 @@ class GraphStateDistribution(Program):
             else:
                 #print(f"[{self.node_name} NOT CENTER, NOT CURRENT LEAF]. Step {counter}.")
                 if counter == 0:
-                    yield from self.any_node_epr_pair(context,path,qubit_start="center_qubit")
+                    yield from self.attach_pair(context,path,qubit_start="center_qubit")
                 elif counter == 1:
-                    yield from self.any_node_epr_pair(context,path)
+                    yield from self.attach_pair(context,path)
                     yield from self.send_msg_to_any_node(context,path)
                 elif counter > 1:
-                    yield from self.any_node_epr_pair(context,path)
+                    yield from self.attach_pair(context,path)
 
                 # Sync with center and leaf nodes.
-                for sync_path in center_sync_paths:
-                    yield from self.send_msg_to_any_node(context, sync_path)
-                for sync_path in leaf_sync_paths:
-                    yield from self.send_msg_to_any_node(context, sync_path)
+                yield from self.sync_step(context, center_node, leaf)
                 #print(f"{ns.sim_time()}us: [{self.node_name} NOT CENTER, NOT CURRENT LEAF] has synced after step {counter}.")
+                self.step_times.append(self.sim_time())
                 counter += 1
     
+    def gen_star_graph_fusion(self, context: ProgramContext, center_node: str, leaves: list):
+        """
+        Generate a star graph state by fusing Bell pairs at the center, a batch of leaves at a time.
+
+        The center first shares a Bell pair (corrected to |phi+>) with every leaf of the batch,
+        the chains running back to back without synchronization in between. It then fuses them
+        all into the GHZ state it already holds in a single round: a CNOT from its star qubit
+        onto every new pair, and a Z measurement of each of them. A leaf whose outcome is 1
+        applies X, which extends the GHZ state, and every leaf applies H, which turns the GHZ
+        state into the star graph state centered at the center node.
+
+        The outcomes travel as unicasts in one aggregated exchange together with the center's
+        sync broadcast, which they share frames with since they follow the center's broadcast
+        tree. A request therefore needs one synchronization per batch instead of two broadcasts
+        per leaf, and the center's merge operations happen in one flush per batch.
+
+        :param context: ProgramContext for sockets and connections.
+        :param center_node: The central node of the star graph.
+        :param leaves: The leaf nodes, fused in this order.
+        """
+        size = self.batch_size()
+        batches = [leaves[:size + 1]]
+        batches += [leaves[i:i + size] for i in range(size + 1, len(leaves), size)]
+        for number, batch in enumerate(batches):
+            # The first leaf of the first batch shares its pair with the center's star qubit
+            fused = batch[1:] if number == 0 else batch
+            for slot, leaf in enumerate(batch):
+                first = number == 0 and slot == 0
+                qubit_start = "center_qubit" if first else f"fusion_qubit_{slot - (number == 0)}"
+                yield from self.attach_pair(context, self.routing.path(center_node, leaf),
+                                             qubit_start=qubit_start, qubit_end="epr_qubit_0")
+                if self.node_name == leaf:
+                    self.cases.append(self.last_case)
+                    self.trace_star.info("[LEAF %s] Batch %s: Established an EPR pair with center %s.",
+                                         self.node_name, number, center_node)
+
+            unicasts = []
+            if self.node_name == center_node:
+                fusion_qubits = [getattr(self, f"fusion_qubit_{slot}") for slot in range(len(fused))]
+                for qubit in fusion_qubits:
+                    self.center_qubit.cnot(qubit)
+                results = [qubit.measure() for qubit in fusion_qubits]
+                yield from context.connection.flush()
+                outcomes = [int(result) for result in results]
+                self.outcomes += outcomes
+                unicasts = [(self.routing.path(center_node, leaf), encode(OP_OUTCOME, outcome))
+                            for leaf, outcome in zip(fused, outcomes)]
+                self.trace_star.info("[CENTER %s] Batch %s: Fused %s leaves, outcomes %s.",
+                                     self.node_name, number, len(fused), outcomes)
+            else:
+                unicasts = [(self.routing.path(center_node, leaf), None) for leaf in fused]
+
+            received = yield from self.exchange(context, broadcasts=[(center_node, encode(OP_SYNC))], unicasts=unicasts)
+
+            if self.node_name in batch:
+                outcome = 0
+                if self.node_name in fused:
+                    _, outcome = decode(received[("u", fused.index(self.node_name))])
+                if outcome:
+                    self.epr_qubit_0.X()
+                self.epr_qubit_0.H()
+                yield from context.connection.flush()
+                self.trace_star.info("[LEAF %s] Batch %s: Fusion outcome %s, joined the star graph.",
+                                     self.node_name, number, outcome)
+            self.step_times.append(self.sim_time())
+
+    def gen_graph(self, context: ProgramContext, layers: list, corrections: Optional[dict] = None):
+        """
+        Generate an arbitrary graph state from stars, planned in layers (see planner.py).
+
+        Every vertex of the graph first prepares its graph qubit in |+>, the graph state without
+        edges. Every star edge (center, leaf) is then added by a remote CZ gate on a Bell pair
+        between the two: the center applies a CNOT from its graph qubit onto its half and measures
+        it in Z, the leaf applies a CZ from its half onto its graph qubit and measures it in X, and
+        each sends its outcome to the other, which applies Z if it is 1. The Z corrections commute
+        with every later CZ, so both outcomes travel in the same aggregated exchange, and a vertex
+        shared by several stars needs no merge of its own.
+
+        As in `gen_star_graph_fusion`, the center handles its leaves in batches of `batch_size()`
+        pairs, and one exchange carries the outcomes of the current batch of every star of the
+        layer. There is no global synchronization: all nodes go through the chains in the same
+        order, so the chains of stars on disjoint routes run concurrently.
+
+        :param context: ProgramContext for sockets and connections.
+        :param layers: List of layers, each a list of (center, leaves) stars.
+        :param corrections: Optional dictionary node -> local gates ("H", "S", "Z") applied to its
+            graph qubit at the end, e.g. to turn a locally equivalent graph into the requested one.
+        """
+        vertices = {node for layer in layers for center, leaves in layer for node in [center, *leaves]}
+        if self.node_name in vertices:
+            self.graph_qubit = self.qubit_factory(context.connection)
+            self.graph_qubit.H()
+            yield from context.connection.flush()
+
+        size = self.batch_size()
+        for number, layer in enumerate(layers):
+            batches = max(-(-len(leaves) // size) for _, leaves in layer)
+            for batch_number in range(batches):
+                unicasts = []
+                for center_node, leaves in layer:
+                    batch = leaves[batch_number * size:(batch_number + 1) * size]
+                    leaf_outcome = None
+                    for slot, leaf in enumerate(batch):
+                        yield from self.attach_pair(context, self.routing.path(center_node, leaf),
+                                                     qubit_start=f"fusion_qubit_{slot}", qubit_end="epr_qubit_0")
+                        if self.node_name == leaf:
+                            self.cases.append(self.last_case)
+                            self.epr_qubit_0.cphase(self.graph_qubit)
+                            self.epr_qubit_0.H()
+                            result = self.epr_qubit_0.measure()
+                            yield from context.connection.flush()
+                            leaf_outcome = int(result)
+
+                    center_outcomes = [None] * len(batch)
+                    if self.node_name == center_node:
+                        fusion_qubits = [getattr(self, f"fusion_qubit_{slot}") for slot in range(len(batch))]
+                        for qubit in fusion_qubits:
+                            self.graph_qubit.cnot(qubit)
+                        results = [qubit.measure() for qubit in fusion_qubits]
+                        yield from context.connection.flush()
+                        center_outcomes = [int(result) for result in results]
+                        self.outcomes += center_outcomes
+                        self.trace_star.info("[CENTER %s] Layer %s: Added edges to %s.", self.node_name, number, batch)
+
+                    for leaf, outcome in zip(batch, center_outcomes):
+                        unicasts.append((self.routing.path(center_node, leaf),
+                                         None if outcome is None else encode(OP_OUTCOME, outcome)))
+                        unicasts.append((self.routing.path(leaf, center_node),
+                                         encode(OP_OUTCOME, leaf_outcome) if self.node_name == leaf else None))
+
+                received = yield from self.exchange(context, unicasts=unicasts)
+                if sum(decode(message)[1] for message in received.values()) % 2:
+                    self.graph_qubit.Z()
+                    yield from context.connection.flush()
+                self.step_times.append(self.sim_time())
+
+        if corrections and self.node_name in corrections:
+            for gate in corrections[self.node_name]:
+                getattr(self.graph_qubit, gate)()
+            yield from context.connection.flush()
+
+    def batch_size(self):
+        """
+        Number of pairs fused per batch: `fusion_batch`, less the k - 1 qubits the extra routes
+        of a redundant attachment take at the center (see `attach_pair`), but at least one.
+        """
+        return max(1, self.fusion_batch - (self.redundancy - 1))
+
+    def measure_star_qubit(self, context: ProgramContext):
+        """
+        Measure this node's star qubit in the basis of the current verification setting and
+        store the outcome in `verify_outcome`. Nodes outside the star do nothing.
+
+        :param context: ProgramContext for connections.
+        """
+        if self.node_name == self.center:
+            qubit = self.center_qubit
+        elif self.node_name in self.leaves:
+            qubit = self.epr_qubit_0
+        else:
+            return
+        if measurement_basis(self.verify_setting, self.node_name == self.center) == "X":
+            qubit.H()
+        outcome = qubit.measure()
+        yield from context.connection.flush()
+        self.verify_outcome = int(outcome)
+
     def setup_sockets(self, context: ProgramContext):
         """
         Setup classical and EPR sockets for this node using the provided ProgramContext.
@@ -291,6 +554,73 @@ class GraphStateDistribution(Program):
             setattr(self,f"csocket_{peer}", context.csockets[peer])
             setattr(self,f"epr_socket_{peer}", context.epr_sockets[peer])
 
+    def send_classical(self, csocket, message: str, payloads: int = 1):
+        """
+        Send a message over a classical socket and account for it in the traffic counters.
+
+        :param csocket: The classical socket to a neighboring node.
+        :param message: The (encoded) message string.
+        :param payloads: Number of logical payloads carried by the message.
+        """
+        self.messages_sent += 1
+        self.payloads_sent += payloads
+        csocket.send(message)
+
+    def sync_step(self, context: ProgramContext, center_node: str, leaf: str):
+        """
+        Synchronize all nodes after a leaf-integration step.
+
+        Both the center and the current leaf announce to every other node that they completed
+        the step. With message aggregation, the two announcements are exchanged as broadcasts
+        over the shortest-path trees of the center and the leaf, so each link carries at most
+        one frame per round. Otherwise every announcement is relayed separately along its
+        own shortest path.
+
+        :param context: ProgramContext for connections.
+        :param center_node: The center of the star graph.
+        :param leaf: The leaf integrated in this step.
+        """
+        if self.aggregate_messages:
+            yield from self.exchange(context, broadcasts=[(center_node, encode(OP_SYNC)), (leaf, encode(OP_SYNC))])
+            return
+        for source in (center_node, leaf):
+            for sync_node in self.G.nodes():
+                if sync_node != source:
+                    yield from self.send_msg_to_any_node(context, self.routing.path(source, sync_node), encode(OP_SYNC))
+
+    def exchange(self, context: ProgramContext, broadcasts: List = (), unicasts: List = ()):
+        """
+        Run an aggregated message exchange in which every payload that crosses the same link
+        in the same round is sent as a single frame.
+
+        All nodes must call this with the same broadcasts and unicasts, as the frames carry no
+        headers: the frame layout is derived from the routes (see `messages.FrameSchedule`).
+        Payloads are only read on the node that originates them.
+
+        :param context: ProgramContext for connections.
+        :param broadcasts: List of (source node, encoded payload) delivered to every other node.
+        :param unicasts: List of (path, encoded payload) delivered to the last node of the path.
+        :return: Dictionary mapping ("b", index) or ("u", index) to the payload string, for every
+            broadcast or unicast this node is a destination of.
+        """
+        schedule = FrameSchedule(self.node_name, self.routing,
+                                 broadcasts=[source for source, _ in broadcasts],
+                                 unicasts=[path for path, _ in unicasts])
+        held = {}
+        for kind, index in schedule.originates:
+            message = broadcasts[index][1] if kind == "b" else unicasts[index][1]
+            held[(kind, index)] = ord(message)
+
+        for round_ in schedule.rounds():
+            for peer, items in schedule.sends.get(round_, {}).items():
+                frame = encode_frame(held[item] for item in items)
+                self.send_classical(getattr(self, f"csocket_{peer}"), frame, payloads=len(items))
+            for peer, items in sorted(schedule.recvs.get(round_, {}).items()):
+                frame = yield from getattr(self, f"csocket_{peer}").recv()
+                held.update(zip(items, decode_frame(frame)))
+
+        return {item: chr(held[item]) for item in schedule.delivers}
+
     def send_msg_to_any_node(self, context: ProgramContext, path: List, message: Optional[str] = None):
         """
         Transmit a message along a given path of nodes.
@@ -303,7 +633,7 @@ class GraphStateDistribution(Program):
         :param context: ProgramContext for connections.
         :param path: List of nodes forming a path from a start to an end node.
         :param message: The message to send if this node is at the start of the path.
-        :return: The message received if this node is at the end of the path, else 0.
+        :return: The message received if this node relays it or is at the end of the path, else None.
         """
         
         if self.node_name in path:
@@ -311,7 +641,7 @@ class GraphStateDistribution(Program):
             if self.node_name == path[0]:
                 csocket = getattr(self, f"csocket_{path[1]}")
                 #print(f"{self.node_name} sends <{message}> to {path[1]}")
-                csocket.send(message)
+                self.send_classical(csocket, message, payloads=len(message))
 
             elif self.node_name != path[-1]:
                 csocket_prev = getattr(self, f"csocket_{path[self.current_index-1]}")
@@ -319,7 +649,8 @@ class GraphStateDistribution(Program):
                 #print(f"{self.node_name} receives <{msg}> from {path[self.current_index-1]}")
                 csocket_next = getattr(self, f"csocket_{path[self.current_index+1]}")
                 #print(f"{self.node_name} sends <{msg}> to {path[self.current_index+1]}")
-                csocket_next.send(msg)
+                self.send_classical(csocket_next, msg, payloads=len(msg))
+                return msg
 
             else:
                 csocket_prev = getattr(self, f"csocket_{path[self.current_index-1]}")
@@ -349,7 +680,7 @@ class GraphStateDistribution(Program):
                 epr_socket_next = getattr(self, f"epr_socket_{node2}")
                 qubit = epr_socket_next.create_keep()[0]
                 setattr(self, qubit_start, qubit)  # set the qubit to the specified attribute
-                self.logger.info(f"[EPR pair generation] {self.node_name} creates EPR pair and sends it to {node2}")
+                self.trace_epr.info("[EPR pair generation] %s creates EPR pair and sends it to %s", self.node_name, node2)
                 #print(f"{ns.sim_time()}us: {self.node_name} creates EPR pair and sends it to {node2}")
                 attribute = getattr(self,qubit_start)
 
@@ -357,7 +688,7 @@ class GraphStateDistribution(Program):
                 epr_socket_prev = getattr(self, f"epr_socket_{node1}")
                 qubit = epr_socket_prev.recv_keep()[0]
                 setattr(self, qubit_end, qubit)
-                self.logger.info(f"[EPR pair generation] {self.node_name} receives EPR pair from {node1}")
+                self.trace_epr.info("[EPR pair generation] %s receives EPR pair from %s", self.node_name, node1)
                 #print(f"{ns.sim_time()}us: {self.node_name} receives EPR pair from {node1}")
                 attribute = getattr(self,qubit_end)
             yield from context.connection.flush()
@@ -366,7 +697,8 @@ class GraphStateDistribution(Program):
             yield from context.connection.flush()
 
     def any_node_epr_pair(self, context: ProgramContext, path: List, apply_correction: bool = True, 
-                                qubit_start="epr_qubit_1", qubit_end="epr_qubit_0"):
+                                qubit_start="epr_qubit_1", qubit_end="epr_qubit_0", requested=None,
+                                confirm: bool = True):
         """
         Distribute an EPR pair between the first and last nodes in the given path using a chain of entanglement swaps.
 
@@ -381,7 +713,12 @@ class GraphStateDistribution(Program):
         :param apply_correction: Whether to apply final corrections to ensure a canonical Bell state.
         :param qubit_start: Attribute name to store the qubit at the start node.
         :param qubit_end: Attribute name to store the qubit at the end node.
-        :return: The final qubit at either the start or end node after entanglement swapping and corrections.
+        :param requested: Qubit of this end node's link on the path, if the caller already requested
+            and flushed it (see `attach_pair`).
+        :param confirm: If False, the start node does not confirm the correction along the path and
+            the caller does instead (see `attach_pair`).
+        :return: The final qubit at either the start or end node after entanglement swapping and corrections,
+            or None if the chain failed.
         
         Bell measurements and states are tracked on each node so that only the end nodes apply operations:
 
@@ -405,9 +742,43 @@ class GraphStateDistribution(Program):
         
         Additionally, some of the corrections require gate operations on both end nodes so when apply_correction
         is true, the final state is sent back to the starting node.
+
+        With `early_swap`, repeaters at even positions of the path request the pair with their next
+        node before the one with their previous node. Every link is then requested by both its
+        ends either first or second, so the links of the chain are generated in two rounds instead
+        of one after another. Each repeater swaps as soon as its two pairs are there and folds its
+        outcome into the case once that arrives from upstream: the Bell measurements act on
+        disjoint qubits, so the resulting case does not depend on the order they happened in.
+
+        With a `cutoff`, the program discards link pairs that neither end used within the cutoff
+        time of their link. This can only happen to a pair that both its ends requested first (or
+        that is the only request of an end node of the path), since a repeater uses the pair it
+        requests second as soon as it arrives. Each repeater end of such a pair flushes its
+        requests one by one to learn when the pair arrived, and once its second pair is there
+        tells the other end whether the first one expired by then; the pair is discarded and
+        requested again if it expired at every repeater end (see `_expire_pair`). The end nodes
+        wait for their entire chain and only learn the verdict.
+
+        A link pair can be lost (see `pair_lost`). A repeater holding a lost pair, or receiving
+        OP_FAILURE instead of the case, frees its qubits and passes OP_FAILURE on, the end node
+        frees its qubit and returns OP_FAILURE instead of the case, and the start node frees its
+        qubit too and confirms with OP_FAILURE. Every node of the chain then has `chain_lost` set.
         """
         if len(path) == 2:
-            result = yield from self.adjacent_node_epr_pair(context,path[0],path[1],qubit_start,qubit_end)
+            # A pair between adjacent nodes is delivered as |phi+>, i.e. case "00"
+            self.last_case = 0
+            if requested is not None:
+                setattr(self, qubit_start if self.node_name == path[0] else qubit_end, requested)
+                result = requested
+            else:
+                result = yield from self.adjacent_node_epr_pair(context,path[0],path[1],qubit_start,qubit_end)
+            if self.node_name in path:
+                # Both ends learn of the loss of their pair
+                self.chain_lost = self.pair_lost(result)
+                if self.chain_lost:
+                    result.free()
+                    yield from context.connection.flush()
+                    result = None
             return result
 
         # Establish EPR pairs along connected nodes on the path
@@ -416,107 +787,182 @@ class GraphStateDistribution(Program):
             if self.node_name == path[0]:
                 epr_socket_next = getattr(self, f"epr_socket_{path[1]}")
                 csocket_next = getattr(self, f"csocket_{path[1]}")
-                qubit = epr_socket_next.create_keep()[0]
+                qubit = requested if requested is not None else epr_socket_next.create_keep()[0]
                 setattr(self, qubit_start, qubit)  # set the qubit to the specified attribute
-                self.logger.info(f"[{path[0]}-EPR chain-{path[-1]}]{self.node_name} creates EPR pair and sends it to {path[1]}")
+                checked_peer, checked_cutoff = path[1], self._chain_cutoff(path, 0)
+                self.trace_epr.info("[%s-EPR chain-%s]%s creates EPR pair and sends it to %s", path[0], path[-1], self.node_name, path[1])
                 #print(f"[{path[0]}-EPR chain-{path[-1]}]{self.node_name} creates EPR pair and sends it to {path[1]}")
                 
             elif self.node_name != path[-1]:
                 epr_socket_prev = getattr(self, f"epr_socket_{path[self.current_index-1]}")
                 csocket_prev = getattr(self, f"csocket_{path[self.current_index-1]}")
-                aux_epr_qubit_0 = epr_socket_prev.recv_keep()[0]
-                self.logger.info(f"[{path[0]}-EPR chain-{path[-1]}]{self.node_name} receives EPR pair from {path[self.current_index-1]}")
-                #print(f"[{path[0]}-EPR chain-{path[-1]}]{self.node_name} receives EPR pair from {path[self.current_index-1]}")
-                
                 epr_socket_next = getattr(self, f"epr_socket_{path[self.current_index+1]}")
                 csocket_next = getattr(self, f"csocket_{path[self.current_index+1]}")
-                aux_epr_qubit_1 = epr_socket_next.create_keep()[0]
-                self.logger.info(f"[{path[0]}-EPR chain-{path[-1]}]{self.node_name} creates EPR pair and sends it to {path[self.current_index+1]}")
+                downstream_first = self.early_swap and self.current_index % 2 == 0
+                first_link = self.current_index if downstream_first else self.current_index - 1
+                checked_peer = path[self.current_index + 1] if downstream_first else path[self.current_index - 1]
+                checked_cutoff = self._chain_cutoff(path, first_link)
+                if downstream_first:
+                    # Downstream first: this link and the upstream one are both generated in the first round
+                    aux_epr_qubit_1 = epr_socket_next.create_keep()[0]
+                else:
+                    aux_epr_qubit_0 = epr_socket_prev.recv_keep()[0]
+                if checked_cutoff is not None:
+                    # The arrival of the first pair starts its cutoff
+                    yield from context.connection.flush()
+                    arrived = self.sim_time()
+                if downstream_first:
+                    aux_epr_qubit_0 = epr_socket_prev.recv_keep()[0]
+                else:
+                    aux_epr_qubit_1 = epr_socket_next.create_keep()[0]
+                self.trace_epr.info("[%s-EPR chain-%s]%s receives EPR pair from %s", path[0], path[-1], self.node_name, path[self.current_index - 1])
+                #print(f"[{path[0]}-EPR chain-{path[-1]}]{self.node_name} receives EPR pair from {path[self.current_index-1]}")
+                
+                self.trace_epr.info("[%s-EPR chain-%s]%s creates EPR pair and sends it to %s", path[0], path[-1], self.node_name, path[self.current_index + 1])
                 #print(f"[{path[0]}-EPR chain-{path[-1]}]{self.node_name} creates EPR pair and sends it to {path[self.current_index+1]}")
                 
             else:
                 epr_socket_prev = getattr(self, f"epr_socket_{path[self.current_index-1]}")
                 csocket_prev = getattr(self, f"csocket_{path[self.current_index-1]}")
-                qubit = epr_socket_prev.recv_keep()[0]
+                qubit = requested if requested is not None else epr_socket_prev.recv_keep()[0]
                 setattr(self, qubit_end, qubit)  # set the qubit to the specified attribute
-                self.logger.info(f"[{path[0]}-EPR chain-{path[-1]}]{self.node_name} receives EPR pair from {path[self.current_index-1]}")
+                checked_peer, checked_cutoff = path[-2], self._chain_cutoff(path, len(path) - 2)
+                self.trace_epr.info("[%s-EPR chain-%s]%s receives EPR pair from %s", path[0], path[-1], self.node_name, path[self.current_index - 1])
                 #print(f"[{path[0]}-EPR chain-{path[-1]}]{self.node_name} receives EPR pair from {path[self.current_index-1]}")
             
             yield from context.connection.flush()
+
+            if checked_cutoff is not None:
+                if self.node_name == path[0]:
+                    qubit = yield from self._expire_pair(context, path, checked_peer, qubit)
+                    setattr(self, qubit_start, qubit)
+                elif self.node_name == path[-1]:
+                    qubit = yield from self._expire_pair(context, path, checked_peer, qubit)
+                    setattr(self, qubit_end, qubit)
+                elif downstream_first:
+                    aux_epr_qubit_1 = yield from self._expire_pair(context, path, checked_peer, aux_epr_qubit_1, arrived)
+                else:
+                    aux_epr_qubit_0 = yield from self._expire_pair(context, path, checked_peer, aux_epr_qubit_0, arrived)
             
             if self.node_name == path[1]:
                 
                 # Second node in the chain performs the first Bell measurement and sends result to next node
-                aux_epr_qubit_0.cnot(aux_epr_qubit_1)
-                aux_epr_qubit_0.H()
-                r0 = aux_epr_qubit_0.measure()
-                r1 = aux_epr_qubit_1.measure()
-                self.logger.info(f"[{path[0]} EPR to {path[-1]} operation] {self.node_name} performs entanglement swap")
-                #print(f"[{path[0]} EPR to {path[-1]} operation] {self.node_name} performs entanglement swap")
+                lost = self.pair_lost(aux_epr_qubit_0) or self.pair_lost(aux_epr_qubit_1)
+                if lost:
+                    aux_epr_qubit_0.free()
+                    aux_epr_qubit_1.free()
+                else:
+                    aux_epr_qubit_0.cnot(aux_epr_qubit_1)
+                    aux_epr_qubit_0.H()
+                    r0 = aux_epr_qubit_0.measure()
+                    r1 = aux_epr_qubit_1.measure()
+                    self.trace_epr.info("[%s EPR to %s operation] %s performs entanglement swap", path[0], path[-1], self.node_name)
+                    #print(f"[{path[0]} EPR to {path[-1]} operation] {self.node_name} performs entanglement swap")
                 
                 yield from context.connection.flush()
 
-                result = f"{r0}{r1}"
-                csocket_next.send(result)
-                self.logger.info(f"[{path[0]} EPR to {path[-1]} operation] {self.node_name} measures local qubits: {result}. Sends case {result} to {path[self.current_index+1]}")
-                #print(f"{self.node_name} measures local qubits: {result}. Sends case {result} to {path[self.current_index+1]}")
+                if lost:
+                    self.send_classical(csocket_next, encode(OP_FAILURE))
+                    self.trace_epr.info("[%s EPR to %s operation] %s lost a pair. Sends failure to %s", path[0], path[-1], self.node_name, path[self.current_index + 1])
+                else:
+                    result = f"{r0}{r1}"
+                    self.send_classical(csocket_next, encode(OP_CASE, pack_case(result)))
+                    self.trace_epr.info("[%s EPR to %s operation] %s measures local qubits: %s. Sends case %s to %s", path[0], path[-1], self.node_name, result, result, path[self.current_index + 1])
+                    #print(f"{self.node_name} measures local qubits: {result}. Sends case {result} to {path[self.current_index+1]}")
                 
                 if apply_correction:
                     yield from self.send_msg_to_any_node(context,list(reversed(path)))
-                    # Confirm correction
-                    yield from self.send_msg_to_any_node(context,path)
+                    if confirm:
+                        # Confirm correction
+                        msg = yield from self.send_msg_to_any_node(context,path)
+                        self.chain_lost = decode(msg)[0] == OP_FAILURE
 
             elif self.node_name != path[-1] and self.node_name != path[0]:
                 
-                # Wait for measurement results from previous node
-                current_case = yield from csocket_prev.recv()
-                
-                self.logger.info(f"[{path[0]} EPR to {path[-1]} operation] {self.node_name} receives case {current_case}")
-                #print(f"{self.node_name} receives case {current_case}")
+                # Wait for measurement results from previous node (after the swap with early swapping)
+                lost = self.pair_lost(aux_epr_qubit_0) or self.pair_lost(aux_epr_qubit_1)
+                if not self.early_swap:
+                    msg = yield from csocket_prev.recv()
+                    lost = lost or decode(msg)[0] == OP_FAILURE
                 
                 # Perform entanglement swap and send case to next node
-                aux_epr_qubit_0.cnot(aux_epr_qubit_1)
-                aux_epr_qubit_0.H()
-                r0 = aux_epr_qubit_0.measure()
-                r1 = aux_epr_qubit_1.measure()
+                if lost:
+                    aux_epr_qubit_0.free()
+                    aux_epr_qubit_1.free()
+                else:
+                    aux_epr_qubit_0.cnot(aux_epr_qubit_1)
+                    aux_epr_qubit_0.H()
+                    r0 = aux_epr_qubit_0.measure()
+                    r1 = aux_epr_qubit_1.measure()
                 
-                self.logger.info(f"[{path[0]} EPR to {path[-1]} operation] {self.node_name} performs entanglement swap")
-                #print(f"[{path[0]} EPR to {path[-1]} operation] {self.node_name} performs entanglement swap")
+                    self.trace_epr.info("[%s EPR to %s operation] %s performs entanglement swap", path[0], path[-1], self.node_name)
+                    #print(f"[{path[0]} EPR to {path[-1]} operation] {self.node_name} performs entanglement swap")
                 
                 yield from context.connection.flush()
                 
-                measurement = f"{r0}{r1}"
+                if self.early_swap:
+                    msg = yield from csocket_prev.recv()
+                    lost = lost or decode(msg)[0] == OP_FAILURE
+
+                if lost:
+                    self.send_classical(csocket_next, encode(OP_FAILURE))
+                    self.trace_epr.info("[%s EPR to %s operation] %s lost a pair or received a failure. Sends failure to %s", path[0], path[-1], self.node_name, path[self.current_index + 1])
+                else:
+                    _, packed_case = decode(msg)
+                    current_case = unpack_case(packed_case)
                 
-                case = GraphStateDistribution.check_case(prev_case=current_case, current_measurement=measurement)
+                    self.trace_epr.info("[%s EPR to %s operation] %s receives case %s", path[0], path[-1], self.node_name, current_case)
+                    #print(f"{self.node_name} receives case {current_case}")
                 
-                self.logger.info(f"[{path[0]} EPR to {path[-1]} operation] {self.node_name} measures local qubits: {r0}{r1}. Sends case {case} to {path[self.current_index+1]}")
-                #print(f"[{path[0]} EPR to {path[-1]} operation] {self.node_name} measures local qubits: {r0}{r1}. Sends case {case} to {path[self.current_index+1]}")
+                    # Bitwise equivalent of GraphStateDistribution.check_case on the packed case
+                    packed_case = combine_case(packed_case, int(r0), int(r1))
+                    case = unpack_case(packed_case)
+                
+                    self.trace_epr.info("[%s EPR to %s operation] %s measures local qubits: %s%s. Sends case %s to %s", path[0], path[-1], self.node_name, r0, r1, case, path[self.current_index + 1])
+                    #print(f"[{path[0]} EPR to {path[-1]} operation] {self.node_name} measures local qubits: {r0}{r1}. Sends case {case} to {path[self.current_index+1]}")
 
-                csocket_next.send(case)
+                    self.send_classical(csocket_next, encode(OP_CASE, packed_case))
 
                 if apply_correction:
                     yield from self.send_msg_to_any_node(context,list(reversed(path)))
-                    # Confirm correction
-                    yield from self.send_msg_to_any_node(context,path)
+                    if confirm:
+                        # Confirm correction
+                        msg = yield from self.send_msg_to_any_node(context,path)
+                        self.chain_lost = decode(msg)[0] == OP_FAILURE
                 
             elif self.node_name == path[-1]:
                 
                 # Final node receives final measurement and applies corrections if selected
-                current_case = yield from csocket_prev.recv()
+                msg = yield from csocket_prev.recv()
+                opcode, packed_case = decode(msg)
+                self.chain_lost = opcode == OP_FAILURE or self.pair_lost(qubit)
+                if self.chain_lost:
+                    qubit.free()
+                    yield from context.connection.flush()
+                    msg = encode(OP_FAILURE)
+                    current_case = self.last_case = None
+                    self.trace_epr.info("[%s EPR to %s operation] %s: chain failed", path[0], path[-1], self.node_name)
+                else:
+                    current_case = unpack_case(packed_case)
+                    self.last_case = packed_case
                 
-                self.logger.info(f"[{path[0]} EPR to {path[-1]} operation] {self.node_name} recieves case {current_case}")
-                #print(f"{self.node_name} recieves case {current_case}")
+                    self.trace_epr.info("[%s EPR to %s operation] %s recieves case %s", path[0], path[-1], self.node_name, current_case)
+                    #print(f"{self.node_name} recieves case {current_case}")
                 if apply_correction:
-                    yield from self.send_msg_to_any_node(context,list(reversed(path)),current_case)
-                    yield from self.apply_swap_correction(context,current_case,"end",qubit=qubit_end)
-                    # Confirm correction
-                    yield from self.send_msg_to_any_node(context,path)
+                    yield from self.send_msg_to_any_node(context,list(reversed(path)),msg)
+                    if not self.chain_lost:
+                        yield from self.apply_swap_correction(context,current_case,"end",qubit=qubit_end)
+                    if confirm:
+                        # Confirm correction
+                        yield from self.send_msg_to_any_node(context,path)
+                    if self.chain_lost:
+                        return None
                     end_node_qubit = getattr(self,qubit_end)
-                    self.logger.info(f"[{path[0]} EPR to {path[-1]} operation] {self.node_name} receives EPR pair from {path[0]}")
+                    self.trace_epr.info("[%s EPR to %s operation] %s receives EPR pair from %s", path[0], path[-1], self.node_name, path[0])
                     #print(f"{ns.sim_time()}us: [{path[0]} EPR to {path[-1]} operation] {self.node_name} receives EPR pair from {path[0]}")
                     return end_node_qubit
                 else:
-                    end_node_qubit = getattr(self,qubit_end)
+                    end_node_qubit = None if self.chain_lost else getattr(self,qubit_end)
                     return end_node_qubit, current_case
             
             elif self.node_name == path[0]:
@@ -525,21 +971,225 @@ class GraphStateDistribution(Program):
                 # Pauli operations
                 if apply_correction:
                     msg = yield from self.send_msg_to_any_node(context,list(reversed(path)))
-
-                    yield from self.apply_swap_correction(context,msg,"start",qubit=qubit_start)
-                    # Confirm correction
-                    yield from self.send_msg_to_any_node(context,path,"confirmation")
+                    opcode, packed_case = decode(msg)
+                    self.chain_lost = opcode == OP_FAILURE
+                    if self.chain_lost:
+                        qubit.free()
+                        yield from context.connection.flush()
+                    else:
+                        yield from self.apply_swap_correction(context,unpack_case(packed_case),"start",qubit=qubit_start)
+                    if confirm:
+                        # Confirm correction
+                        yield from self.send_msg_to_any_node(context,path,encode(OP_FAILURE if self.chain_lost else OP_CONFIRMATION))
+                    if self.chain_lost:
+                        return None
                     start_node_qubit = getattr(self,qubit_start)
-                    self.logger.info(f"[{path[0]} EPR to {path[-1]} operation] {self.node_name} created EPR pair and sent to {path[-1]}")
+                    self.trace_epr.info("[%s EPR to %s operation] %s created EPR pair and sent to %s", path[0], path[-1], self.node_name, path[-1])
                     #print(f"{ns.sim_time()}us:{self.node_name} created EPR pair and sent to {path[-1]}")
                     return start_node_qubit
                 
                 else:
+                    # Without the round trip the start node only learns about its own link
+                    self.chain_lost = self.pair_lost(qubit)
                     start_node_qubit = getattr(self,qubit_start)
                     return start_node_qubit
         else:
             yield from context.connection.flush()
     
+    def link_cutoff(self, a: str, b: str):
+        """
+        Program-level cutoff time (ns) of the link between `a` and `b`, or None.
+        """
+        if isinstance(self.cutoff, dict):
+            return self.cutoff.get((a, b), self.cutoff.get((b, a)))
+        return self.cutoff
+
+    def _chain_cutoff(self, path: List, link: int):
+        """
+        Cutoff time of link ``path[link]``-``path[link + 1]`` if `any_node_epr_pair` checks its pair,
+        that is if neither end is a repeater requesting it second, else None.
+        """
+        def second(index, downstream):
+            # Whether the repeater at `index` requests its downstream (or upstream) link second
+            if index in (0, len(path) - 1):
+                return False
+            downstream_first = self.early_swap and index % 2 == 0
+            return downstream != downstream_first
+        if second(link, True) or second(link + 1, False):
+            return None
+        return self.link_cutoff(path[link], path[link + 1])
+
+    def _expire_pair(self, context: ProgramContext, path: List, peer: str, qubit, arrived: Optional[float] = None):
+        """
+        Program-level cutoff check of the pair `qubit` shared with `peer` (see `any_node_epr_pair`).
+
+        A repeater tells its peer whether the pair, which arrived at `arrived`, is older than the
+        cutoff, and learns the same from the peer if it is a repeater too. The pair expired if
+        it did at every repeater end: both ends then free their half and request it again.
+
+        :return: The qubit of the pair, the new one if it expired.
+        """
+        csocket = getattr(self, f"csocket_{peer}")
+        cutoff = self.link_cutoff(self.node_name, peer)
+        expired = True
+        if arrived is not None:
+            expired = self.sim_time() - arrived > cutoff
+            self.send_classical(csocket, encode(OP_CUTOFF, int(expired)))
+        if peer not in (path[0], path[-1]):
+            msg = yield from csocket.recv()
+            expired = expired and decode(msg)[1] == 1
+        if not expired:
+            return qubit
+        qubit.free()
+        epr_socket = getattr(self, f"epr_socket_{peer}")
+        if path.index(self.node_name) < path.index(peer):
+            qubit = epr_socket.create_keep()[0]
+            self.pairs_discarded += 1
+        else:
+            qubit = epr_socket.recv_keep()[0]
+        yield from context.connection.flush()
+        self.trace_epr.info("[%s-EPR chain-%s]%s discards its pair with %s at the cutoff", path[0], path[-1], self.node_name, peer)
+        return qubit
+
+    @staticmethod
+    def pair_lost(qubit):
+        """
+        Whether the EPR pair `qubit` was delivered as is lost. Lost pairs are heralded, so both
+        ends know once their request is flushed; only the stabilizer backend's links lose pairs
+        (``prob_loss``, see fast_backend.py), and NetSquid's qubits are never lost.
+        """
+        return getattr(qubit, "lost", False)
+
+    def attach_pair(self, context: ProgramContext, path: List, qubit_start="epr_qubit_1", qubit_end="epr_qubit_0"):
+        """
+        Share a corrected Bell pair between the first and last nodes of `path`, in rounds until
+        one succeeds despite lost link pairs.
+
+        With `redundancy` 1, a round is the EPR chain of `any_node_epr_pair` along `path`, and
+        a failed chain is simply run again. With `redundancy` k > 1, a round runs EPR chains over
+        up to k node-disjoint routes (`RoutingTable.disjoint_paths`, `path` first) at once: the
+        start node requests the pairs of its links on every route in one flush, so the chains
+        of all routes run in parallel. Both end nodes keep the pair of the first route that
+        succeeded, without waiting for the later ones, and consume the others (see
+        `_redundant_round`); only when all routes failed does the attachment take another round.
+
+        All nodes must call this with the same arguments, in the same order. The start node
+        records the duration of the attachment, from entering it until it holds its corrected
+        half of the pair, in `chain_latencies`, and its number of rounds in `attachment_rounds`.
+
+        :param context: ProgramContext for connections.
+        :param path: The shortest path from the start to the end node.
+        :param qubit_start: Attribute name to store the qubit at the start node.
+        :param qubit_end: Attribute name to store the qubit at the end node.
+        :return: The corrected qubit at either end node, else None.
+        """
+        attachment_start = self.sim_time()
+        routes = [path]
+        if self.redundancy > 1:
+            routes = self.routing.disjoint_paths(path[0], path[-1], self.redundancy)
+        rounds = 0
+        done = False
+        while not done:
+            rounds += 1
+            if len(routes) == 1:
+                qubit = yield from self.any_node_epr_pair(context, path, qubit_start=qubit_start, qubit_end=qubit_end)
+                done = self.node_name not in path or not self.chain_lost
+            else:
+                qubit, done = yield from self._redundant_round(context, routes, qubit_start, qubit_end)
+            if not done:
+                self.trace_epr.info("[%s-attachment-%s] %s: round %s failed", path[0], path[-1], self.node_name, rounds)
+        if self.node_name == path[0]:
+            self.chain_latencies.append(self.sim_time() - attachment_start)
+            self.attachment_rounds.append(rounds)
+        return qubit
+
+    def _redundant_round(self, context: ProgramContext, routes: List, qubit_start: str, qubit_end: str):
+        """
+        One round of `attach_pair` over several node-disjoint routes.
+
+        The end nodes hold the qubit of route j as ``route_qubit_<j>``, and the chains run without
+        their correction round trips. A program waits on one socket at a time, so the end node
+        takes the routes in the order they are expected to complete, shortest first (see
+        `RoutingTable.disjoint_paths`), and keeps the first one that succeeded without waiting
+        for the later ones; on links with fixed generation times this is the route that completed
+        first. It returns the route and its case to the start node right away, along the shortest
+        path whatever its links did, and both apply their corrections. Only then does the end
+        node take the remaining chains in and free their pairs, while the start node already
+        holds its corrected qubit. Finally the start node confirms to every node of every route
+        in one aggregated `exchange`, with OP_CONFIRMATION, or with OP_FAILURE if all routes
+        failed, which tells the repeaters whether there is another round.
+
+        :return: Tuple (the kept qubit on the end nodes, else None, and whether the attachment is done).
+        """
+        start_node, end_node = routes[0][0], routes[0][-1]
+        requested = [None] * len(routes)
+        if self.node_name == start_node:
+            for j, route in enumerate(routes):
+                requested[j] = getattr(self, f"epr_socket_{route[1]}").create_keep()[0]
+            yield from context.connection.flush()
+
+        def chain(j):
+            # The chain of route j without corrections; whether this node still holds a pair of it
+            yield from self.any_node_epr_pair(context, routes[j], apply_correction=False, qubit_start=f"route_qubit_{j}",
+                                              qubit_end=f"route_qubit_{j}", requested=requested[j])
+            # A lost pair of a direct link, and a failed chain at the end node, are already freed
+            return not (self.chain_lost and (self.node_name == end_node or len(routes[j]) == 2))
+
+        qubit = None
+        chosen = None
+        held = [False] * len(routes)
+        if self.node_name == end_node:
+            for j in range(len(routes)):
+                held[j] = yield from chain(j)
+                if not self.chain_lost:
+                    chosen = j
+                    break
+            message = encode(OP_FAILURE)
+            if chosen is not None:
+                message = encode(OP_ROUTE, chosen) + encode(OP_CASE, self.last_case)
+            yield from self.send_msg_to_any_node(context, list(reversed(routes[0])), message)
+            case = self.last_case
+            if chosen is not None:
+                qubit = getattr(self, f"route_qubit_{chosen}")
+                setattr(self, qubit_end, qubit)
+                yield from self.apply_swap_correction(context, unpack_case(case), "end", qubit=qubit_end)
+            # The later routes complete in the background of the attachment
+            for j in range(len(routes) if chosen is None else chosen + 1, len(routes)):
+                held[j] = yield from chain(j)
+            self.last_case = case if chosen is not None else None
+        else:
+            for j in range(len(routes)):
+                held[j] = yield from chain(j)
+            msg = yield from self.send_msg_to_any_node(context, list(reversed(routes[0])))
+            if self.node_name == start_node:
+                opcode, chosen = decode(msg[0])
+                if opcode == OP_ROUTE:
+                    qubit = getattr(self, f"route_qubit_{chosen}")
+                    setattr(self, qubit_start, qubit)
+                    self.last_case = decode(msg[1])[1]
+                    yield from self.apply_swap_correction(context, unpack_case(self.last_case), "start", qubit=qubit_start)
+                else:
+                    chosen = None
+
+        if self.node_name in (start_node, end_node):
+            # The pairs of the other routes are consumed
+            for j in range(len(routes)):
+                if held[j] and j != chosen:
+                    getattr(self, f"route_qubit_{j}").free()
+            yield from context.connection.flush()
+
+        confirmation = None
+        if self.node_name == start_node:
+            confirmation = encode(OP_CONFIRMATION if chosen is not None else OP_FAILURE)
+        received = yield from self.exchange(context, unicasts=[(route[:i + 1], confirmation) for route in routes
+                                                               for i in range(1, len(route))])
+        done = True
+        if self.node_name in (start_node, end_node):
+            done = chosen is not None
+        elif received:
+            done = all(decode(message)[0] != OP_FAILURE for message in received.values())
+        return qubit, done
+
     def apply_swap_correction(self, context: ProgramContext, case, node, qubit= None):
         """
         Apply necessary corrections on the final qubit based on the case string.
@@ -562,45 +1212,45 @@ class GraphStateDistribution(Program):
             else:
                 end_node_qubit=getattr(self,qubit)
             if case == "00":
-                self.logger.info(f"[Apply correction operation] State is |phi+>. No correction needed for {self.node_name}.")
+                self.trace_correction.info("[Apply correction operation] State is |phi+>. No correction needed for %s.", self.node_name)
                 #print((f"[Apply correction operation] State is |phi+>. No correction needed for {self.node_name}."))
             elif case == "01":
-                self.logger.info(f"[Apply correction operation] State is |psi+>. Applying Pauli-X correction at {self.node_name}.")
+                self.trace_correction.info("[Apply correction operation] State is |psi+>. Applying Pauli-X correction at %s.", self.node_name)
                 #print(f"[Apply correction operation] State is |psi+>. Applying Pauli-X correction at {self.node_name}.")
                 end_node_qubit.X()
                 yield from context.connection.flush()
             elif case == "10":
-                self.logger.info(f"[Apply correction operation] State is |phi->. Applying Pauli-Z correction at {self.node_name}.")
+                self.trace_correction.info("[Apply correction operation] State is |phi->. Applying Pauli-Z correction at %s.", self.node_name)
                 #print(f"[Apply correction operation] State is |phi->. Applying Pauli-Z correction at {self.node_name}.")
                 end_node_qubit.Z()
                 yield from context.connection.flush()
             elif case == "11":
-                self.logger.info(f"[Apply correction operation] State is |psi->. Applying Pauli-X and Pauli-Z correction at {self.node_name}.")
+                self.trace_correction.info("[Apply correction operation] State is |psi->. Applying Pauli-X and Pauli-Z correction at %s.", self.node_name)
                 #print(f"[Apply correction operation] State is |psi->. Applying Pauli-X and Pauli-Z correction at {self.node_name}.")
                 end_node_qubit.X()
                 end_node_qubit.Z()
                 yield from context.connection.flush()
             elif case == "-00":
-                self.logger.info(f"[Apply correction operation] State is -|phi+>. Applying XZX correction at {self.node_name}.")
+                self.trace_correction.info("[Apply correction operation] State is -|phi+>. Applying XZX correction at %s.", self.node_name)
                 #print(f"[Apply correction operation] State is -|phi+>. Applying XZX correction at {self.node_name}.")
                 end_node_qubit.X()
                 end_node_qubit.Z()
                 end_node_qubit.X()
                 yield from context.connection.flush()
             elif case == "-01":
-                self.logger.info(f"[Apply correction operation] State is -|psi+>. Applying XZ correction at {self.node_name}.")
+                self.trace_correction.info("[Apply correction operation] State is -|psi+>. Applying XZ correction at %s.", self.node_name)
                 #print(f"[Apply correction operation] State is -|psi+>. Applying XZ correction at {self.node_name}.")
                 end_node_qubit.Z()
                 end_node_qubit.X()
                 yield from context.connection.flush()
             elif case == "-10":
-                self.logger.info(f"[Apply correction operation] State is -|phi->. Applying ZX correction at {self.node_name}.")
+                self.trace_correction.info("[Apply correction operation] State is -|phi->. Applying ZX correction at %s.", self.node_name)
                 #print(f"[Apply correction operation] State is -|phi->. Applying ZX correction at {self.node_name}.")
                 end_node_qubit.X()
                 end_node_qubit.Z()
                 yield from context.connection.flush()
             elif case == "-11":
-                self.logger.info(f"[Apply correction operation] State is -|psi->. Applying XZ correction at {self.node_name}.")
+                self.trace_correction.info("[Apply correction operation] State is -|psi->. Applying XZ correction at %s.", self.node_name)
                 #print(f"[Apply correction operation] State is -|psi->. Applying XZ correction at {self.node_name}.")
                 end_node_qubit.Z()
                 end_node_qubit.X()
@@ -611,34 +1261,34 @@ class GraphStateDistribution(Program):
             else:
                 start_node_qubit=getattr(self,qubit)
             if case == "00":
-                self.logger.info(f"[Apply correction operation] State is |phi+>. No correction needed for {self.node_name}.")
+                self.trace_correction.info("[Apply correction operation] State is |phi+>. No correction needed for %s.", self.node_name)
                 #print(f"[Apply correction operation] State is |phi+>. No correction needed for {self.node_name}.")
             elif case == "01":
-                self.logger.info(f"[Apply correction operation] State is |psi+>. No correction needed for {self.node_name}.")
+                self.trace_correction.info("[Apply correction operation] State is |psi+>. No correction needed for %s.", self.node_name)
                 #print(f"[Apply correction operation] State is |psi+>. No correction needed for {self.node_name}.")
             elif case == "10":
-                self.logger.info(f"[Apply correction operation] State is |phi->. No correction needed for {self.node_name}.")
+                self.trace_correction.info("[Apply correction operation] State is |phi->. No correction needed for %s.", self.node_name)
                 #print(f"[Apply correction operation] State is |phi->. No correction needed for {self.node_name}.")
             elif case == "11":
-                self.logger.info(f"[Apply correction operation] State is |psi->. No correction needed for {self.node_name}.")
+                self.trace_correction.info("[Apply correction operation] State is |psi->. No correction needed for %s.", self.node_name)
                 #print(f"[Apply correction operation] State is |psi->. No correction needed for {self.node_name}.")
             elif case == "-00":
-                self.logger.info(f"[Apply correction operation] State is -|phi+>. Applying Pauli-Z correction at {self.node_name}.")
+                self.trace_correction.info("[Apply correction operation] State is -|phi+>. Applying Pauli-Z correction at %s.", self.node_name)
                 #print(f"[Apply correction operation] State is -|phi+>. Applying Pauli-Z correction at {self.node_name}.")
                 start_node_qubit.Z()
                 yield from context.connection.flush()
             elif case == "-01":
-                self.logger.info(f"[Apply correction operation] State is -|psi+>. Applying Pauli-Z correction at {self.node_name}.")
+                self.trace_correction.info("[Apply correction operation] State is -|psi+>. Applying Pauli-Z correction at %s.", self.node_name)
                 #print(f"[Apply correction operation] State is -|psi+>. Applying Pauli-Z correction at {self.node_name}.")
                 start_node_qubit.Z()
                 yield from context.connection.flush()
             elif case == "-10":
-                self.logger.info(f"[Apply correction operation] State is -|phi->. Applying Pauli-X correction at {self.node_name}.")
+                self.trace_correction.info("[Apply correction operation] State is -|phi->. Applying Pauli-X correction at %s.", self.node_name)
                 #print(f"[Apply correction operation] State is -|phi->. Applying Pauli-X correction at {self.node_name}.")
                 start_node_qubit.X()
                 yield from context.connection.flush()
             elif case == "-11":
-                self.logger.info(f"[Apply correction operation] State is -|psi->.  No correction needed for {self.node_name}.")
+                self.trace_correction.info("[Apply correction operation] State is -|psi->.  No correction needed for %s.", self.node_name)
                 #print(f"[Apply correction operation] State is -|psi->. No correction needed for {self.node_name}.")
     
     @staticmethod
@@ -0,0 +1,330 @@
+"""
+Analytical latency and resource model of star requests.
+
+`LatencyModel` predicts the simulated duration, the link-level EPR pairs and the classical
+messages of (center, leaves) requests without simulating them. It follows the structure
+of the sequential `GraphStateDistribution` protocol step by step, with every link generation taking its expected
+time (``t_cycle / prob_success``) and every random correction its expected number of gates:
+
+- EPR chain along the route from the center to the leaf. A repeater requests the link to
+  its next hop only after the pair with its previous hop arrived, so the links of a chain
+  are generated one after the other. The swap cases then travel down the chain, each
+  repeater swapping once its own pair and the case from upstream are there. With early
+  swapping, the links are generated in two rounds (the links starting at even positions
+  first) and every repeater swaps once its own pairs are there. A round then waits for the
+  slowest of its random link times, which the expected times underestimate on lossy links.
+- Correction round trip: the end node sends the final case back to the start, both apply
+  their Pauli corrections and the start confirms to the end.
+- Merge operations at the center (and, for the second leaf, the outcome message to the
+  leaf and its correction).
+- Global synchronization: the aggregated exchange of the center's and the leaf's
+  broadcasts (see `messages.FrameSchedule`), evaluated round by round, so every node
+  starts the next step at the time its own exchange finishes.
+
+Each node carries its own clock through the steps, and all of this is vectorized over a
+batch of requests, so thousands of candidate requests are evaluated per second; `rank`
+orders them by predicted duration. The model assumes message aggregation (the default)
+and ignores memory decoherence, which does not affect timing. `validate` compares it with
+simulated runs: by default on the stabilizer backend, whose timing follows the same squidasm
+stack assumptions as the model, so only ``backend="netsquid"`` checks it against NetSquid.
+
+Usage::
+
+    python latency_model.py network_configs/network_config_noisy.yaml requests.jsonl --validate --seeds 20
+"""
+import argparse
+import json
+
+import numpy as np
+
+from fast_backend import FastNetwork
+from routing import RoutingTable
+from yaml_to_nx import yaml_to_nx
+
+
+class LatencyModel:
+    """
+    Analytical model of the star requests on one network.
+
+    :param config_file: Path to the YAML network configuration.
+    :param routing: `RoutingTable` of the protocol runs to predict, if already built. Routes
+        must match the simulation's, so by default one is built the way `StarRequestRunner` does.
+    :param network: `FastNetwork` providing the device, link and clink parameters, if already
+        parsed; links added to or removed from it are taken into account.
+    :param early_swap: Model the programs' `early_swap` option.
+    """
+
+    def __init__(self, config_file, routing=None, network=None, early_swap=False):
+        # The stabilizer backend's parser provides the device, link and clink parameters
+        self.network = network if network is not None else FastNetwork(config_file)
+        network = self.network
+        self.G = routing.G if routing is not None else yaml_to_nx(config_file)
+        self.routing = routing if routing is not None else RoutingTable(self.G)
+        self.nodes = list(self.G.nodes())
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        self._links = network.links
+        self._clink_delays = network.clink_delays
+        self.early_swap = early_swap
+
+        devices = [network.devices[node] for node in self.nodes]
+        self.t_init = np.array([d.init_time for d in devices], dtype=float)
+        self.t_single = np.array([d.single_qubit_gate_time for d in devices], dtype=float)
+        self.t_two = np.array([d.two_qubit_gate_time for d in devices], dtype=float)
+        self.t_measure = np.array([d.measure_time for d in devices], dtype=float)
+        self._trees = {}
+
+    def link_time(self, a, b):
+        """
+        Expected generation time (ns) of one EPR pair on the link between `a` and `b`.
+        """
+        model = self._links[frozenset((a, b))]
+        return model.t_cycle / model.prob_success
+
+    def link_attempts(self, a, b):
+        """
+        Expected number of generation attempts for one EPR pair on the link between `a` and `b`.
+        """
+        return 1 / self._links[frozenset((a, b))].prob_success
+
+    def _tree(self, source):
+        """
+        Arrays over all nodes describing the routing tree of `source`: parent index (-1 at the
+        root), depth, and expected link time, link attempts and clink delay to the parent.
+        """
+        arrays = self._trees.get(source)
+        if arrays is None:
+            tree = self.routing.tree(source)
+            n = len(self.nodes)
+            parent = np.full(n, -1, dtype=np.int64)
+            depth = np.zeros(n, dtype=np.int64)
+            link = np.zeros(n)
+            attempts = np.zeros(n)
+            delay = np.zeros(n)
+            for node, up in tree.parent.items():
+                i = self.index[node]
+                parent[i] = self.index[up]
+                depth[i] = tree.depth[node]
+                link[i] = self.link_time(node, up)
+                attempts[i] = self.link_attempts(node, up)
+                delay[i] = self._clink_delays.get(frozenset((node, up)), 0.)
+            arrays = self._trees[source] = (parent, depth, link, attempts, delay)
+        return arrays
+
+    def invalidate(self, sources):
+        """
+        Drop the cached routing trees of `sources`, e.g. the sources affected by a
+        `routing.TopologyChange`.
+        """
+        for source in sources:
+            self._trees.pop(source, None)
+
+    def _rows(self, sources):
+        trees = [self._tree(source) for source in sources]
+        return [np.stack(columns) for columns in zip(*trees)]
+
+    def predict(self, requests):
+        """
+        Predict a batch of requests.
+
+        :param requests: List of (center, leaves) tuples.
+        :return: Dictionary of arrays with one entry per request: "sim_time" (ns), "step_times"
+            (ns, NaN-padded array (requests, max leaves) of the step completion times),
+            "epr_pairs", "epr_attempts" (expected) and "messages".
+        """
+        num = len(requests)
+        n = len(self.nodes)
+        rows = np.arange(num)
+        num_leaves = np.array([len(leaves) for _, leaves in requests])
+        centers = [center for center, _ in requests]
+        c_parent, c_depth, c_link, c_attempts, c_delay = self._rows(centers)
+        c_index = np.array([self.index[center] for center in centers])
+
+        t1, t2, tm, ti = self.t_single, self.t_two, self.t_measure, self.t_init
+        start = np.zeros((num, n))
+        step_times = np.full((num, max(num_leaves, default=0)), np.nan)
+        epr_pairs = np.zeros(num, dtype=np.int64)
+        epr_attempts = np.zeros(num)
+        messages = np.zeros(num, dtype=np.int64)
+
+        for k in range(max(num_leaves, default=0)):
+            active = k < num_leaves
+            leaves = [request[1][k] if k < len(request[1]) else center
+                      for request, center in zip(requests, centers)]
+            l_index = np.array([self.index[leaf] for leaf in leaves])
+            hops = np.where(active, c_depth[rows, l_index], 0)
+
+            # Route from the center (position 0) to the leaf (position hops), padded with the leaf
+            max_hops = int(hops.max(initial=0))
+            path = np.empty((num, max_hops + 1), dtype=np.int64)
+            node = l_index.copy()
+            for back in range(max_hops + 1):
+                position = hops - back
+                valid = position >= 0
+                path[rows[valid], position[valid]] = node[valid]
+                node = np.where(valid & (node != c_index), c_parent[rows, np.maximum(node, 0)], node)
+            for position in range(max_hops + 1):
+                pad = position > hops
+                path[pad, position] = l_index[pad]
+            # Link time and clink delay of the link from position i to i + 1 (0 past the leaf)
+            beyond = np.arange(max_hops)[None, :] >= hops[:, None]
+            link = np.where(beyond, 0., c_link[rows[:, None], path[:, 1:]])
+            delay = np.where(beyond, 0., c_delay[rows[:, None], path[:, 1:]])
+            epr_pairs += hops
+            epr_attempts += np.where(beyond, 0., c_attempts[rows[:, None], path[:, 1:]]).sum(axis=1)
+
+            # Chain generation: link i starts once link i - 1 is there and node i + 1 started,
+            # and own[:, i] is the time repeater i holds both of its pairs
+            generated = np.empty((num, max_hops))
+            own = np.empty((num, max_hops))
+            if self.early_swap:
+                # Links at even positions first, then the others once both their ends got their first pair
+                for i in range(0, max_hops, 2):
+                    generated[:, i] = np.maximum(start[rows, path[:, i]], start[rows, path[:, i + 1]]) + link[:, i]
+                for i in range(1, max_hops, 2):
+                    after = generated[:, i + 1] if i + 1 < max_hops else np.zeros(num)
+                    ready = np.where(i + 1 < hops, after, start[rows, path[:, i + 1]])
+                    generated[:, i] = np.maximum(generated[:, i - 1], ready) + link[:, i]
+                own[:, 1:] = np.maximum(generated[:, :-1], generated[:, 1:])
+            else:
+                done = start[rows, c_index]
+                for i in range(max_hops):
+                    done = np.maximum(done, start[rows, path[:, i + 1]]) + link[:, i]
+                    generated[:, i] = done
+                own[:] = generated
+            # Swaps at the repeaters: own pairs and the case from upstream are needed, or with
+            # early swapping only the own pairs, the case being forwarded once it arrives
+            swap_time = t2[path] + t1[path] + 2 * tm[path]
+            case_at = np.full(num, -np.inf)
+            for i in range(1, max_hops):
+                if self.early_swap:
+                    forwarded = np.maximum(own[:, i] + swap_time[:, i], case_at)
+                else:
+                    forwarded = np.maximum(own[:, i], case_at) + swap_time[:, i]
+                case_at = np.where(i < hops, forwarded + delay[:, i], case_at)
+            end_generated = generated[rows, np.maximum(hops - 1, 0)] if max_hops else start[rows, c_index]
+            chain = hops >= 2
+            total_delay = delay.sum(axis=1)
+            # Correction round trip: expected gates are 13/8 at the end and 3/8 at the start
+            case_known = np.maximum(end_generated, case_at)
+            start_done = np.where(chain, case_known + total_delay + 3 / 8 * t1[c_index], end_generated)
+            leaf_done = np.where(chain, np.maximum(case_known + 13 / 8 * t1[l_index], start_done + total_delay),
+                                 end_generated)
+            prefix_delay = np.concatenate([np.zeros((num, 1)), np.cumsum(delay, axis=1)], axis=1)
+            relay_done = start_done[:, None] + prefix_delay
+            messages += np.where(chain, 3 * hops - 1, 0)
+
+            # Merge at the center
+            if k == 1:
+                center_done = start_done + t2[c_index] + tm[c_index]
+                relay_done = np.maximum(relay_done, center_done[:, None] + prefix_delay)
+                leaf_done = np.maximum(leaf_done, center_done + total_delay) + 1.5 * t1[l_index]
+                messages += hops
+            elif k > 1:
+                center_done = start_done + ti[c_index] + 6 * t1[c_index] + 2 * t2[c_index] + 2 * tm[c_index]
+            else:
+                center_done = start_done
+
+            ready = start.copy()
+            repeater_rows, repeater_positions = np.nonzero((np.arange(max_hops + 1)[None, :] > 0)
+                                                           & (np.arange(max_hops + 1)[None, :] < hops[:, None]))
+            ready[repeater_rows, path[repeater_rows, repeater_positions]] = relay_done[repeater_rows, repeater_positions]
+            ready[rows, c_index] = center_done
+            ready[rows, l_index] = np.where(active, leaf_done, ready[rows, l_index])
+
+            # Aggregated sync exchange, round by round over both broadcast trees
+            l_parent, l_depth, _, _, l_delay = self._rows(leaves)
+            finish = ready
+            for round_ in range(int(max(c_depth.max(initial=0), l_depth.max(initial=0)))):
+                previous = finish
+                finish = previous.copy()
+                for parent, depth, edge_delay in ((c_parent, c_depth, c_delay), (l_parent, l_depth, l_delay)):
+                    receiving = depth - 1 == round_
+                    arrival = np.take_along_axis(previous, np.maximum(parent, 0), axis=1) + edge_delay
+                    finish = np.where(receiving, np.maximum(finish, arrival), finish)
+            # One frame per tree link, shared where both trees use the same link in the same round
+            shared = (c_parent == l_parent) & (c_depth == l_depth) & (c_parent >= 0)
+            messages += np.where(active, 2 * (n - 1) - shared.sum(axis=1), 0)
+
+            start = np.where(active[:, None], finish, start)
+            step_times[active, k] = finish[active, c_index[active]]
+
+        return {
+            "sim_time": start.max(axis=1),
+            "step_times": step_times,
+            "epr_pairs": epr_pairs,
+            "epr_attempts": epr_attempts,
+            "messages": messages,
+        }
+
+    def rank(self, requests):
+        """
+        Order requests by predicted duration.
+
+        :return: List of (predicted sim_time, request) tuples, fastest first.
+        """
+        times = self.predict(requests)["sim_time"]
+        return [(float(times[i]), requests[i]) for i in np.argsort(times, kind="stable")]
+
+
+def validate(config_file, requests, seeds=range(10), backend="fast", early_swap=False):
+    """
+    Compare predictions with the mean simulated time over `seeds` for every request.
+
+    :param backend: Backend of the simulated runs (see `batch_runner.StarRequestRunner`). The
+        "fast" backend shares the model's timing assumptions; "netsquid" needs NetSquid.
+    :return: List of dictionaries with the request, the predicted and the simulated mean and
+        standard deviation of sim_time, and both message counts.
+    """
+    from batch_runner import StarRequestRunner
+
+    runner = StarRequestRunner(config_file, backend=backend, early_swap=early_swap)
+    model = LatencyModel(config_file, routing=runner.routing, early_swap=early_swap)
+    prediction = model.predict(requests)
+    report = []
+    for i, (center, leaves) in enumerate(requests):
+        runs = [runner.run_request(center, leaves, seed=seed) for seed in seeds]
+        sim_times = np.array([run["sim_time"] for run in runs])
+        report.append({
+            "center": center,
+            "leaves": leaves,
+            "predicted": float(prediction["sim_time"][i]),
+            "simulated": float(sim_times.mean()),
+            "simulated_std": float(sim_times.std()),
+            "predicted_messages": int(prediction["messages"][i]),
+            "simulated_messages": runs[0]["messages"],
+        })
+    return report
+
+
+def main():
+    import tracing
+
+    parser = argparse.ArgumentParser(description="Predict the duration and resources of star requests.")
+    parser.add_argument("config", help="YAML network configuration.")
+    parser.add_argument("requests", help="JSONL file with one {center, leaves} request per line.")
+    parser.add_argument("--validate", action="store_true", help="Also simulate every request and compare.")
+    parser.add_argument("--seeds", type=int, default=10, help="Simulated runs per request when validating.")
+    parser.add_argument("--backend", default="fast", choices=["fast", "netsquid"])
+    parser.add_argument("--early-swap", action="store_true", help="Model the programs' early swapping.")
+    args = parser.parse_args()
+
+    with open(args.requests, 'r') as f:
+        requests = [(r["center"], r["leaves"]) for r in map(json.loads, filter(str.strip, f))]
+    if args.validate:
+        tracing.disable()
+        for row in validate(args.config, requests, range(args.seeds), args.backend, args.early_swap):
+            error = row["predicted"] / row["simulated"] - 1 if row["simulated"] else 0.
+            print(f"{row['center']} -> {len(row['leaves'])} leaves: predicted {row['predicted']:.4g} ns, "
+                  f"simulated {row['simulated']:.4g} +- {row['simulated_std']:.2g} ns ({error:+.1%}), "
+                  f"messages {row['predicted_messages']} / {row['simulated_messages']}")
+    else:
+        model = LatencyModel(args.config, early_swap=args.early_swap)
+        prediction = model.predict(requests)
+        for i, (center, leaves) in enumerate(requests):
+            print(f"{center} -> {len(leaves)} leaves: {prediction['sim_time'][i]:.4g} ns, "
+                  f"{prediction['epr_pairs'][i]} EPR pairs ({prediction['epr_attempts'][i]:.1f} attempts), "
+                  f"{prediction['messages'][i]} messages")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+"""
+Classical graph state manipulation on bitsets, and search of local-complementation orbits.
+
+A `GraphState` stores one adjacency row per vertex as a Python integer whose bit ``j`` is
+set when the vertex is linked to vertex ``j``. The graph operations then touch whole rows
+at once:
+
+- local complementation at ``v`` complements the subgraph among the neighbours of ``v``,
+  which XORs the neighbourhood row of ``v`` into the row of each neighbour, i.e. deg(v) row
+  operations of n / 64 machine words each,
+- vertex deletion (a Z measurement of the vertex) clears its row and its bit in the rows of
+  its neighbours,
+- an edge toggle (a CZ gate) flips one bit in two rows.
+
+Local complementation changes the graph but not the entanglement of the state:
+
+    |tau_v(G)> = sqrt(-iX)_v prod_{u in N(v)} sqrt(iZ)_u |G>,
+
+so every graph in the LC orbit of a requested graph yields the requested state after local
+Clifford gates, without any further communication. `search_orbit` explores the orbit breadth
+first, up to a depth and a number of graphs, and returns the member with the lowest cost
+under a cost callback together with the local corrections. `DistributionCost` is such a
+callback: the EPR pairs and rounds of building the graph from stars on a given topology.
+
+Usage::
+
+    target = GraphState.from_edges([("node_0", "node_1"), ("node_1", "node_2"), ...])
+    result = search_orbit(target, DistributionCost(RoutingTable(G)), max_depth=4)
+    result.graph, result.cost    # graph to distribute and its (EPR pairs, rounds)
+    result.corrections()         # per vertex gates turning result.graph into target
+"""
+from collections import namedtuple
+
+import networkx as nx
+
+if hasattr(int, "bit_count"):
+    def _popcount(row):
+        return row.bit_count()
+else:
+    def _popcount(row):
+        return bin(row).count("1")
+
+
+def _bits(row):
+    """
+    Indices of the set bits of `row`, in increasing order.
+    """
+    while row:
+        low = row & -row
+        yield low.bit_length() - 1
+        row ^= low
+
+
+class GraphState:
+    """
+    Graph of a graph state over named vertices, as integer bitset adjacency rows.
+
+    :param vertices: Vertex names, e.g. network nodes. Vertex ``i`` is bit ``i`` of the rows.
+    :param rows: Optional adjacency rows; by default the graph has no edges.
+    """
+
+    def __init__(self, vertices, rows=None):
+        self.labels = list(vertices)
+        self.index = {label: i for i, label in enumerate(self.labels)}
+        self.rows = list(rows) if rows is not None else [0] * len(self.labels)
+        # Vertices not deleted yet
+        self.active = (1 << len(self.labels)) - 1
+
+    @classmethod
+    def from_edges(cls, edges, vertices=None):
+        """
+        Graph with the given edges, over `vertices` (by default the endpoints in order of appearance).
+        """
+        edges = list(edges)
+        if vertices is None:
+            vertices = list(dict.fromkeys(label for edge in edges for label in edge))
+        graph = cls(vertices)
+        for a, b in edges:
+            if not graph.has_edge(a, b):
+                graph.toggle_edge(a, b)
+        return graph
+
+    @classmethod
+    def from_networkx(cls, G):
+        return cls.from_edges(G.edges(), vertices=G.nodes())
+
+    def to_networkx(self):
+        G = nx.Graph()
+        G.add_nodes_from(self.vertices)
+        G.add_edges_from(self.edges())
+        return G
+
+    def copy(self):
+        graph = GraphState.__new__(GraphState)
+        graph.labels, graph.index = self.labels, self.index
+        graph.rows = self.rows.copy()
+        graph.active = self.active
+        return graph
+
+    def key(self):
+        """
+        Hashable identity of the graph (for graphs over the same vertices).
+        """
+        return self.active, tuple(self.rows)
+
+    @property
+    def vertices(self):
+        return [self.labels[i] for i in _bits(self.active)]
+
+    def neighbors(self, v):
+        return [self.labels[i] for i in _bits(self.rows[self.index[v]])]
+
+    def degree(self, v):
+        return _popcount(self.rows[self.index[v]])
+
+    def has_edge(self, a, b):
+        return bool(self.rows[self.index[a]] >> self.index[b] & 1)
+
+    def edges(self):
+        """
+        Edges (a, b) with a before b in vertex order.
+        """
+        return [(self.labels[i], self.labels[j])
+                for i, row in enumerate(self.rows) for j in _bits(row >> i + 1 << i + 1)]
+
+    @property
+    def num_edges(self):
+        return sum(_popcount(row) for row in self.rows) // 2
+
+    # ------------------------------------------------------------------
+    # Graph state operations
+    # ------------------------------------------------------------------
+    def toggle_edge(self, a, b):
+        """
+        Add the edge (a, b) if it is absent and remove it otherwise, as a CZ gate does.
+        """
+        i, j = self.index[a], self.index[b]
+        if i == j or not (self.active >> i & self.active >> j & 1):
+            raise ValueError(f"Cannot toggle the edge ({a}, {b}).")
+        self.rows[i] ^= 1 << j
+        self.rows[j] ^= 1 << i
+
+    def local_complement(self, v):
+        """
+        Complement the subgraph induced by the neighbourhood of `v`.
+        """
+        self._local_complement(self.index[v])
+
+    def _local_complement(self, i):
+        rows = self.rows
+        neighborhood = rows[i]
+        for u in _bits(neighborhood):
+            rows[u] ^= neighborhood ^ (1 << u)
+
+    def delete_vertex(self, v):
+        """
+        Remove `v` and its edges, as measuring its qubit in the Z basis does (up to Pauli
+        corrections on its neighbours).
+        """
+        i = self.index[v]
+        for u in _bits(self.rows[i]):
+            self.rows[u] ^= 1 << i
+        self.rows[i] = 0
+        self.active &= ~(1 << i)
+
+
+# ----------------------------------------------------------------------
+# Local corrections
+# ----------------------------------------------------------------------
+# sqrt(-iX) = H S H and sqrt(iZ) = S^dagger = S Z, up to global phases
+_SQRT_X = ("H", "S", "H")
+_SQRT_Z = ("S", "Z")
+_QUARTER_TURNS = {"S": 1, "Z": 2}
+_DIAGONAL = {0: (), 1: ("S",), 2: ("Z",), 3: ("S", "Z")}
+
+
+def _simplify(gates):
+    """
+    Shorten a sequence of H, S and Z gates: diagonal runs are combined into at most two
+    gates and pairs of H cancel, until nothing changes.
+    """
+    while True:
+        simplified, turns = [], 0
+        for gate in gates:
+            if gate in _QUARTER_TURNS:
+                turns += _QUARTER_TURNS[gate]
+                continue
+            simplified += _DIAGONAL[turns % 4]
+            turns = 0
+            if simplified and simplified[-1] == gate == "H":
+                simplified.pop()
+            else:
+                simplified.append(gate)
+        simplified += _DIAGONAL[turns % 4]
+        if simplified == gates:
+            return simplified
+        gates = simplified
+
+
+def lc_corrections(graph, sequence):
+    """
+    Local Clifford gates that implement the local complementations `sequence` on `graph`.
+
+    :param graph: `GraphState` before the first local complementation (not modified).
+    :param sequence: Vertices to locally complement, in order.
+    :return: Dictionary vertex -> list of gates ("H", "S", "Z") in the order they are
+        applied, for every vertex that needs any.
+    """
+    graph = graph.copy()
+    gates = {}
+    for v in sequence:
+        gates.setdefault(v, []).extend(_SQRT_X)
+        for u in graph.neighbors(v):
+            gates.setdefault(u, []).extend(_SQRT_Z)
+        graph.local_complement(v)
+    gates = {v: _simplify(g) for v, g in gates.items()}
+    return {v: g for v, g in gates.items() if g}
+
+
+# ----------------------------------------------------------------------
+# Orbit search
+# ----------------------------------------------------------------------
+class OrbitResult(namedtuple("OrbitResult", ["target", "graph", "sequence", "cost", "explored"])):
+    """
+    Cheapest graph found in the LC orbit of `target`.
+
+    `graph` is obtained from `target` by locally complementing the vertices of `sequence` in
+    order; `explored` is the number of distinct graphs whose cost was evaluated.
+    """
+
+    def corrections(self):
+        """
+        Local gates turning the state of `graph` into the state of `target`.
+
+        Local complementation is an involution, so `target` is reached from `graph` by the
+        same local complementations in reverse order.
+        """
+        return lc_corrections(self.graph, self.sequence[::-1])
+
+
+def search_orbit(graph, cost, max_depth=None, max_graphs=10000):
+    """
+    Breadth-first search of the LC orbit of `graph` for the member with the lowest cost.
+
+    Local complementations at vertices of degree below 2 do not change the graph and are
+    skipped, as is undoing the previous step. Orbits grow exponentially with the number of
+    vertices, so the search stops after `max_depth` local complementations or `max_graphs`
+    distinct graphs, whichever comes first.
+
+    :param graph: Requested `GraphState`.
+    :param cost: Callable `GraphState` -> comparable cost (e.g. a number or tuple).
+    :param max_depth: Maximum number of local complementations, unbounded by default.
+    :param max_graphs: Maximum number of distinct graphs to evaluate.
+    :return: `OrbitResult`. Ties are broken towards fewer local complementations.
+    """
+    best_graph, best_sequence, best_cost = graph, (), cost(graph)
+    seen = {graph.key()}
+    frontier = [(graph, ())]
+    depth = 0
+    while frontier and len(seen) < max_graphs and (max_depth is None or depth < max_depth):
+        next_frontier = []
+        for current, sequence in frontier:
+            last = current.index[sequence[-1]] if sequence else None
+            for i, row in enumerate(current.rows):
+                if i == last or row & (row - 1) == 0:
+                    continue
+                candidate = current.copy()
+                candidate._local_complement(i)
+                key = candidate.key()
+                if key in seen:
+                    continue
+                seen.add(key)
+                candidate_sequence = sequence + (current.labels[i],)
+                candidate_cost = cost(candidate)
+                if candidate_cost < best_cost:
+                    best_graph, best_sequence, best_cost = candidate, candidate_sequence, candidate_cost
+                next_frontier.append((candidate, candidate_sequence))
+                if len(seen) >= max_graphs:
+                    break
+            if len(seen) >= max_graphs:
+                break
+        frontier = next_frontier
+        depth += 1
+    return OrbitResult(graph, best_graph, best_sequence, best_cost, len(seen))
+
+
+# ----------------------------------------------------------------------
+# Distribution cost
+# ----------------------------------------------------------------------
+def star_decomposition(graph):
+    """
+    Greedy partition of the edges of `graph` into stars.
+
+    The vertex covering most of the remaining edges becomes the center of a star over all
+    of them (ties go to the earlier vertex), until no edge is left.
+
+    :return: List of (center, leaves) tuples.
+    """
+    rows = graph.rows.copy()
+    stars = []
+    while True:
+        degrees = [_popcount(row) for row in rows]
+        center = max(range(len(rows)), key=degrees.__getitem__, default=None)
+        if center is None or not degrees[center]:
+            return stars
+        leaves = rows[center]
+        stars.append((graph.labels[center], [graph.labels[u] for u in _bits(leaves)]))
+        for u in _bits(leaves):
+            rows[u] &= ~(1 << center)
+        rows[center] = 0
+
+
+def star_layers(graph, stars):
+    """
+    Group stars into layers of stars that share no vertex, assigning every star in order to
+    the first layer it fits in.
+
+    :return: List of layers, each a list of (center, leaves) stars.
+    """
+    layers, used = [], []
+    for center, leaves in stars:
+        members = 1 << graph.index[center]
+        for leaf in leaves:
+            members |= 1 << graph.index[leaf]
+        for n, layer_members in enumerate(used):
+            if not layer_members & members:
+                used[n] |= members
+                layers[n].append((center, leaves))
+                break
+        else:
+            used.append(members)
+            layers.append([(center, leaves)])
+    return layers
+
+
+def star_rounds(graph, stars):
+    """
+    Number of rounds when stars that share no vertex are built in the same round (see `star_layers`).
+    """
+    return len(star_layers(graph, stars))
+
+
+class DistributionCost:
+    """
+    Cost of distributing a graph state as stars on a network: the EPR pairs consumed (one
+    per hop of the routing path from every star center to each of its leaves) and the
+    number of rounds, over the greedy `star_decomposition`.
+
+    Instances are callables for `search_orbit` and return (EPR pairs, rounds), so EPR pairs
+    are minimized first.
+
+    :param routing: `routing.RoutingTable` of the network.
+    """
+
+    def __init__(self, routing):
+        self.routing = routing
+
+    def epr_pairs(self, stars):
+        return sum(len(self.routing.path(center, leaf)) - 1 for center, leaves in stars for leaf in leaves)
+
+    def __call__(self, graph):
+        stars = star_decomposition(graph)
+        return self.epr_pairs(stars), star_rounds(graph, stars)
@@ -0,0 +1,331 @@
+"""
+Link and node load of a batch of requests, and the bottlenecks it reveals.
+
+Every leaf of a star request is reached by an EPR chain along its routing path, and every
+step ends with a synchronization broadcast over the routing trees of the center and the
+leaf, so a few well connected nodes may carry most of the chains and relay most of the
+frames. A `LoadReport` holds, per link, the EPR pairs generated, the time spent generating
+them ("busy_time", ns), the frames sent over it and, in measured runs, the pairs discarded at
+a cutoff or lost ("discarded", "lost", see fast_backend.py), and per node the EPR pair halves it
+received, the frames it sent and the time its qubits spent in memory ("slot_time", ns). It
+is obtained
+
+- from the planned routes (`planned_load`), with the expected link generation times of
+  `latency_model.LatencyModel`: the sequential star protocol with message aggregation (the
+  model does not follow the fusion protocol, whose star requests are therefore only
+  measured), and graph requests as planned by `planner.GraphPlanner`. Slot times are estimates: the time
+  a repeater waits for the next link of its chain, the time the start of a chain waits for
+  the rest of it, and the time star and graph qubits are held until the request ends,
+- or from instrumented runs on the stabilizer backend (`measured_load`, see
+  `fast_backend.FastNetwork.load`), averaged over seeds.
+
+`LoadReport.report` ranks the links and nodes by every metric and gives their share of the
+total, and `visualization.load_heatmap` draws a metric over the network.
+
+Usage::
+
+    python load_analysis.py network_configs/smallworld_config_noisy.yaml requests.jsonl --simulate --seeds 5 \\
+        --top 10 --heatmap load.png --link-metric busy_time --node-metric messages
+"""
+import argparse
+import json
+import os
+from collections import defaultdict
+
+from latency_model import LatencyModel
+from routing import RoutingTable, routes_file
+from yaml_to_nx import node_order, yaml_to_nx
+
+LINK_METRICS = ("epr_pairs", "busy_time", "messages", "discarded", "lost")
+NODE_METRICS = ("epr_pairs", "messages", "slot_time")
+
+
+def _link(a, b):
+    return frozenset((a, b))
+
+
+class LoadReport:
+    """
+    Per-link and per-node load, keyed by ``frozenset((a, b))`` and node name.
+
+    :param links: Optional dictionary link -> {metric: value}.
+    :param nodes: Optional dictionary node -> {metric: value}.
+    """
+
+    def __init__(self, links=None, nodes=None):
+        self.links = defaultdict(lambda: dict.fromkeys(LINK_METRICS, 0))
+        self.nodes = defaultdict(lambda: dict.fromkeys(NODE_METRICS, 0))
+        for link, values in (links or {}).items():
+            self.add_link(*link, **values)
+        for node, values in (nodes or {}).items():
+            self.add_node(node, **values)
+
+    def add_link(self, a, b, **values):
+        load = self.links[_link(a, b)]
+        for metric, value in values.items():
+            load[metric] += value
+
+    def add_node(self, node, **values):
+        load = self.nodes[node]
+        for metric, value in values.items():
+            load[metric] += value
+
+    def add_pairs(self, path, busy_times=None):
+        """
+        Count one EPR pair on every link of `path`, and one pair half at both ends of each.
+        """
+        for i, (a, b) in enumerate(zip(path, path[1:])):
+            self.add_link(a, b, epr_pairs=1, busy_time=busy_times[i] if busy_times is not None else 0.)
+            self.add_node(a, epr_pairs=1)
+            self.add_node(b, epr_pairs=1)
+
+    def add_frame(self, sender, receiver, count=1):
+        self.add_link(sender, receiver, messages=count)
+        self.add_node(sender, messages=count)
+
+    def update(self, other, scale=1.):
+        """
+        Add the load of another report, multiplied by `scale`.
+        """
+        for link, values in other.links.items():
+            self.add_link(*link, **{metric: value * scale for metric, value in values.items()})
+        for node, values in other.nodes.items():
+            self.add_node(node, **{metric: value * scale for metric, value in values.items()})
+        return self
+
+    def values(self, kind, metric):
+        """
+        Dictionary link or node -> value of `metric`, for `kind` "links" or "nodes".
+        """
+        return {key: load[metric] for key, load in getattr(self, kind).items()}
+
+    def ranking(self, kind, metric, top=None):
+        """
+        Links or nodes by decreasing `metric`, as (key, value, share of the total) tuples.
+        """
+        values = self.values(kind, metric)
+        total = sum(values.values())
+        ranked = sorted(values.items(), key=lambda item: item[1], reverse=True)[:top]
+        return [(key, value, value / total if total else 0.) for key, value in ranked]
+
+    def report(self, top=10, measured=None):
+        """
+        Ranked bottleneck report: the `top` links and nodes of every metric.
+
+        :param measured: Optional second `LoadReport` (e.g. from `measured_load`) whose values
+            are shown next to the ranked ones.
+        :return: The report as a string.
+        """
+        lines = []
+        for kind, metrics in (("links", LINK_METRICS), ("nodes", NODE_METRICS)):
+            for metric in metrics:
+                ranked = self.ranking(kind, metric, top)
+                if not ranked or not ranked[0][1]:
+                    if measured is not None:
+                        # Metrics only runs produce, e.g. pairs discarded at a cutoff
+                        lines += measured._measured_only(kind, metric, top)
+                    continue
+                lines.append(f"{kind} by {metric}:")
+                for key, value, share in ranked:
+                    name = "-".join(sorted(key, key=node_order)) if kind == "links" else key
+                    line = f"  {name:<24} {value:>12.4g}  {share:6.1%}"
+                    if measured is not None:
+                        other = getattr(measured, kind).get(key)
+                        line += f"  (measured {other[metric] if other is not None else 0:.4g})"
+                    lines.append(line)
+        return "\n".join(lines)
+
+    def _measured_only(self, kind, metric, top):
+        ranked = self.ranking(kind, metric, top)
+        if not ranked or not ranked[0][1]:
+            return []
+        lines = [f"{kind} by {metric} (measured):"]
+        for key, value, share in ranked:
+            name = "-".join(sorted(key, key=node_order)) if kind == "links" else key
+            lines.append(f"  {name:<24} {value:>12.4g}  {share:6.1%}")
+        return lines
+
+    def to_dict(self):
+        return {
+            "links": [{"link": sorted(link, key=node_order), **values} for link, values in self.links.items()],
+            "nodes": {node: dict(values) for node, values in self.nodes.items()},
+        }
+
+
+def _chain_load(load, path, model):
+    """
+    Planned load of one EPR chain along `path`: its pairs, the case forwarding, the correction
+    round trip (see `GraphStateDistribution.any_node_epr_pair`) and the waits of the repeaters
+    and of the start for the following links.
+    """
+    links = [model.link_time(a, b) for a, b in zip(path, path[1:])]
+    load.add_pairs(path, links)
+    hops = len(path) - 1
+    if hops < 2:
+        return
+    for i in range(1, hops):
+        load.add_node(path[i], slot_time=links[i])
+        # Case forwarded to the next repeater
+        load.add_frame(path[i], path[i + 1])
+    delays = sum(model._clink_delays.get(_link(a, b), 0.) for a, b in zip(path, path[1:]))
+    load.add_node(path[0], slot_time=sum(links[1:]) + delays)
+    for a, b in zip(path, path[1:]):
+        # Case back to the start, and the start's confirmation to the end
+        load.add_frame(b, a)
+        load.add_frame(a, b)
+
+
+def planned_load(requests, routing, model, planner=None, protocol="sequential"):
+    """
+    Expected load of a batch of requests from their planned routes.
+
+    :param requests: List of request dictionaries (see `batch_runner.read_requests`).
+    :param routing: `routing.RoutingTable` of the network.
+    :param model: `latency_model.LatencyModel` of the network, for the link times and the
+        timing of star requests.
+    :param planner: `planner.GraphPlanner`, needed for graph requests.
+    :param protocol: Star protocol of the runs (see `GraphStateDistribution`). Only the
+        "sequential" one is modeled, so star requests with any other raise a ValueError.
+    :return: `LoadReport`.
+    """
+    load = LoadReport()
+    stars = [request for request in requests if "edges" not in request]
+    if stars and protocol != "sequential":
+        raise ValueError(f"The planned load of star requests models the sequential protocol, not {protocol!r}; "
+                         f"measure it instead (measured_load).")
+    if stars:
+        prediction = model.predict([(request["center"], request["leaves"]) for request in stars])
+    for number, request in enumerate(stars):
+        center, leaves = request["center"], request["leaves"]
+        end = prediction["sim_time"][number]
+        step_times = prediction["step_times"][number]
+        load.add_node(center, slot_time=end - step_times[0])
+        for k, leaf in enumerate(leaves):
+            path = routing.path(center, leaf)
+            _chain_load(load, path, model)
+            load.add_node(leaf, slot_time=end - step_times[k])
+            if k == 1:
+                # Merge outcome relayed to the leaf
+                for a, b in zip(path, path[1:]):
+                    load.add_frame(a, b)
+            # Aggregated sync exchange: one frame per tree link and round, shared by both trees
+            frames = set()
+            for source in (center, leaf):
+                tree = routing.tree(source)
+                for node, parent in tree.parent.items():
+                    frames.add((tree.depth[node], parent, node))
+            for _, parent, node in frames:
+                load.add_frame(parent, node)
+
+    for request in requests:
+        if "edges" not in request:
+            continue
+        if planner is None:
+            raise ValueError("Graph requests need a planner.")
+        plan = planner.plan([tuple(edge) for edge in request["edges"]])
+        for node in plan.target.vertices:
+            load.add_node(node, slot_time=plan.cost["sim_time"])
+        for layer in plan.layers:
+            batches = max(-(-len(leaves) // planner.fusion_batch) for _, leaves in layer)
+            for batch_number in range(batches):
+                frames = set()
+                for center, leaves in layer:
+                    batch = leaves[batch_number * planner.fusion_batch:(batch_number + 1) * planner.fusion_batch]
+                    for leaf in batch:
+                        _chain_load(load, routing.path(center, leaf), model)
+                        for path in (routing.path(center, leaf), routing.path(leaf, center)):
+                            frames.update((i, a, b) for i, (a, b) in enumerate(zip(path, path[1:])))
+                for _, a, b in frames:
+                    load.add_frame(a, b)
+    return load
+
+
+def measured_load(config_file, requests, seeds=None, **runner_kwargs):
+    """
+    Load of a batch of requests measured on the stabilizer backend.
+
+    :param config_file: Path to the YAML network configuration.
+    :param requests: List of request dictionaries (see `batch_runner.read_requests`).
+    :param seeds: Seeds to run the batch with, averaging the load over them. By default the
+        batch runs once with every request's own seed.
+    :param runner_kwargs: Passed on to `batch_runner.StarRequestRunner` (e.g. protocol).
+    :return: `LoadReport`.
+    """
+    from batch_runner import StarRequestRunner
+
+    runner = StarRequestRunner(config_file, backend="fast", **runner_kwargs)
+    load = LoadReport()
+    runs = list(seeds) if seeds is not None else [None]
+    for seed in runs:
+        for request in requests:
+            request_seed = seed if seed is not None else request.get("seed")
+            if "edges" in request:
+                plan = runner.planner.plan([tuple(edge) for edge in request["edges"]])
+                runner.run_graph_request(plan, seed=request_seed)
+            else:
+                runner.run_request(request["center"], request["leaves"], seed=request_seed)
+            load.update(LoadReport(runner.network.load["links"], runner.network.load["nodes"]), 1 / len(runs))
+    for link, values in load.links.items():
+        for node in link:
+            load.add_node(node, epr_pairs=values["epr_pairs"])
+    return load
+
+
+def main():
+    from batch_runner import read_requests
+    import tracing
+
+    parser = argparse.ArgumentParser(description="Link and node load of a batch of requests, ranked.")
+    parser.add_argument("config", help="YAML network configuration.")
+    parser.add_argument("requests", help="JSONL file of requests (see batch_runner.read_requests).")
+    parser.add_argument("--top", type=int, default=10, help="Links and nodes listed per metric.")
+    parser.add_argument("--simulate", action="store_true", help="Also measure the load on the stabilizer backend.")
+    parser.add_argument("--seeds", type=int, default=None, help="Average the measured load over this many seeds.")
+    parser.add_argument("--protocol", default="sequential", choices=["sequential", "fusion"])
+    parser.add_argument("--heatmap", default=None, help="Draw the load over the network to this image file.")
+    parser.add_argument("--link-metric", default="busy_time", choices=LINK_METRICS)
+    parser.add_argument("--node-metric", default="messages", choices=NODE_METRICS)
+    parser.add_argument("--layout", default="spring", help="Layout method; 'spectral' is fastest for large networks.")
+    parser.add_argument("--json", default=None, help="Write the planned (and measured) load to this JSON file.")
+    args = parser.parse_args()
+
+    requests = [request for request in read_requests(args.requests) if "event" not in request]
+    G = yaml_to_nx(args.config)
+    if os.path.exists(routes_file(args.config)):
+        routing = RoutingTable.load(G, routes_file(args.config))
+    else:
+        routing = RoutingTable(G)
+    model = LatencyModel(args.config, routing=routing)
+    planner = None
+    if any("edges" in request for request in requests):
+        from planner import GraphPlanner
+        planner = GraphPlanner(args.config, routing=routing, network=model.network)
+    planned = None
+    if args.protocol == "sequential" or all("edges" in request for request in requests):
+        planned = planned_load(requests, routing, model, planner, args.protocol)
+    elif not args.simulate:
+        parser.error(f"the planned load of star requests models the sequential protocol; "
+                     f"use --simulate to measure the {args.protocol} protocol")
+    measured = None
+    if args.simulate:
+        tracing.disable()
+        seeds = range(args.seeds) if args.seeds is not None else None
+        measured = measured_load(args.config, requests, seeds, protocol=args.protocol)
+
+    print(planned.report(args.top, measured) if planned is not None else measured.report(args.top))
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump({"planned": planned.to_dict() if planned else None,
+                       "measured": measured.to_dict() if measured else None}, f, indent=1)
+    if args.heatmap is not None:
+        from visualization import load_heatmap
+        shown = measured if measured is not None else planned
+        load_heatmap(G, shown.values("nodes", args.node_metric), shown.values("links", args.link_metric),
+                     filename=args.heatmap, layout=args.layout,
+                     title=f"{'measured' if measured is not None else 'planned'} load: "
+                           f"links by {args.link_metric}, nodes by {args.node_metric}")
+        print(f"Heatmap written to {args.heatmap}")
+
+
+if __name__ == "__main__":
+    main()
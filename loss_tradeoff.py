@@ -0,0 +1,127 @@
+"""
+Latency versus resources of redundant leaf attachments under link loss.
+
+On a lossy link (``prob_loss``, stabilizer backend only, see fast_backend.py) a lost pair
+makes the whole EPR chain of a leaf attachment fail, and with `redundancy` 1 the attachment
+runs the chain again. With `redundancy` k every round instead tries up to k node-disjoint
+routes at once and keeps the first pair that succeeded (see
+`GraphStateDistribution.attach_pair`). This takes fewer rounds, but the extra routes are
+longer and consume their pairs whether they are used or not, so the level worth paying for
+depends on the loss regime.
+
+`tradeoff` runs a batch of requests for every loss probability and redundancy level on the
+same seeds, and reports per attachment the latency distribution, the rounds and the EPR
+pairs generated and lost. `recommend` then picks a level per loss regime. Usage::
+
+    python loss_tradeoff.py network_configs/smallworld_config_ideal.yaml requests.jsonl --seeds 20 \\
+        --loss 0 0.1 0.3 --redundancy 1 2 3 --max-pairs 20
+"""
+import argparse
+
+import numpy as np
+
+from chain_latency import QUANTILES, latency_distribution
+
+
+def attachment_costs(records, quantiles=QUANTILES):
+    """
+    Latency and resources per leaf attachment of result records.
+
+    :param records: Result records of the "fast" backend (see `batch_runner.StarRequestRunner.run_record`);
+        error records are skipped.
+    :return: Dictionary with the attachment "latency" distribution (see `chain_latency.latency_distribution`),
+        the mean "rounds", "pairs" (EPR pairs generated, lost ones included), "lost" pairs and "messages"
+        per attachment, and the mean request "sim_time".
+    """
+    records = [record for record in records if "error" not in record]
+    latencies = [latency for record in records for latency in record["chain_latencies"]]
+    attachments = len(latencies)
+    if not attachments:
+        return {"latency": latency_distribution([], quantiles)}
+    return {
+        "latency": latency_distribution(latencies, quantiles),
+        "rounds": sum(sum(record["attachment_rounds"]) for record in records) / attachments,
+        "pairs": sum(record["epr_pairs"] for record in records) / attachments,
+        "lost": sum(record["epr_lost"] for record in records) / attachments,
+        "messages": sum(record["messages"] for record in records) / attachments,
+        "sim_time": float(np.mean([record["sim_time"] for record in records])),
+    }
+
+
+def tradeoff(config_file, requests, levels=(1, 2, 3), losses=(0., 0.1, 0.3), seeds=range(10),
+             quantiles=QUANTILES, **runner_kwargs):
+    """
+    Attachment costs of a batch of requests for every loss probability and redundancy level.
+
+    :param config_file: Path to the YAML network configuration.
+    :param requests: List of star or graph request dictionaries (see `batch_runner.read_requests`).
+    :param levels: Redundancy levels (see `GraphStateDistribution.attach_pair`).
+    :param losses: Loss probabilities applied to every link.
+    :param seeds: Seeds every request runs with, the same for every combination.
+    :param runner_kwargs: Passed on to every `batch_runner.StarRequestRunner` (e.g. protocol,
+        early_swap); the backend is always "fast".
+    :return: Dictionary (loss, level) -> costs (see `attachment_costs`).
+    """
+    from batch_runner import StarRequestRunner
+
+    table = {}
+    for loss in losses:
+        for level in levels:
+            runner = StarRequestRunner(config_file, backend="fast", redundancy=level, loss=loss or None,
+                                       **runner_kwargs)
+            records = [runner.run_record({**request, "seed": seed}) for request in requests for seed in seeds]
+            table[(loss, level)] = attachment_costs(records, quantiles)
+    return table
+
+
+def recommend(table, max_pairs=None, quantile="p99"):
+    """
+    Redundancy level with the lowest tail latency per loss regime.
+
+    :param table: Result of `tradeoff`.
+    :param max_pairs: If given, only levels using at most this many EPR pairs per attachment qualify.
+    :param quantile: Latency quantile compared, e.g. "p99" or "mean".
+    :return: Dictionary loss -> level, or None where no level qualifies.
+    """
+    choice = {}
+    for loss in sorted({loss for loss, _ in table}):
+        candidates = [(costs["latency"][quantile], level) for (other, level), costs in table.items()
+                      if other == loss and costs["latency"]["count"]
+                      and (max_pairs is None or costs["pairs"] <= max_pairs)]
+        choice[loss] = min(candidates)[1] if candidates else None
+    return choice
+
+
+def main():
+    import tracing
+    from batch_runner import read_requests
+
+    parser = argparse.ArgumentParser(description="Latency versus resources of redundant attachments under link loss.")
+    parser.add_argument("config", help="YAML network configuration.")
+    parser.add_argument("requests", help="JSONL file of requests (see batch_runner.read_requests).")
+    parser.add_argument("--loss", type=float, nargs="+", default=[0., 0.1, 0.3], help="Link loss probabilities.")
+    parser.add_argument("--redundancy", type=int, nargs="+", default=[1, 2, 3], help="Redundancy levels.")
+    parser.add_argument("--seeds", type=int, default=10, help="Runs of every request per combination.")
+    parser.add_argument("--protocol", default="fusion", choices=["sequential", "fusion"])
+    parser.add_argument("--early-swap", action="store_true")
+    parser.add_argument("--max-pairs", type=float, default=None,
+                        help="Budget of EPR pairs per attachment for the recommended level.")
+    args = parser.parse_args()
+
+    tracing.disable()
+    requests = [request for request in read_requests(args.requests) if "event" not in request]
+    table = tradeoff(args.config, requests, args.redundancy, args.loss, range(args.seeds),
+                     protocol=args.protocol, early_swap=args.early_swap)
+    for (loss, level), costs in table.items():
+        latency = costs["latency"]
+        if not latency["count"]:
+            continue
+        print(f"loss {loss:g}, redundancy {level}: latency mean {latency['mean']:.4g}, p99 {latency['p99']:.4g} ns; "
+              f"per attachment {costs['rounds']:.3g} rounds, {costs['pairs']:.3g} pairs "
+              f"({costs['lost']:.3g} lost), {costs['messages']:.3g} messages")
+    for loss, level in recommend(table, args.max_pairs).items():
+        print(f"loss {loss:g}: redundancy {level if level is not None else '- (over the pair budget)'}")
+
+
+if __name__ == "__main__":
+    main()
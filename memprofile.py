@@ -0,0 +1,179 @@
+"""
+Opt-in memory profiling of the protocol steps.
+
+NetSquid combines the quantum states of qubits as they get entangled, and a combined state
+of k qubits takes memory exponential in k, so the memory of a run depends on how large the
+shared states grow during the protocol, not only on the number of qubits. A
+`MemoryProfiler` wraps the node programs (like profiling.py, through instance attributes)
+and takes a sample after every protocol step: the synchronization after each leaf of
+`gen_star_graph`, or each exchange of the fusion and graph protocols. Every sample holds
+
+- the resident set size (RSS) of the process,
+- the live qubits of every node that holds any,
+- the number of qubits of the largest combined quantum state.
+
+The sample of a step is taken when the last node finishes it, and `summary` reports the
+peak of every quantity and the step it occurred at. The qubits and states are read from the
+nodes' quantum memories on NetSquid (`netsquid_inspector`, which needs the stack network of
+the run, see `batch_runner.run_keeping_network`); the stabilizer backend holds
+all qubits in one tableau and instead tracks the states NetSquid would combine
+(`fast_backend.StateGroups`, see `fast_inspector`). Example::
+
+    runner = StarRequestRunner(config_file, memory_profile=True)
+    result = runner.run_request("node_1", ["node_0", "node_3", "node_8"])
+    result["memory"]["peak_state"], result["memory"]["peak_rss"]
+"""
+import functools
+import inspect
+import os
+import resource
+
+# Methods whose outermost call ends a protocol step
+STEP_METHODS = ("sync_step", "exchange")
+
+try:
+    _PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def rss_bytes():
+    """
+    Current resident set size of the process, in bytes. Where /proc is not available, the
+    peak resident set size so far.
+    """
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+def fast_inspector(network):
+    """
+    Inspector of a `fast_backend.FastNetwork`: live qubits of every node and the largest state
+    NetSquid would combine. Enables the network's state tracking.
+    """
+    network.track_states = True
+
+    def inspect_network():
+        runtime = network.runtime
+        live = {name: len(node.live) for name, node in runtime.nodes.items() if node.live}
+        return live, runtime.states.largest()
+    return inspect_network
+
+
+def netsquid_inspector(stack_network):
+    """
+    Inspector of a squidasm stack network: used memory positions of every node and the
+    largest combined NetSquid state over them.
+    """
+    def inspect_network():
+        live, largest = {}, 0
+        for name, stack in stack_network.stacks.items():
+            memory = stack.node.qmemory
+            positions = memory.used_positions
+            if not positions:
+                continue
+            live[name] = len(positions)
+            for qubit in memory.peek(positions, skip_noise=True):
+                if qubit is not None and qubit.qstate is not None:
+                    largest = max(largest, qubit.qstate.num_qubits)
+        return live, largest
+    return inspect_network
+
+
+class MemoryProfiler:
+    """
+    Memory samples after every protocol step of one run.
+
+    :param rss: If False, skip reading the process RSS (e.g. when it is too coarse to matter).
+    """
+
+    def __init__(self, rss=True):
+        self.rss = rss
+        self.programs = {}
+        self.inspector = None
+        self.reset()
+
+    def reset(self):
+        """
+        Drop the samples of the previous run.
+        """
+        self.samples = []
+        self._depth = {}
+        self._steps = {}
+        self._done = {}
+
+    def watch(self, program):
+        """
+        Wrap the step methods of one program instance. Watching a program twice has no effect.
+
+        :return: The program.
+        """
+        if getattr(program, "memory_profiler", None) is not None:
+            return program
+        node = program.node_name
+        self.programs[node] = program
+        for name in STEP_METHODS:
+            method = getattr(program, name, None)
+            if method is not None and inspect.isgeneratorfunction(getattr(type(program), name, None)):
+                setattr(program, name, self._step_method(method, node, program))
+        program.memory_profiler = self
+        return program
+
+    def _step_method(self, method, node, program):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            self._depth[node] = self._depth.get(node, 0) + 1
+            try:
+                result = yield from method(*args, **kwargs)
+            finally:
+                self._depth[node] -= 1
+            if not self._depth[node]:
+                step = self._steps[node] = self._steps.get(node, 0) + 1
+                self._done[step] = self._done.get(step, 0) + 1
+                if self._done[step] == len(self.programs):
+                    self.sample(step, node, program.sim_time())
+            return result
+        return wrapper
+
+    def sample(self, step, node=None, sim_time=None):
+        """
+        Record one sample.
+
+        :param step: Number of the step that just finished (1 for the first).
+        :param node: Node that finished it last.
+        :param sim_time: Simulated time of the sample.
+        """
+        live, largest = self.inspector() if self.inspector is not None else ({}, 0)
+        self.samples.append({
+            "step": step,
+            "node": node,
+            "sim_time": sim_time,
+            "rss": rss_bytes() if self.rss else None,
+            "live_qubits": live,
+            "total_qubits": sum(live.values()),
+            "largest_state": largest,
+        })
+
+    def summary(self):
+        """
+        Peaks of the run: "peak_rss" (bytes), "peak_qubits" (live qubits over all nodes),
+        "peak_node_qubits" (on one node) and "peak_state" (qubits of the largest combined
+        state), each with the step it occurred at ("<peak>_step"), and all "samples".
+        """
+        summary = {"steps": len(self.samples), "samples": self.samples}
+        peaks = {
+            "peak_rss": lambda sample: sample["rss"] or 0,
+            "peak_qubits": lambda sample: sample["total_qubits"],
+            "peak_node_qubits": lambda sample: max(sample["live_qubits"].values(), default=0),
+            "peak_state": lambda sample: sample["largest_state"],
+        }
+        for name, value in peaks.items():
+            peak = max(self.samples, key=value, default=None)
+            summary[name] = value(peak) if peak is not None else 0
+            summary[f"{name}_step"] = peak["step"] if peak is not None else None
+        return summary
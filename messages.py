@@ -0,0 +1,159 @@
+"""
+Compact classical message encoding and per-hop frame aggregation.
+
+Every classical payload exchanged by the protocol fits in a single byte: the upper four
+bits hold an opcode and the lower four bits a small value (a measurement outcome or a
+bit-packed Bell-state case). A payload travels as a one-character string, and a frame
+carrying several payloads over the same link is the concatenation of their characters.
+
+Bell-state cases are packed as ``sign << 2 | a << 1 | b`` for the case string
+``[-]ab`` used by `GraphStateDistribution.check_case`, e.g. ``"-10"`` becomes ``0b110``.
+"""
+
+OP_SYNC = 0x1          # Step synchronization ("confirm")
+OP_CONFIRMATION = 0x2  # Pauli correction applied on the start node of an EPR chain
+OP_CASE = 0x3          # Bell-state case of an EPR chain, value is a packed case
+OP_OUTCOME = 0x4       # Single measurement outcome, value is 0 or 1
+OP_FAILURE = 0x5       # EPR chain (or redundant attachment) failed after a lost pair
+OP_CUTOFF = 0x6        # Program-level cutoff check of a link pair, value 1 if it expired
+OP_ROUTE = 0x7         # Route kept by a redundant attachment, value is its index
+
+_CASES = ("00", "01", "10", "11", "-00", "-01", "-10", "-11")
+_CASE_INDEX = {case: index for index, case in enumerate(_CASES)}
+
+
+def pack_case(case):
+    """
+    Pack a case string such as ``"-01"`` into its 3-bit integer representation.
+    """
+    return _CASE_INDEX[case]
+
+
+def unpack_case(packed):
+    """
+    Unpack a 3-bit case back into its case string.
+    """
+    return _CASES[packed]
+
+
+def combine_case(packed, r0, r1):
+    """
+    Bitwise equivalent of `GraphStateDistribution.check_case` on packed cases.
+
+    The Bell measurement outcomes flip the two Pauli bits of the case, and the sign flips
+    whenever an X outcome meets a case that already carries a Z-type (``b``) component.
+
+    :param packed: The packed case received from the previous node.
+    :param r0: First outcome of the local Bell measurement.
+    :param r1: Second outcome of the local Bell measurement.
+    :return: The packed case to forward to the next node.
+    """
+    b = packed & 1
+    return (packed ^ (r0 << 1 | r1)) ^ ((b & r0) << 2)
+
+
+def encode(opcode, value=0):
+    """
+    Encode one payload as a single-character string.
+    """
+    return chr(opcode << 4 | value)
+
+
+def decode(message):
+    """
+    Decode a single-character payload into an ``(opcode, value)`` tuple.
+    """
+    byte = ord(message)
+    return byte >> 4, byte & 0xF
+
+
+def encode_frame(payloads):
+    """
+    Concatenate already encoded payload bytes (integers) into a frame string.
+    """
+    return "".join(map(chr, payloads))
+
+
+def decode_frame(frame):
+    """
+    Split a frame string into its payload bytes.
+    """
+    return [ord(char) for char in frame]
+
+
+class FrameSchedule:
+    """
+    Round-based schedule of one aggregated message exchange, seen from a single node.
+
+    An exchange consists of broadcasts (one payload from a source to every other node,
+    relayed over the source's shortest-path tree) and unicasts (one payload relayed
+    along an explicit path). A payload that is ``k`` hops away from its origin moves in
+    round ``k``, and all payloads that cross the same link in the same round travel
+    together in one frame. Since every node builds its schedule from the same routes,
+    sender and receiver agree on the contents and order of every frame without
+    transmitting any header.
+
+    :param node: Name of the node the schedule is built for.
+    :param routing: `RoutingTable` providing paths and broadcast trees.
+    :param broadcasts: Source node of every broadcast in the exchange.
+    :param unicasts: Path of every unicast in the exchange.
+    """
+
+    def __init__(self, node, routing, broadcasts=(), unicasts=()):
+        self.node = node
+        self.sends = {}       # round -> next hop -> [item]
+        self.recvs = {}       # round -> previous hop -> [item]
+        self.originates = []  # items injected by this node
+        self.delivers = []    # items for which this node is a destination
+
+        for index, source in enumerate(broadcasts):
+            item = ("b", index)
+            tree = routing.tree(source)
+            if node == source:
+                self.originates.append(item)
+                self._add(self.sends, 0, tree.children[node], item)
+            elif node in tree.depth:
+                depth = tree.depth[node]
+                self.delivers.append(item)
+                self._add(self.recvs, depth - 1, [tree.parent[node]], item)
+                self._add(self.sends, depth, tree.children[node], item)
+
+        for index, path in enumerate(unicasts):
+            item = ("u", index)
+            if node not in path:
+                continue
+            position = path.index(node)
+            if position == 0:
+                self.originates.append(item)
+            else:
+                self._add(self.recvs, position - 1, [path[position - 1]], item)
+            if position == len(path) - 1:
+                self.delivers.append(item)
+            else:
+                self._add(self.sends, position, [path[position + 1]], item)
+
+    @staticmethod
+    def _add(table, round_, peers, item):
+        if not peers:
+            return
+        hops = table.setdefault(round_, {})
+        for peer in peers:
+            hops.setdefault(peer, []).append(item)
+
+    def rounds(self):
+        """
+        Rounds in which this node sends or receives at least one frame, in order.
+        """
+        return sorted(set(self.sends) | set(self.recvs))
+
+    def num_frames(self):
+        """
+        Number of frames this node sends during the exchange.
+        """
+        return sum(len(hops) for hops in self.sends.values())
+
+    def num_payloads(self):
+        """
+        Number of payload hops this node sends during the exchange.
+        """
+        return sum(len(items) for hops in self.sends.values() for items in hops.values())
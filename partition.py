@@ -0,0 +1,255 @@
+"""
+Partition-parallel simulation of request batches on disjoint parts of a network.
+
+A simulation runs on one core and instantiates every node of the configuration, although a
+request only involves the nodes on the routing paths of its stars: the center, the leaves
+and the repeaters in between (for a graph request, the paths of the stars of its plan, see
+planner.py). Requests whose paths share no node (and hence no link) do not interact, so
+
+- `group_requests` unites the requests that share a node into groups, with a union-find
+  over the nodes of their paths,
+- `reduced_config` builds the configuration of one group: the stacks of its nodes and the
+  links and classical links between them,
+- `run_partitioned` writes the reduced configurations, runs every group with its own
+  `batch_runner.StarRequestRunner` in a pool of worker processes, and merges the results
+  back into request order.
+
+Shortest paths of the full network stay shortest paths within a group, so the requests are
+routed over the same number of hops, and seeded requests start from the same random state as
+in a single process (unseeded requests continue the random state of their worker). Graph
+requests thus give the same results. The star protocols however synchronize every node
+after each step (see `GraphStateDistribution.sync_step`), which within a group only reaches
+the group's nodes: their simulated time and classical traffic describe the request on its
+partition and differ from the full network's (on largesmallworld_config_noisy.yaml e.g. 28
+instead of 205 messages for the same seeded request). Such records are therefore not
+comparable with single-process results; every merged record carries the "partition" it ran
+in and the number of "partition_nodes". Topology events (see `batch_runner.read_requests`)
+change the whole network and are not supported.
+
+Usage::
+
+    python partition.py network_configs/largesmallworld_config_noisy.yaml requests.jsonl \\
+        --output results.jsonl --workers 8 --backend fast
+"""
+import argparse
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import yaml
+
+from results import config_hash
+from routing import RoutingTable, routes_file
+from yaml_to_nx import YamlLoader, node_order, yaml_to_nx
+
+
+class _UnionFind:
+    """
+    Disjoint sets of hashable items, with path halving and union by size.
+    """
+
+    def __init__(self):
+        self.parent = {}
+        self.size = {}
+
+    def find(self, item):
+        parent = self.parent.setdefault(item, item)
+        while parent != item:
+            grandparent = self.parent[parent]
+            self.parent[item] = grandparent
+            item, parent = grandparent, self.parent[grandparent]
+        return item
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return a
+        if self.size.get(a, 1) < self.size.get(b, 1):
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] = self.size.get(a, 1) + self.size.get(b, 1)
+        return a
+
+
+def request_paths(request, routing, planner=None):
+    """
+    Routing paths a request uses: from the center to every leaf, or for a graph request
+    ("edges") from the center to every leaf of each star of its plan.
+
+    :param routing: `routing.RoutingTable` of the network.
+    :param planner: `planner.GraphPlanner`, needed for graph requests.
+    :return: List of paths (lists of nodes).
+    """
+    if "edges" in request:
+        if planner is None:
+            raise ValueError("Graph requests need a planner to be partitioned.")
+        stars = planner.plan([tuple(edge) for edge in request["edges"]]).stars
+    else:
+        stars = [(request["center"], request["leaves"])]
+    return [routing.path(center, leaf) for center, leaves in stars for leaf in leaves]
+
+
+def group_requests(requests, routing, planner=None):
+    """
+    Group requests whose routing paths share a node.
+
+    :param requests: List of request dictionaries (see `batch_runner.read_requests`).
+    :param routing: `routing.RoutingTable` of the network.
+    :param planner: `planner.GraphPlanner`, needed for graph requests.
+    :return: List of (nodes, requests) groups, where `nodes` is the sorted list of the nodes the
+        requests touch. Groups keep their requests in input order and are ordered by their
+        first request.
+    """
+    sets = _UnionFind()
+    footprints = []
+    for request in requests:
+        if "event" in request:
+            raise ValueError("Topology events cannot be partitioned; run them with a single StarRequestRunner.")
+        nodes = {node for path in request_paths(request, routing, planner) for node in path}
+        if not nodes:
+            nodes = {request["center"]}
+        first = next(iter(nodes))
+        for node in nodes:
+            sets.union(first, node)
+        footprints.append((first, nodes))
+
+    groups = {}
+    for request, (first, nodes) in zip(requests, footprints):
+        group_nodes, members = groups.setdefault(sets.find(first), (set(), []))
+        group_nodes |= nodes
+        members.append(request)
+    return [(sorted(nodes, key=node_order), members) for nodes, members in groups.values()]
+
+
+def reduced_config(config, nodes):
+    """
+    Configuration restricted to `nodes`: their stacks, and the links and classical links
+    between two of them.
+
+    :param config: Loaded configuration dictionary (as in the YAML files of network_configs/).
+    :param nodes: Node names to keep.
+    :return: New configuration dictionary.
+    """
+    nodes = set(nodes)
+    reduced = {"stacks": [stack for stack in config["stacks"] if stack["name"] in nodes]}
+    for key in ("links", "clinks"):
+        reduced[key] = [link for link in config.get(key, []) if link["stack1"] in nodes and link["stack2"] in nodes]
+    return reduced
+
+
+def _run_group(config_file, requests, output_file, runner_kwargs):
+    """
+    Worker: run one group of requests on its reduced configuration, with tracing off.
+    """
+    import tracing
+    from batch_runner import StarRequestRunner
+
+    tracing.disable()
+    runner = StarRequestRunner(config_file, **runner_kwargs)
+    runner.run_requests(requests, output_file)
+    return output_file
+
+
+def run_partitioned(config_file, requests, output_file, workers=None, store=None, work_dir=None, **runner_kwargs):
+    """
+    Run a batch of requests on disjoint parts of the network in parallel.
+
+    :param config_file: Path to the YAML network configuration.
+    :param requests: Iterable of request dictionaries, e.g. from `batch_runner.read_requests`.
+    :param output_file: Path of the JSONL results file the merged results are appended to.
+        Every record gets the "config_hash" of the full configuration, the "partition" (group
+        index) it ran in and the number of "partition_nodes". The "sim_time" and "messages"
+        of star requests cover the partition's nodes only (see the module documentation).
+    :param workers: Number of worker processes, which run with tracing disabled; defaults to
+        the number of cores.
+    :param store: Optional `results.ResultsStore` that additionally receives every run record
+        (error records are only written to `output_file`).
+    :param work_dir: Directory for the reduced configurations and the per-group results. By
+        default a temporary directory that is removed afterwards.
+    :param runner_kwargs: Passed on to every `batch_runner.StarRequestRunner` (e.g. backend,
+        verify, protocol).
+    :return: List of the groups' node lists, in partition order.
+    """
+    requests = list(requests)
+    G = yaml_to_nx(config_file)
+    if os.path.exists(routes_file(config_file)):
+        routing = RoutingTable.load(G, routes_file(config_file))
+    else:
+        routing = RoutingTable(G)
+    planner = None
+    if any("edges" in request for request in requests):
+        from planner import GraphPlanner
+        planner = GraphPlanner(config_file, routing=routing)
+    groups = group_requests(requests, routing, planner)
+
+    with open(config_file, 'r') as f:
+        config = yaml.load(f, Loader=YamlLoader)
+    full_hash = config_hash(config_file)
+    order = {id(request): n for n, request in enumerate(requests)}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        directory = work_dir if work_dir is not None else tmp_dir
+        os.makedirs(directory, exist_ok=True)
+        tasks = []
+        for n, (nodes, members) in enumerate(groups):
+            group_config = os.path.join(directory, f"partition_{n:05d}.yaml")
+            with open(group_config, 'w') as f:
+                yaml.safe_dump(reduced_config(config, nodes), f, sort_keys=False)
+            tasks.append((group_config, members, os.path.join(directory, f"partition_{n:05d}.jsonl")))
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_run_group, group_config, members, group_output, runner_kwargs)
+                       for group_config, members, group_output in tasks]
+            # Propagate the first worker error
+            for future in futures:
+                future.result()
+
+        merged = []
+        for n, ((nodes, _), (_, members, group_output)) in enumerate(zip(groups, tasks)):
+            with open(group_output, 'r') as f:
+                records = [json.loads(line) for line in f if line.strip()]
+            for request, record in zip(members, records):
+                record.update(config_hash=full_hash, partition=n, partition_nodes=len(nodes))
+                merged.append((order[id(request)], record))
+
+    merged.sort(key=lambda item: item[0])
+    with open(output_file, 'a') as out:
+        for _, record in merged:
+            out.write(json.dumps(record) + "\n")
+            if store is not None and "error" not in record:
+                store.append(record)
+    if store is not None:
+        store.flush()
+    return [nodes for nodes, _ in groups]
+
+
+def main():
+    import tracing
+    from batch_runner import read_requests
+    from results import ResultsStore
+
+    parser = argparse.ArgumentParser(description="Run a batch of requests on disjoint parts of a network in parallel.")
+    parser.add_argument("config", help="YAML network configuration.")
+    parser.add_argument("requests", help="JSONL file of requests (see batch_runner.read_requests).")
+    parser.add_argument("--output", default="results.jsonl", help="JSONL file the results are appended to.")
+    parser.add_argument("--store", default=None, help="Directory of a columnar results store (see results.py).")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: all cores).")
+    parser.add_argument("--work-dir", default=None, help="Keep the reduced configurations and group results here.")
+    parser.add_argument("--backend", default="netsquid", choices=["netsquid", "fast"])
+    parser.add_argument("--protocol", default="sequential", choices=["sequential", "fusion"])
+    parser.add_argument("--verify", action="store_true")
+    args = parser.parse_args()
+
+    tracing.disable()
+    store = ResultsStore(args.store) if args.store is not None else None
+    groups = run_partitioned(args.config, read_requests(args.requests), args.output, workers=args.workers,
+                             store=store, work_dir=args.work_dir, backend=args.backend,
+                             protocol=args.protocol, verify=args.verify)
+    sizes = sorted((len(nodes) for nodes in groups), reverse=True)
+    print(f"Ran {len(groups)} partitions (largest {sizes[0] if sizes else 0} of {len(yaml_to_nx(args.config))} nodes), "
+          f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Planning of arbitrary graph state requests as layers of stars.
+
+A graph request names any graph over network nodes. `GraphPlanner` turns it into a plan
+that `GraphStateDistribution.gen_graph` executes:
+
+1. Candidate graphs: the requested graph and the cheapest member of its local-complementation
+   orbit found by `lc_engine.search_orbit` (fewest EPR pairs, then rounds). Distributing the
+   latter and applying the local corrections at the end yields the requested state.
+2. Star decompositions of every candidate (`STRATEGIES`): the greedy edge partition of
+   `lc_engine.star_decomposition`, stars centered on an approximate minimum vertex cover,
+   and one Bell-pair star per edge.
+3. Layers: stars that share no vertex are built in the same layer, longest first. Stars on
+   disjoint routes then run concurrently, and each layer needs one classical exchange per
+   batch of leaves.
+4. Cost: `estimate` follows the plan with a clock per node, the expected link generation
+   times and the chain, swap and correction steps of `latency_model.LatencyModel`, and
+   counts the EPR pairs and classical frames.
+
+The plan minimizing the predicted simulated time (or, with ``objective="pairs"``, the
+link-level EPR pairs) is chosen, and `GraphPlan.report` describes it with its cost.
+
+Usage::
+
+    python planner.py network_configs/network_config_noisy.yaml node_0-node_3 node_3-node_8 node_8-node_0 --simulate 5
+"""
+import argparse
+from collections import defaultdict, namedtuple
+
+import networkx as nx
+import numpy as np
+
+from latency_model import LatencyModel
+from lc_engine import DistributionCost, GraphState, search_orbit, star_decomposition, star_layers
+
+
+def vertex_cover_stars(graph):
+    """
+    Stars centered on the vertices of an approximate minimum vertex cover, each taking the
+    remaining edges of its center, highest degree first.
+    """
+    cover = nx.algorithms.approximation.min_weighted_vertex_cover(graph.to_networkx())
+    stars, taken = [], set()
+    for center in sorted(cover, key=lambda v: (-graph.degree(v), graph.index[v])):
+        leaves = [leaf for leaf in graph.neighbors(center) if frozenset((center, leaf)) not in taken]
+        if leaves:
+            stars.append((center, leaves))
+            taken.update(frozenset((center, leaf)) for leaf in leaves)
+    return stars
+
+
+def edge_stars(graph):
+    """
+    One star with a single leaf per edge.
+    """
+    return [(a, [b]) for a, b in graph.edges()]
+
+
+STRATEGIES = {
+    "greedy": star_decomposition,
+    "vertex_cover": vertex_cover_stars,
+    "edges": edge_stars,
+}
+
+
+class GraphPlan(namedtuple("GraphPlan", ["target", "graph", "corrections", "strategy", "layers", "cost"])):
+    """
+    Plan of a graph request: the `graph` (locally equivalent to the requested `target`) built
+    from `layers` of (center, leaves) stars with the given decomposition `strategy`, the local
+    `corrections` turning it into `target`, and its predicted `cost` (see `GraphPlanner.estimate`).
+    """
+
+    @property
+    def stars(self):
+        return [star for layer in self.layers for star in layer]
+
+    def report(self):
+        """
+        Human-readable description of the decomposition and its cost.
+        """
+        cost = self.cost
+        lines = [f"{len(self.target.vertices)} vertices, {self.target.num_edges} edges requested; "
+                 f"distributing {self.graph.num_edges} edges"
+                 + (f" with local corrections on {len(self.corrections)} nodes" if self.corrections else "")
+                 + f" ({self.strategy} decomposition)"]
+        for number, layer in enumerate(self.layers):
+            lines.append(f"  layer {number}: " + "; ".join(f"{center} -> {', '.join(leaves)}" for center, leaves in layer))
+        lines.append(f"  predicted {cost['sim_time']:.4g} ns, {cost['epr_pairs']} EPR pairs "
+                     f"({cost['epr_attempts']:.1f} attempts), {cost['messages']} messages, {cost['exchanges']} exchanges")
+        return "\n".join(lines)
+
+
+class GraphPlanner:
+    """
+    Plans and prices graph requests on one network.
+
+    :param config_file: Path to the YAML network configuration.
+    :param routing: `RoutingTable` of the runs to plan for, if already built (see `LatencyModel`).
+    :param network: Parsed `FastNetwork`, if available (see `LatencyModel`).
+    :param fusion_batch: Number of leaves a center handles at once, as in `GraphStateDistribution`.
+    """
+
+    def __init__(self, config_file, routing=None, network=None, fusion_batch=3):
+        self.model = LatencyModel(config_file, routing=routing, network=network)
+        self.routing = self.model.routing
+        self.fusion_batch = fusion_batch
+
+    def _time(self, times, node):
+        return times[self.model.index[node]]
+
+    def _chain(self, path, clock):
+        """
+        Advance the node clocks over the EPR chain along `path`.
+
+        :return: Tuple (expected attempts, messages) of the chain.
+        """
+        model = self.model
+        t1, t2, tm = model.t_single, model.t_two, model.t_measure
+        hops = len(path) - 1
+        links = [model.link_time(a, b) for a, b in zip(path, path[1:])]
+        delays = [model._clink_delays.get(frozenset((a, b)), 0.) for a, b in zip(path, path[1:])]
+        attempts = sum(model.link_attempts(a, b) for a, b in zip(path, path[1:]))
+
+        # A repeater requests its next link once the pair with its previous hop arrived
+        done = clock[path[0]]
+        generated = []
+        for i in range(hops):
+            done = max(done, clock[path[i + 1]]) + links[i]
+            generated.append(done)
+        if hops == 1:
+            clock[path[0]] = clock[path[1]] = done
+            return attempts, 0
+
+        case_at = -np.inf
+        for i in range(1, hops):
+            node = path[i]
+            swap_time = self._time(t2, node) + self._time(t1, node) + 2 * self._time(tm, node)
+            case_at = max(generated[i], case_at) + swap_time + delays[i]
+        case_known = max(generated[-1], case_at)
+        total_delay = sum(delays)
+        # Correction round trip: expected gates are 13/8 at the end and 3/8 at the start
+        start_done = case_known + total_delay + 3 / 8 * self._time(t1, path[0])
+        clock[path[-1]] = max(case_known + 13 / 8 * self._time(t1, path[-1]), start_done + total_delay)
+        clock[path[0]] = start_done
+        for i in range(1, hops):
+            clock[path[i]] = start_done + sum(delays[:i])
+        return attempts, 3 * hops - 1
+
+    def _exchange(self, paths, clock):
+        """
+        Advance the node clocks over an aggregated exchange of unicasts along `paths`.
+
+        :return: Number of frames sent.
+        """
+        model = self.model
+        frames = set()
+        arrivals = defaultdict(float)
+        for path in paths:
+            time = clock[path[0]]
+            for i, (a, b) in enumerate(zip(path, path[1:])):
+                frames.add((i, a, b))
+                time = max(time, clock[a]) + model._clink_delays.get(frozenset((a, b)), 0.)
+                arrivals[b] = max(arrivals[b], time)
+        for node, time in arrivals.items():
+            # A Z correction follows with probability 1/2
+            clock[node] = max(clock[node], time) + self._time(model.t_single, node) / 2
+        return len(frames)
+
+    def estimate(self, layers, corrections=None):
+        """
+        Predict the execution of a plan by `GraphStateDistribution.gen_graph`.
+
+        :param layers: List of layers of (center, leaves) stars.
+        :param corrections: Optional dictionary node -> final local gates.
+        :return: Dictionary with the predicted "sim_time" (ns), "epr_pairs", "epr_attempts"
+            (expected), "messages" and "exchanges".
+        """
+        model = self.model
+        t1, t2, tm = model.t_single, model.t_two, model.t_measure
+        clock = defaultdict(float)
+        for node in {node for layer in layers for center, leaves in layer for node in [center, *leaves]}:
+            clock[node] = self._time(model.t_init, node) + self._time(t1, node)
+        epr_pairs, epr_attempts, messages, exchanges = 0, 0., 0, 0
+
+        for layer in layers:
+            batches = max(-(-len(leaves) // self.fusion_batch) for _, leaves in layer)
+            for batch_number in range(batches):
+                paths = []
+                for center, leaves in layer:
+                    batch = leaves[batch_number * self.fusion_batch:(batch_number + 1) * self.fusion_batch]
+                    for leaf in batch:
+                        path = self.routing.path(center, leaf)
+                        attempts, chain_messages = self._chain(path, clock)
+                        # Remote CZ at the leaf: CZ, H and X measurement
+                        clock[leaf] += self._time(t2, leaf) + self._time(t1, leaf) + self._time(tm, leaf)
+                        epr_pairs += len(path) - 1
+                        epr_attempts += attempts
+                        messages += chain_messages
+                        paths += [path, self.routing.path(leaf, center)]
+                    if batch:
+                        clock[center] += len(batch) * (self._time(t2, center) + self._time(tm, center))
+                messages += self._exchange(paths, clock)
+                exchanges += 1
+
+        for node, gates in (corrections or {}).items():
+            clock[node] += len(gates) * self._time(t1, node)
+        return {
+            "sim_time": max(clock.values(), default=0.),
+            "epr_pairs": epr_pairs,
+            "epr_attempts": epr_attempts,
+            "messages": messages,
+            "exchanges": exchanges,
+        }
+
+    def layers(self, stars):
+        """
+        Layers of stars without shared vertices, the stars with the most link pairs placed first.
+        """
+        ordered = sorted(stars, key=lambda star: -sum(len(self.routing.path(star[0], leaf)) - 1 for leaf in star[1]))
+        vertices = list(dict.fromkeys(node for center, leaves in stars for node in [center, *leaves]))
+        return star_layers(GraphState(vertices), ordered)
+
+    def candidates(self, target, max_depth=3, max_graphs=2000):
+        """
+        Every (graph, strategy) plan considered for `target`, in no particular order.
+
+        :param target: Requested `lc_engine.GraphState`, or a list of (a, b) edges.
+        :param max_depth: Maximum local complementations of the orbit search.
+        :param max_graphs: Maximum graphs evaluated by the orbit search.
+        :return: List of `GraphPlan`.
+        """
+        if not isinstance(target, GraphState):
+            target = GraphState.from_edges(target)
+        graphs = [(target, {})]
+        orbit = search_orbit(target, DistributionCost(self.routing), max_depth=max_depth, max_graphs=max_graphs)
+        if orbit.sequence:
+            graphs.append((orbit.graph, orbit.corrections()))
+
+        plans = []
+        for graph, corrections in graphs:
+            for strategy, decompose in STRATEGIES.items():
+                layers = self.layers(decompose(graph))
+                plans.append(GraphPlan(target, graph, corrections, strategy, layers, self.estimate(layers, corrections)))
+        return plans
+
+    def plan(self, target, objective="time", **kwargs):
+        """
+        Cheapest plan for `target` (see `candidates` for the arguments).
+
+        :param objective: "time" to minimize the predicted simulated time, then the EPR pairs,
+            or "pairs" for the opposite order.
+        :return: `GraphPlan`.
+        """
+        if objective not in ("time", "pairs"):
+            raise ValueError(f"Unknown objective {objective!r}")
+        keys = ("sim_time", "epr_pairs") if objective == "time" else ("epr_pairs", "sim_time")
+        return min(self.candidates(target, **kwargs), key=lambda plan: tuple(plan.cost[key] for key in keys))
+
+
+def parse_edges(specs):
+    """
+    Edges from "a-b" strings, e.g. "node_0-node_3".
+    """
+    return [tuple(spec.split("-")) for spec in specs]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan the distribution of an arbitrary graph state.")
+    parser.add_argument("config", help="YAML network configuration.")
+    parser.add_argument("edges", nargs="+", help='Edges of the requested graph, e.g. "node_0-node_3".')
+    parser.add_argument("--objective", default="time", choices=["time", "pairs"])
+    parser.add_argument("--all", action="store_true", help="Report every candidate plan.")
+    parser.add_argument("--simulate", type=int, default=0, metavar="SEEDS",
+                        help="Also run the chosen plan on the stabilizer backend with this many seeds.")
+    args = parser.parse_args()
+
+    planner = GraphPlanner(args.config)
+    edges = parse_edges(args.edges)
+    if args.all:
+        for plan in sorted(planner.candidates(edges), key=lambda plan: plan.cost["sim_time"]):
+            print(plan.report())
+    plan = planner.plan(edges, objective=args.objective)
+    print("Chosen plan:")
+    print(plan.report())
+
+    if args.simulate:
+        import tracing
+        from batch_runner import StarRequestRunner
+
+        tracing.disable()
+        runner = StarRequestRunner(args.config, backend="fast", verify=True)
+        runs = [runner.run_graph_request(plan, seed=seed) for seed in range(args.simulate)]
+        print(f"  simulated {np.mean([run['sim_time'] for run in runs]):.4g} ns, "
+              f"{runs[0]['messages']} messages, mean fidelity {np.mean([run['fidelity'] for run in runs]):.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Opt-in profiling of the node programs.
+
+Node programs are generators driven by the simulator, so a regular profiler charges the
+time a program spends suspended, or the simulator's own work, to whatever frame happens to
+be on the stack. `profile_program` instead wraps every method of one `GraphStateDistribution`
+instance: a generator method is timed only while it (or a sub-generator it delegates to
+with ``yield from``) is actually executing, and each time it yields control back to the
+simulator counts as one simulator event the node waited on. Calls into the shared
+`RoutingTable` are attributed to the node that made them.
+
+For every node a `NodeProfiler` collects
+
+- per method: calls, inclusive wall time (including sub-generators and nested calls), self
+  time, and the events the method waited on,
+- the self time of every call stack, which `write_collapsed` writes in the collapsed
+  format read by flamegraph.pl and speedscope (``run;gen_star_graph;sync_step 1234``,
+  in microseconds).
+
+The runtime cost is one `time.perf_counter` pair per call and per resumption, so it is not
+enabled by default. Example::
+
+    profilers = {node: profile_program(program) for node, program in programs.items()}
+    ...  # run the simulation
+    write_profiles(profilers, "profiles/run0")
+"""
+import functools
+import inspect
+import json
+import os
+import time
+from collections import defaultdict
+
+# Profiler of the node whose program is executing, for calls into shared objects
+_active = None
+
+
+class NodeProfiler:
+    """
+    Wall time, call and event counts of the methods of one node program.
+
+    :param node: Name of the node.
+    """
+
+    def __init__(self, node):
+        self.node = node
+        self.reset()
+
+    def reset(self):
+        """
+        Drop everything recorded so far, e.g. between runs.
+        """
+        self.calls = defaultdict(int)
+        self.inclusive = defaultdict(float)
+        self.exclusive = defaultdict(float)
+        self.events = defaultdict(int)
+        self.stacks = defaultdict(float)
+        self._stack = []
+        self._open = defaultdict(int)
+
+    def enter(self, name, call=True):
+        """
+        Start executing `name`, either as a new call or resuming a suspended generator.
+        """
+        global _active
+        if not self._stack:
+            self._previous = _active
+            _active = self
+        if call:
+            self.calls[name] += 1
+        # frame: name, start, time spent in nested frames
+        self._stack.append([name, time.perf_counter(), 0.])
+        self._open[name] += 1
+
+    def exit(self, suspended=False):
+        """
+        Stop executing the innermost frame, because it returned or (`suspended`) yielded.
+        """
+        global _active
+        name, start, nested = self._stack.pop()
+        elapsed = time.perf_counter() - start
+        self._open[name] -= 1
+        if not self._open[name]:
+            # Only the outermost frame of a recursive method counts towards its inclusive time
+            self.inclusive[name] += elapsed
+        self.exclusive[name] += elapsed - nested
+        self.stacks[tuple(frame[0] for frame in self._stack) + (name,)] += elapsed - nested
+        if suspended and not any(frame[0] == name for frame in self._stack):
+            self.events[name] += 1
+        if self._stack:
+            self._stack[-1][2] += elapsed
+        else:
+            _active = self._previous
+
+    def summary(self):
+        """
+        Dictionary method -> {"calls", "inclusive", "self", "events"}, times in seconds.
+        """
+        return {name: {"calls": self.calls[name], "inclusive": self.inclusive[name],
+                       "self": self.exclusive[name], "events": self.events[name]}
+                for name in sorted(self.calls, key=self.inclusive.get, reverse=True)}
+
+    def write_collapsed(self, filename):
+        """
+        Write the self time of every call stack in the collapsed flame graph format (microseconds).
+        """
+        with open(filename, 'w') as f:
+            for stack, seconds in sorted(self.stacks.items()):
+                f.write(f"{';'.join(stack)} {round(seconds * 1e6)}\n")
+
+
+def _profiled_generator(function, name, profiler):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        generator = function(*args, **kwargs)
+        call = True
+        value, error = None, None
+        while True:
+            profiler.enter(name, call=call)
+            call = False
+            try:
+                item = generator.send(value) if error is None else generator.throw(error)
+            except StopIteration as stop:
+                profiler.exit()
+                return stop.value
+            except BaseException:
+                profiler.exit()
+                raise
+            profiler.exit(suspended=True)
+            # Suspended: the simulator (or another node) runs until the node is resumed
+            try:
+                value, error = (yield item), None
+            except GeneratorExit:
+                generator.close()
+                raise
+            except BaseException as e:
+                value, error = None, e
+    return wrapper
+
+
+def _profiled_function(function, name, profiler):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        current = profiler if profiler is not None else _active
+        if current is None:
+            return function(*args, **kwargs)
+        current.enter(name)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            current.exit()
+    return wrapper
+
+
+def profile_program(program, profiler=None):
+    """
+    Wrap the methods of one program instance (and of its routing table) for profiling.
+
+    The wrappers are set as instance attributes, so other instances and the class are not
+    affected, and wrapping an already profiled program returns its profiler.
+
+    :param program: `GraphStateDistribution` instance.
+    :param profiler: `NodeProfiler` to record into; by default a new one for the program's node.
+    :return: The `NodeProfiler`.
+    """
+    if getattr(program, "profiler", None) is not None:
+        return program.profiler
+    profiler = profiler if profiler is not None else NodeProfiler(program.node_name)
+    for name, attribute in vars(type(program)).items():
+        if name.startswith("__") or isinstance(attribute, property) or name == "sim_time":
+            continue
+        function = attribute.__func__ if isinstance(attribute, staticmethod) else attribute
+        if not inspect.isfunction(function):
+            continue
+        bound = getattr(program, name)
+        if inspect.isgeneratorfunction(function):
+            setattr(program, name, _profiled_generator(bound, name, profiler))
+        else:
+            setattr(program, name, _profiled_function(bound, name, profiler))
+    program.profiler = profiler
+
+    routing = getattr(program, "routing", None)
+    if routing is not None and not getattr(routing, "_profiled", False):
+        # Shared by all nodes: attribute every call to the node executing it
+        for name in ("path", "tree"):
+            setattr(routing, name, _profiled_function(getattr(routing, name), f"routing.{name}", None))
+        routing._profiled = True
+    return profiler
+
+
+def write_profiles(profilers, directory, simulator_events=None):
+    """
+    Write one collapsed-stack file per node and a JSON summary of all nodes to `directory`.
+
+    :param profilers: Dictionary node -> `NodeProfiler`.
+    :param simulator_events: Optional total number of events processed by the simulator in the run
+        (`FastNetwork.stats` or `batch_runner.netsquid_events`).
+    """
+    os.makedirs(directory, exist_ok=True)
+    summary = {"simulator_events": simulator_events, "nodes": {}}
+    for node, profiler in profilers.items():
+        profiler.write_collapsed(os.path.join(directory, f"{node}.folded"))
+        summary["nodes"][node] = profiler.summary()
+    with open(os.path.join(directory, "summary.json"), 'w') as f:
+        json.dump(summary, f, indent=1)
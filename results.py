@@ -0,0 +1,248 @@
+"""
+Columnar store for simulation outcomes.
+
+A store is a directory of segments. Each segment holds one batch of runs, with every
+column saved as its own NumPy ``.npy`` file so that analysis code can memory-map just
+the columns it needs. Variable-length columns (leaves, outcomes, cases, step times, ...) are
+saved as a flat ``<name>.values.npy`` array plus ``<name>.offsets.npy``, where the items
+of row ``i`` are ``values[offsets[i]:offsets[i + 1]]``. ``manifest.json`` lists the
+segments and their row counts and is rewritten atomically after each segment is added.
+
+Record fields without a column are not stored: the "stars" of graph requests and the
+nested "memory" samples (see memprofile.py) stay in the JSONL results only, as do error
+records, which `batch_runner.StarRequestRunner.run_requests` does not append.
+
+Example
+-------
+>>> store = ResultsStore("results/sweep_1", batch_size=1000)
+>>> store.append({"id": "r1", "seed": 7, "config_hash": config_hash(cfg_file), "center": "node_1",
+...               "leaves": ["node_0", "node_3"], "sim_time": 1.2e6, "outcomes": [1],
+...               "cases": [0, 3], "step_times": [4.0e5, 1.2e6]})
+>>> store.close()
+>>> columns = ResultsStore("results/sweep_1").load(["sim_time", "cases"])
+>>> columns["cases"][0]  # items of the first run
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# Fixed-size columns and their dtypes
+SCALAR_COLUMNS = {
+    "run_id": np.int64,      # position of the run in the store
+    "id": "U64",             # id of the request (see batch_runner.read_requests), as a string
+    "seed": np.int64,        # -1 when the run was not seeded
+    "config_hash": "S16",
+    "center": "U32",         # "" for graph requests
+    "sim_time": np.float64,
+    "wall_time": np.float64,
+    "messages": np.int64,
+    "payloads": np.int64,
+    "verify_setting": np.int8,   # -1 when the run was not verified by local measurements
+    "fidelity": np.float64,      # exact star fidelity (stabilizer backend), NaN otherwise
+    "epr_pairs": np.int64,       # link-level EPR pairs generated (stabilizer backend), -1 otherwise
+    "epr_lost": np.int64,        # pairs lost on lossy links (stabilizer backend), -1 otherwise
+    "epr_discarded": np.int64,   # pairs discarded at a cutoff, -1 when not recorded
+}
+
+# Variable-length columns and the dtype of their items
+RAGGED_COLUMNS = {
+    "leaves": "U32",
+    "outcomes": np.int8,     # merge measurement outcomes of the center node
+    "cases": np.int8,        # packed Bell-state case of each leaf's EPR chain (see messages.pack_case)
+    "step_times": np.float64,
+    "verify_outcomes": np.int8,  # star qubit outcomes of the verification measurement, center first
+    "generator_values": np.int8, # exact star stabilizer generator values (stabilizer backend)
+    "chain_latencies": np.float64,   # duration of every leaf attachment (see chain_latency.py)
+    "attachment_rounds": np.int64,   # rounds every leaf attachment took (see GraphStateDistribution.attach_pair)
+    "edges": "U32",          # requested edges of a graph request, flattened to a0, b0, a1, b1, ...
+}
+
+_MISSING = {"id": "", "seed": -1, "config_hash": b"", "center": "", "wall_time": np.nan, "messages": 0,
+            "payloads": 0, "verify_setting": -1, "fidelity": np.nan, "epr_pairs": -1, "epr_lost": -1,
+            "epr_discarded": -1}
+
+
+def config_hash(filename):
+    """
+    Short content hash of a network configuration file, identifying the network a run used.
+    """
+    with open(filename, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+class RaggedColumn:
+    """
+    Read-only view of a variable-length column, indexed by row.
+    """
+
+    def __init__(self, values, offsets):
+        self.values = values
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        return self.values[self.offsets[row]:self.offsets[row + 1]]
+
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def take(self, rows):
+        """
+        Return a new (in-memory) `RaggedColumn` with only the given rows.
+        """
+        rows = np.arange(len(self))[rows]
+        starts = np.asarray(self.offsets[:-1])[rows]
+        lengths = np.asarray(self.offsets[1:])[rows] - starts
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        # Position of every taken item in `values`: its row's start plus its index within the row
+        index = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return RaggedColumn(np.asarray(self.values[index]), offsets)
+
+    @staticmethod
+    def concatenate(columns):
+        values = np.concatenate([column.values for column in columns])
+        starts = np.cumsum([0] + [len(column.values) for column in columns[:-1]])
+        offsets = np.concatenate([[0]] + [column.offsets[1:] + start for column, start in zip(columns, starts)])
+        return RaggedColumn(values, offsets.astype(np.int64))
+
+
+class ResultsStore:
+    """
+    Append-only columnar store of run records.
+
+    :param path: Directory of the store. Created if it does not exist; existing segments are kept.
+    :param batch_size: Number of buffered records that triggers writing a new segment.
+    """
+
+    def __init__(self, path, batch_size=1000):
+        self.path = path
+        self.batch_size = batch_size
+        self._buffer = []
+        os.makedirs(path, exist_ok=True)
+        manifest_file = os.path.join(path, "manifest.json")
+        if os.path.exists(manifest_file):
+            with open(manifest_file, 'r') as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {"segments": []}
+
+    def __len__(self):
+        return sum(segment["rows"] for segment in self.manifest["segments"]) + len(self._buffer)
+
+    def append(self, record):
+        """
+        Buffer one run record (a dictionary keyed by column name) and write a segment once the
+        buffer reaches the batch size. Missing optional columns get default values, and a record
+        without a "run_id" gets its position in the store, so ids stay unique across batches.
+        """
+        if record.get("run_id") is None:
+            record = {**record, "run_id": len(self)}
+        self._buffer.append(record)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write all buffered records as a new segment.
+        """
+        if not self._buffer:
+            return
+        name = f"segment_{len(self.manifest['segments']):06d}"
+        directory = os.path.join(self.path, name)
+        os.makedirs(directory, exist_ok=True)
+
+        for column, dtype in SCALAR_COLUMNS.items():
+            values = [record.get(column, _MISSING.get(column)) for record in self._buffer]
+            values = [_MISSING.get(column) if value is None else value for value in values]
+            if column == "id":
+                values = [str(value) for value in values]
+            np.save(os.path.join(directory, f"{column}.npy"), np.array(values, dtype=dtype))
+
+        for column, dtype in RAGGED_COLUMNS.items():
+            rows = [record.get(column) or [] for record in self._buffer]
+            if column == "edges":
+                rows = [[node for edge in row for node in edge] for row in rows]
+            offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+            np.cumsum([len(row) for row in rows], out=offsets[1:])
+            values = np.array([item for row in rows for item in row], dtype=dtype)
+            np.save(os.path.join(directory, f"{column}.values.npy"), values)
+            np.save(os.path.join(directory, f"{column}.offsets.npy"), offsets)
+
+        self.manifest["segments"].append({"name": name, "rows": len(self._buffer)})
+        self._buffer = []
+        self._write_manifest()
+
+    def _write_manifest(self):
+        manifest_file = os.path.join(self.path, "manifest.json")
+        tmp_file = manifest_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp_file, manifest_file)
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _load_column(self, directory, column, mmap_mode, rows):
+        if column in SCALAR_COLUMNS:
+            filename = os.path.join(directory, f"{column}.npy")
+            if not os.path.exists(filename):
+                # Segment written before the column existed
+                return np.full(rows, _MISSING.get(column), dtype=SCALAR_COLUMNS[column])
+            return np.load(filename, mmap_mode=mmap_mode)
+        if column in RAGGED_COLUMNS:
+            filename = os.path.join(directory, f"{column}.values.npy")
+            if not os.path.exists(filename):
+                return RaggedColumn(np.zeros(0, dtype=RAGGED_COLUMNS[column]), np.zeros(rows + 1, dtype=np.int64))
+            return RaggedColumn(np.load(filename, mmap_mode=mmap_mode),
+                                np.load(os.path.join(directory, f"{column}.offsets.npy"), mmap_mode=mmap_mode))
+        raise KeyError(f"Unknown column {column!r}")
+
+    def iter_segments(self, columns=None, mmap_mode='r'):
+        """
+        Yield one dictionary of (memory-mapped) columns per written segment.
+
+        :param columns: Names of the columns to load. Defaults to all columns.
+        :param mmap_mode: Passed to `np.load`; None reads the columns into memory.
+        """
+        columns = columns or list(SCALAR_COLUMNS) + list(RAGGED_COLUMNS)
+        for segment in self.manifest["segments"]:
+            directory = os.path.join(self.path, segment["name"])
+            yield {column: self._load_column(directory, column, mmap_mode, segment["rows"]) for column in columns}
+
+    def load(self, columns=None, where=None, mmap_mode='r'):
+        """
+        Load a subset of columns and rows over all segments.
+
+        :param columns: Names of the columns to load. Defaults to all columns.
+        :param where: Optional function that receives all columns of a segment and returns a boolean
+            row mask (or row indices). Only the selected rows of `columns` are copied out of the memory map.
+        :param mmap_mode: Passed to `np.load`.
+        :return: Dictionary column -> array (fixed-size columns) or `RaggedColumn`.
+        """
+        columns = columns or list(SCALAR_COLUMNS) + list(RAGGED_COLUMNS)
+        parts = {column: [] for column in columns}
+        # Memory-mapping every column is cheap, so `where` may filter on columns that are not loaded
+        for segment in self.iter_segments(None if where is not None else columns, mmap_mode):
+            rows = slice(None) if where is None else where(segment)
+            for column in columns:
+                data = segment[column]
+                parts[column].append(data.take(rows) if isinstance(data, RaggedColumn) else data[rows])
+        loaded = {}
+        for column, chunks in parts.items():
+            if column in RAGGED_COLUMNS:
+                loaded[column] = RaggedColumn.concatenate(chunks) if chunks else \
+                    RaggedColumn(np.zeros(0, dtype=RAGGED_COLUMNS[column]), np.zeros(1, dtype=np.int64))
+            else:
+                loaded[column] = np.concatenate(chunks) if chunks else np.zeros(0, dtype=SCALAR_COLUMNS[column])
+        return loaded
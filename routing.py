@@ -0,0 +1,413 @@
+import heapq
+import os
+from collections import namedtuple
+
+import networkx as nx
+import numpy as np
+
+
+class BroadcastTree:
+    """
+    Shortest-path tree rooted at a single source node.
+
+    Every node in the network is reached through exactly one parent, so a message
+    broadcast from the source travels over each tree edge once.
+
+    Attributes
+    ----------
+    source : str
+        The root of the tree.
+    parent : dict
+        Maps every non-root node to its parent on the shortest path from the source.
+    children : dict
+        Maps every node to the (sorted) list of nodes it forwards a broadcast to.
+    depth : dict
+        Number of hops between the source and every node.
+
+    The tree is built either from the shortest `paths` from the source to every node or,
+    equivalently, from the `parent` mapping itself.
+    """
+
+    def __init__(self, source, paths=None, parent=None):
+        self.source = source
+        if parent is None:
+            parent = {node: path[-2] for node, path in paths.items() if node != source}
+        self.parent = parent
+        self.children = {source: []}
+        self.depth = {source: 0}
+        for node in parent:
+            self.children.setdefault(node, [])
+        for node, up in parent.items():
+            self.children[up].append(node)
+            if node not in self.depth:
+                # Walk up to the first node of known depth, then fill in the depths on the way down
+                chain = [node]
+                while chain[-1] in parent and parent[chain[-1]] not in self.depth:
+                    chain.append(parent[chain[-1]])
+                depth = self.depth[parent[chain[-1]]]
+                for link in reversed(chain):
+                    depth += 1
+                    self.depth[link] = depth
+        for node in self.children:
+            self.children[node].sort()
+
+    @property
+    def height(self):
+        return max(self.depth.values())
+
+
+class RoutingTable:
+    """
+    Cache of shortest paths over a network topology.
+
+    Paths are computed with one single-source Dijkstra run per source node, the first
+    time that source is queried, and then reused. Since every node program runs the same
+    deterministic computation on the same graph, all nodes agree on the routes, which is
+    what the hop-by-hop relays of the protocol rely on.
+
+    Alternatively the table can be backed by a predecessor matrix precomputed with `save`
+    (see `load`), in which case no shortest paths are computed at all.
+
+    Links can be removed and added at runtime with `remove_edge` and `add_edge`, which repair
+    only the cached routes that change instead of recomputing the table (see `DynamicTopology`).
+
+    Parameters
+    ----------
+    G : nx.Graph
+        The network topology, as returned by `yaml_to_nx`.
+    weight : str, optional
+        Edge attribute used as distance. Edges without it count as 1.
+    """
+
+    def __init__(self, G, weight="weight"):
+        self.G = G
+        self.weight = weight
+        self._paths = {}
+        self._distances = {}
+        self._trees = {}
+        self._disjoint = {}
+        self._predecessors = None
+        self._names = None
+        self._index = None
+
+    def _source_paths(self, source):
+        paths = self._paths.get(source)
+        if paths is None:
+            distances, paths = nx.single_source_dijkstra(self.G, source, weight=self.weight)
+            self._paths[source] = paths
+            self._distances[source] = distances
+        return paths
+
+    def path(self, source, target):
+        """
+        Return the shortest path between `source` and `target` as a list of node names.
+        """
+        if self._predecessors is None:
+            return self._source_paths(source)[target]
+        row = self._predecessors[self._index[source]]
+        path = [target]
+        while path[-1] != source:
+            up = row[self._index[path[-1]]]
+            if up < 0 or not self.G.has_edge(path[-1], self._names[up]):
+                raise ValueError(f"Precomputed routing table has no valid path {source} -> {target}; "
+                                 f"it does not match the topology")
+            path.append(self._names[up])
+        path.reverse()
+        return path
+
+    def disjoint_paths(self, source, target, k):
+        """
+        Return up to `k` node-disjoint paths between `source` and `target`, shortest first.
+
+        The first one is `path`, and every further one the shortest path avoiding the inner
+        nodes (and the direct link) of the ones before. Since the paths are chosen greedily,
+        there may be fewer than `k` even where `k` disjoint paths exist. Node-disjoint paths are
+        also edge-disjoint, and no repeater serves two of them.
+        """
+        key = (source, target, k)
+        paths = self._disjoint.get(key)
+        if paths is None:
+            paths = [self.path(source, target)]
+            while len(paths) < k:
+                inner = {node for path in paths for node in path[1:-1]}
+                direct = [(source, target)] if any(len(path) == 2 for path in paths) else []
+                try:
+                    paths.append(nx.shortest_path(nx.restricted_view(self.G, inner, direct), source, target,
+                                                  weight=self.weight))
+                except nx.NetworkXNoPath:
+                    break
+            self._disjoint[key] = paths
+        return paths
+
+    def tree(self, source):
+        """
+        Return the `BroadcastTree` rooted at `source`.
+        """
+        tree = self._trees.get(source)
+        if tree is None:
+            if self._predecessors is None:
+                tree = BroadcastTree(source, self._source_paths(source))
+            else:
+                tree = BroadcastTree(source, parent=self._source_parents(source))
+            self._trees[source] = tree
+        return tree
+
+    def _source_parents(self, source):
+        row = np.asarray(self._predecessors[self._index[source]])
+        names = self._names
+        parent = {}
+        for i in np.flatnonzero(row >= 0):
+            node, up = names[i], names[row[i]]
+            if not self.G.has_edge(node, up):
+                raise ValueError(f"Precomputed routing table links {node} to {up}, which are not "
+                                 f"neighbours; it does not match the topology")
+            parent[node] = up
+        return parent
+
+    def save(self, filename):
+        """
+        Compute the shortest paths from every node and save them as a predecessor matrix.
+
+        Entry ``[s, t]`` of the int matrix written to the ``.npy`` file `filename` is the index
+        of the node preceding ``t`` on the path from ``s``, and -1 for ``t == s``; nodes are
+        indexed in the order of ``G.nodes()``. The paths are the ones the lazy computation
+        returns, so loading the table does not change any route.
+        """
+        names = self.nodes()
+        index = {node: i for i, node in enumerate(names)}
+        dtype = np.int16 if len(names) < 2 ** 15 else np.int32
+        matrix = np.lib.format.open_memmap(filename, mode='w+', dtype=dtype, shape=(len(names), len(names)))
+        for i, source in enumerate(names):
+            predecessors, _ = nx.dijkstra_predecessor_and_distance(self.G, source, weight=self.weight)
+            row = np.full(len(names), -1, dtype=dtype)
+            for node, ups in predecessors.items():
+                if ups:
+                    # The first predecessor found is the one on the path single_source_dijkstra returns
+                    row[index[node]] = index[ups[0]]
+            matrix[i] = row
+        matrix.flush()
+        del matrix
+
+    @classmethod
+    def load(cls, G, filename, weight="weight", mmap=True):
+        """
+        Routing table backed by a predecessor matrix written with `save` for the same topology.
+
+        :param mmap: Memory-map the matrix instead of reading it, so that only the rows of the
+            sources actually queried are read from disk.
+        """
+        routing = cls(G, weight=weight)
+        matrix = np.load(filename, mmap_mode='r' if mmap else None)
+        names = routing.nodes()
+        if matrix.shape != (len(names), len(names)):
+            raise ValueError(f"Routing table {filename} has shape {matrix.shape}, "
+                             f"expected ({len(names)}, {len(names)})")
+        routing._predecessors = matrix
+        routing._names = names
+        routing._index = {node: i for i, node in enumerate(names)}
+        return routing
+
+    def nodes(self):
+        return list(self.G.nodes())
+
+    def clear(self):
+        """
+        Drop every cached path and tree, e.g. after the topology was modified.
+        """
+        self._paths.clear()
+        self._distances.clear()
+        self._trees.clear()
+        self._disjoint.clear()
+        self._predecessors = None
+        self._names = None
+        self._index = None
+
+    def _length(self, a, b):
+        return self.G[a][b].get(self.weight, 1)
+
+    def _relax(self, source, heap):
+        """
+        Dijkstra from the (distance, counter, node, parent) entries of `heap` over the cached
+        routes of `source`, adopting only strictly shorter routes.
+
+        :return: True if any route changed.
+        """
+        paths, distances = self._paths[source], self._distances[source]
+        changed = False
+        counter = len(heap)
+        while heap:
+            distance, _, node, parent = heapq.heappop(heap)
+            if distance >= distances.get(node, np.inf):
+                continue
+            distances[node] = distance
+            paths[node] = paths[parent] + [node]
+            changed = True
+            for neighbor in self.G[node]:
+                through = distance + self._length(node, neighbor)
+                if through < distances.get(neighbor, np.inf):
+                    heapq.heappush(heap, (through, counter, neighbor, node))
+                    counter += 1
+        return changed
+
+    def remove_edge(self, a, b):
+        """
+        Remove the link between `a` and `b` from the topology and repair the cached routes.
+
+        Only sources whose shortest-path tree uses the link are affected. For each of them the
+        routes of the subtree cut off by the link are dropped and recomputed by a Dijkstra run
+        over that subtree, seeded from its intact neighbours; every other route stays. Nodes
+        that become unreachable lose their route.
+
+        :return: Set of sources whose routes changed.
+        """
+        self.G.remove_edge(a, b)
+        self._disjoint.clear()
+        if self._predecessors is not None:
+            self.clear()
+            return set(self.nodes())
+        affected = set()
+        for source, paths in self._paths.items():
+            for up, down in ((a, b), (b, a)):
+                path = paths.get(down)
+                if path is not None and len(path) > 1 and path[-2] == up:
+                    break
+            else:
+                continue
+            affected.add(source)
+            self._trees.pop(source, None)
+            distances = self._distances[source]
+            depth = len(paths[down]) - 1
+            cut = [node for node, path in paths.items() if len(path) > depth and path[depth] == down]
+            for node in cut:
+                del paths[node], distances[node]
+            heap = []
+            for node in cut:
+                for neighbor in self.G[node]:
+                    if neighbor in distances:
+                        heap.append((distances[neighbor] + self._length(neighbor, node), len(heap), node, neighbor))
+            heapq.heapify(heap)
+            self._relax(source, heap)
+        return affected
+
+    def add_edge(self, a, b, **attr):
+        """
+        Add a link between `a` and `b` (with edge attributes `attr`, e.g. its weight) and update
+        the cached routes that it shortens. Routes of equal length are kept.
+
+        :return: Set of sources whose routes changed.
+        """
+        if a not in self.G or b not in self.G:
+            raise ValueError(f"Cannot link {a} and {b}: both must be nodes of the topology")
+        self.G.add_edge(a, b, **attr)
+        self._disjoint.clear()
+        if self._predecessors is not None:
+            self.clear()
+            return set(self.nodes())
+        affected = set()
+        length = self._length(a, b)
+        for source, distances in self._distances.items():
+            heap = [(distances[up] + length, n, down, up)
+                    for n, (up, down) in enumerate(((a, b), (b, a))) if up in distances]
+            heapq.heapify(heap)
+            if self._relax(source, heap):
+                affected.add(source)
+                self._trees.pop(source, None)
+        return affected
+
+
+class TopologyChange(namedtuple("TopologyChange", ["kind", "link", "version", "affected"])):
+    """
+    One change of a `DynamicTopology`.
+
+    Attributes
+    ----------
+    kind : str
+        "remove" or "add".
+    link : tuple
+        The two nodes of the link.
+    version : int
+        Version of the topology after the change.
+    affected : set
+        Sources whose cached routes changed.
+    """
+
+    def affects(self, path):
+        """
+        Whether a route computed before the change is invalid or may no longer be shortest.
+        """
+        if self.kind == "remove":
+            return any({a, b} == set(self.link) for a, b in zip(path, path[1:]))
+        return path[0] in self.affected
+
+
+class DynamicTopology:
+    """
+    Network topology whose links fail or are added at runtime.
+
+    Changes go through the `RoutingTable`, which repairs only the routes they affect, and are
+    announced to every subscriber, so that everything holding routes or per-route state
+    (e.g. the latency model's trees, the links of a simulation backend, queued plans) can
+    update itself instead of rebuilding from the network configuration.
+
+    Parameters
+    ----------
+    G : nx.Graph
+        The network topology, as returned by `yaml_to_nx`. It is modified in place.
+    routing : RoutingTable, optional
+        Routing table over `G`; built if not given.
+
+    Attributes
+    ----------
+    version : int
+        Number of changes applied so far.
+    """
+
+    def __init__(self, G, routing=None):
+        self.G = G
+        self.routing = routing if routing is not None else RoutingTable(G)
+        self.version = 0
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        """
+        Call `callback(change)` with a `TopologyChange` after every change. Returns `callback`.
+        """
+        self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    def _publish(self, kind, link, affected):
+        self.version += 1
+        change = TopologyChange(kind, tuple(link), self.version, affected)
+        for callback in list(self._subscribers):
+            callback(change)
+        return change
+
+    def fail_link(self, a, b):
+        """
+        Remove the link between `a` and `b`.
+
+        :return: The `TopologyChange`.
+        """
+        if not self.G.has_edge(a, b):
+            raise ValueError(f"There is no link between {a} and {b}")
+        return self._publish("remove", (a, b), self.routing.remove_edge(a, b))
+
+    def add_link(self, a, b, **attr):
+        """
+        Add a link between `a` and `b`, with edge attributes `attr`.
+
+        :return: The `TopologyChange`.
+        """
+        if self.G.has_edge(a, b):
+            raise ValueError(f"There already is a link between {a} and {b}")
+        return self._publish("add", (a, b), self.routing.add_edge(a, b, **attr))
+
+
+def routes_file(config_file):
+    """
+    Path of the precomputed routing table belonging to a network configuration file.
+    """
+    return os.path.splitext(config_file)[0] + ".routes.npy"
@@ -1,40 +1,88 @@
-from graphapplication import GraphStateDistribution
+import argparse
 
-from squidasm.run.stack.config import StackNetworkConfig
-from squidasm.run.stack.run import run
+import tracing
+from batch_runner import StarRequestRunner, read_requests
+from results import ResultsStore
+from watchdog import Watchdog
 
-from squidasm.sim.stack.common import LogManager  # Import LogManager for logging
-
-from yaml_to_nx import yaml_to_nx
-from collections import defaultdict
-
-# Set up logging
-LogManager.set_log_level("INFO")
-logger = LogManager.get_stack_logger() # Disable logging to terminal
-logger.handlers = []
-LogManager.log_to_file("logs/info.log") # logging to file
-
-# import network configuration from file
-cfg = StackNetworkConfig.from_file("network_configs/smallworldnetwork.yaml")
-G = yaml_to_nx("network_configs/smallworldnetwork.yaml")
+parser = argparse.ArgumentParser(description="Run star graph state generation on a network configuration.")
+parser.add_argument("--config", default="network_configs/smallworldnetwork.yaml",
+                    help="YAML network configuration.")
 #smallworldnetwork
 #network_config_ideal
 #network_config_noisy
+parser.add_argument("--requests", default=None,
+                    help="JSONL file with one {center, leaves, seed} request per line (batch mode).")
+parser.add_argument("--output", default="results.jsonl",
+                    help="JSONL file the per-request results are appended to in batch mode.")
+parser.add_argument("--store", default=None,
+                    help="Directory of a columnar results store (see results.py) that also receives every run in batch mode.")
+parser.add_argument("--backend", default="netsquid", choices=["netsquid", "fast"],
+                    help="Simulate with NetSquid, or with the stabilizer-tableau backend (fast_backend.py).")
+parser.add_argument("--protocol", default="sequential", choices=["sequential", "fusion"],
+                    help="Integrate the leaves one by one, or fuse batches of Bell pairs at the center.")
+parser.add_argument("--verify", action="store_true",
+                    help="Verify the produced star state of every request (summarize with verification.py).")
+parser.add_argument("--trace", default="INFO",
+                    help='Protocol trace levels, e.g. "INFO", "OFF" or "*=OFF,epr=DEBUG" (subsystems: star, epr, correction).')
+parser.add_argument("--trace-file", default=None,
+                    help="Additionally write enabled trace records to this file (.jsonl, or binary otherwise).")
+parser.add_argument("--profile", default=None,
+                    help="Profile the node programs and write per-node flame graph stacks to this directory (see profiling.py).")
+parser.add_argument("--wait-budget", type=float, default=None,
+                    help="Abort a request when a node waits longer than this many ns on one operation (see watchdog.py).")
+parser.add_argument("--max-sim-time", type=float, default=None,
+                    help="Abort a request when its simulated time exceeds this many ns (see watchdog.py).")
+parser.add_argument("--memory", action="store_true",
+                    help="Record the RSS, live qubits and largest quantum state after every protocol step (see memprofile.py).")
+parser.add_argument("--early-swap", action="store_true",
+                    help="Generate the links of every EPR chain in two rounds and swap as soon as a repeater's pairs are there.")
+parser.add_argument("--cutoff", type=float, default=None,
+                    help="Discard and regenerate EPR pairs left unused for this many ns.")
+parser.add_argument("--redundancy", type=int, default=1,
+                    help="Try every leaf attachment over this many node-disjoint routes at once (see loss_tradeoff.py).")
+parser.add_argument("--loss", type=float, default=None,
+                    help="Probability that a generated EPR pair is lost (fast backend only).")
+args = parser.parse_args()
+
+# Set up logging
+trace_levels = tracing.parse_levels(args.trace)
+if args.backend == "netsquid":
+    from squidasm.sim.stack.common import LogManager  # Import LogManager for logging
+
+    LogManager.set_log_level("WARNING" if trace_levels == {"*": tracing.OFF} else "INFO")
+    logger = LogManager.get_stack_logger() # Disable logging to terminal
+    logger.handlers = []
+    LogManager.log_to_file("logs/info.log") # logging to file
+
+# Set up protocol tracing
+tracing.configure(levels=trace_levels)
+if args.trace_file is not None:
+    sink = tracing.JsonlSink(args.trace_file) if args.trace_file.endswith(".jsonl") else tracing.BinarySink(args.trace_file)
+    tracing.configure(sinks={"star": [tracing.ConsoleSink(), sink], "*": [tracing.LoggingSink(), sink]})
+
+# Network configuration, topology, routing and node programs are built once
+watchdog = None
+if args.wait_budget is not None or args.max_sim_time is not None:
+    watchdog = Watchdog(wait_budget=args.wait_budget, max_sim_time=args.max_sim_time)
+runner = StarRequestRunner(args.config, backend=args.backend, verify=args.verify, protocol=args.protocol,
+                            profile_dir=args.profile, watchdog=watchdog, memory_profile=args.memory,
+                            early_swap=args.early_swap, cutoff=args.cutoff, redundancy=args.redundancy,
+                            loss=args.loss)
+
+if args.requests is not None:
+    # Batch mode: run every request of the file back to back in this process
+    store = ResultsStore(args.store) if args.store is not None else None
+    num_requests = runner.run_requests(read_requests(args.requests), args.output, store=store)
+    print(f"Ran {num_requests} requests, results written to {args.output}")
+else:
+    # Single run of the example request defined in graphapplication.py
+    result = runner.run_example()
+    if runner.memory_profiler is not None:
+        memory = result["memory"]
+        print(f"Peak memory over {memory['steps']} steps: RSS {memory['peak_rss'] / 2**20:.1f} MiB "
+              f"(step {memory['peak_rss_step']}), {memory['peak_qubits']} live qubits "
+              f"(step {memory['peak_qubits_step']}), largest state of {memory['peak_state']} qubits "
+              f"(step {memory['peak_state_step']})")
 
-# Extract the list of node names
-nodes = [stack.name for stack in cfg.stacks]
-
-# Dictionary to hold the peers for each node
-peers = defaultdict(set)
-for link in cfg.links:
-    peers[link.stack1].add(link.stack2)
-    peers[link.stack2].add(link.stack1)
-for node in peers:
-    peers[node] = sorted(peers[node], key=lambda x: int(x.split('_')[1]))
-    
-programs = {
-    node: GraphStateDistribution(node_name=node, peer_names=peers[node], graph=G)
-    for node in nodes
-}
-
-run(config=cfg, programs=programs, num_times=1)
\ No newline at end of file
+tracing.close()
@@ -0,0 +1,273 @@
+"""
+Bit-packed stabilizer tableau (Aaronson-Gottesman, "CHP") on NumPy arrays.
+
+The tableau stores ``n`` destabilizer rows followed by ``n`` stabilizer rows. Each row is
+a Pauli product over all ``n`` qubit slots, kept as X and Z bit vectors packed into
+``uint64`` words, plus a sign bit. A gate touches one bit column of every row, which is
+a handful of vectorized word operations; multiplying Pauli rows during measurement works
+on whole words at a time, so its cost grows with ``n / 64``.
+
+Qubit slots are allocated and released dynamically. A released slot is reset to ``|0>``
+and stays in the tableau as an unentangled qubit, and the tableau doubles its capacity
+when it runs out of free slots.
+"""
+import numpy as np
+
+if hasattr(np, "bitwise_count"):
+    def _popcount(words):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+else:
+    def _popcount(words):
+        bits = np.unpackbits(np.ascontiguousarray(words).view(np.uint8), axis=-1)
+        return bits.sum(axis=-1, dtype=np.int64)
+
+_ONE = np.uint64(1)
+_PAULIS = {"I": (0, 0), "X": (1, 0), "Y": (1, 1), "Z": (0, 1)}
+
+
+def _phase_exponents(x1, z1, x2, z2):
+    """
+    Sum over qubits of the CHP ``g`` function for multiplying Pauli rows (x1, z1) onto (x2, z2).
+
+    Inputs are packed words (broadcastable arrays whose last axis runs over words). The
+    return value is the exponent of ``i`` picked up by the product, per row.
+    """
+    plus = (x1 & z1 & z2 & ~x2) | (x1 & ~z1 & z2 & x2) | (~x1 & z1 & x2 & ~z2)
+    minus = (x1 & z1 & x2 & ~z2) | (x1 & ~z1 & z2 & ~x2) | (~x1 & z1 & x2 & z2)
+    return _popcount(plus) - _popcount(minus)
+
+
+class StabilizerTableau:
+    """
+    Stabilizer state of a dynamic set of qubits.
+
+    :param capacity: Initial number of qubit slots.
+    :param rng: `numpy.random.Generator` used for random measurement outcomes.
+    """
+
+    def __init__(self, capacity=64, rng=None):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.n = 0
+        self._free = []
+        self._grow(max(capacity, 1))
+
+    # ------------------------------------------------------------------
+    # Slot management
+    # ------------------------------------------------------------------
+    def _grow(self, capacity):
+        words = (capacity + 63) // 64
+        x = np.zeros((2 * capacity + 1, words), dtype=np.uint64)
+        z = np.zeros((2 * capacity + 1, words), dtype=np.uint64)
+        r = np.zeros(2 * capacity + 1, dtype=np.uint8)
+        old = self.n
+        if old:
+            old_words = self.x.shape[1]
+            x[:old, :old_words] = self.x[:old]
+            z[:old, :old_words] = self.z[:old]
+            r[:old] = self.r[:old]
+            x[capacity:capacity + old, :old_words] = self.x[old:2 * old]
+            z[capacity:capacity + old, :old_words] = self.z[old:2 * old]
+            r[capacity:capacity + old] = self.r[old:2 * old]
+        for q in range(old, capacity):
+            # New slots start in |0>: destabilizer X_q, stabilizer Z_q
+            x[q, q >> 6] |= _ONE << np.uint64(q & 63)
+            z[capacity + q, q >> 6] |= _ONE << np.uint64(q & 63)
+        self.x, self.z, self.r = x, z, r
+        self.n = capacity
+        self._free = list(range(capacity - 1, old - 1, -1)) + self._free
+
+    def allocate(self):
+        """
+        Return the index of a free qubit slot in state ``|0>``.
+        """
+        if not self._free:
+            self._grow(2 * self.n)
+        return self._free.pop()
+
+    def release(self, q):
+        """
+        Reset qubit `q` to ``|0>`` (measuring it if needed) and return its slot to the free pool.
+        """
+        if self.measure(q):
+            self.x_gate(q)
+        self._free.append(q)
+
+    @property
+    def num_allocated(self):
+        return self.n - len(self._free)
+
+    # ------------------------------------------------------------------
+    # Bit column helpers
+    # ------------------------------------------------------------------
+    def _column(self, table, q):
+        return ((table[:, q >> 6] >> np.uint64(q & 63)) & _ONE).astype(np.uint8)
+
+    def _set_column(self, table, q, bits):
+        word, mask = q >> 6, _ONE << np.uint64(q & 63)
+        table[:, word] = (table[:, word] & ~mask) | (bits.astype(np.uint64) << np.uint64(q & 63))
+
+    # ------------------------------------------------------------------
+    # Clifford gates
+    # ------------------------------------------------------------------
+    def h(self, q):
+        xq, zq = self._column(self.x, q), self._column(self.z, q)
+        self.r ^= xq & zq
+        self._set_column(self.x, q, zq)
+        self._set_column(self.z, q, xq)
+
+    def s(self, q):
+        xq, zq = self._column(self.x, q), self._column(self.z, q)
+        self.r ^= xq & zq
+        self._set_column(self.z, q, zq ^ xq)
+
+    def sdg(self, q):
+        xq, zq = self._column(self.x, q), self._column(self.z, q)
+        self.r ^= xq & (zq ^ 1)
+        self._set_column(self.z, q, zq ^ xq)
+
+    def x_gate(self, q):
+        self.r ^= self._column(self.z, q)
+
+    def z_gate(self, q):
+        self.r ^= self._column(self.x, q)
+
+    def y_gate(self, q):
+        self.r ^= self._column(self.x, q) ^ self._column(self.z, q)
+
+    def pauli(self, q, name):
+        """
+        Apply the Pauli "I", "X", "Y" or "Z" to qubit `q`.
+        """
+        if name == "X":
+            self.x_gate(q)
+        elif name == "Y":
+            self.y_gate(q)
+        elif name == "Z":
+            self.z_gate(q)
+
+    def cnot(self, control, target):
+        xc, zc = self._column(self.x, control), self._column(self.z, control)
+        xt, zt = self._column(self.x, target), self._column(self.z, target)
+        self.r ^= xc & zt & (xt ^ zc ^ 1)
+        self._set_column(self.x, target, xt ^ xc)
+        self._set_column(self.z, control, zc ^ zt)
+
+    def cz(self, a, b):
+        self.h(b)
+        self.cnot(a, b)
+        self.h(b)
+
+    # ------------------------------------------------------------------
+    # Measurement
+    # ------------------------------------------------------------------
+    def _rowsum_into(self, h, i):
+        """
+        Multiply row `i` onto row(s) `h` (an index or an index array), tracking signs.
+        """
+        exponent = (2 * self.r[h].astype(np.int64) + 2 * int(self.r[i])
+                    + _phase_exponents(self.x[i], self.z[i], self.x[h], self.z[h]))
+        self.r[h] = (exponent % 4 == 2).astype(np.uint8)
+        self.x[h] ^= self.x[i]
+        self.z[h] ^= self.z[i]
+
+    def measure(self, q):
+        """
+        Measure qubit `q` in the Z basis and return the outcome (0 or 1).
+        """
+        n = self.n
+        xq = self._column(self.x, q)
+        stabilizers = np.flatnonzero(xq[n:2 * n])
+        if len(stabilizers):
+            # Random outcome: the first anticommuting stabilizer is replaced by +-Z_q
+            p = n + stabilizers[0]
+            rows = np.flatnonzero(xq[:2 * n])
+            rows = rows[rows != p]
+            if len(rows):
+                self._rowsum_into(rows, p)
+            self.x[p - n], self.z[p - n], self.r[p - n] = self.x[p], self.z[p], self.r[p]
+            self.x[p] = 0
+            self.z[p] = 0
+            self.z[p, q >> 6] = _ONE << np.uint64(q & 63)
+            outcome = int(self.rng.integers(2))
+            self.r[p] = outcome
+            return outcome
+
+        # Deterministic outcome: accumulate the stabilizers selected by the destabilizers in the scratch row
+        scratch = 2 * n
+        self.x[scratch] = 0
+        self.z[scratch] = 0
+        self.r[scratch] = 0
+        for i in np.flatnonzero(xq[:n]):
+            self._rowsum_into(scratch, n + i)
+        return int(self.r[scratch])
+
+    # ------------------------------------------------------------------
+    # Expectation values
+    # ------------------------------------------------------------------
+    def pauli_words(self, paulis):
+        """
+        Pack Pauli products into X and Z word arrays of this tableau's width.
+
+        :param paulis: List of dictionaries qubit index -> "X", "Y" or "Z".
+        :return: Tuple of ``uint64`` arrays (x, z) of shape (len(paulis), words).
+        """
+        words = self.x.shape[1]
+        x = np.zeros((len(paulis), words), dtype=np.uint64)
+        z = np.zeros((len(paulis), words), dtype=np.uint64)
+        for row, product in enumerate(paulis):
+            for q, name in product.items():
+                px, pz = _PAULIS[name]
+                bit = _ONE << np.uint64(q & 63)
+                if px:
+                    x[row, q >> 6] |= bit
+                if pz:
+                    z[row, q >> 6] |= bit
+        return x, z
+
+    def anticommutes(self, x, z, destabilizers=False):
+        """
+        Boolean matrix (products, n) telling which Pauli products anticommute with which
+        stabilizer (or destabilizer) rows.
+        """
+        rows = slice(0, self.n) if destabilizers else slice(self.n, 2 * self.n)
+        return (_popcount((self.x[None, rows] & z[:, None]) ^ (self.z[None, rows] & x[:, None])) & 1).astype(bool)
+
+    def expectations(self, x, z):
+        """
+        Expectation values of many Pauli products at once.
+
+        :param x: ``uint64`` array (products, words) of X bits, e.g. from `pauli_words`.
+        :param z: ``uint64`` array (products, words) of Z bits.
+        :return: ``int8`` array with +1 or -1 where the product (or its negative) stabilizes
+            the state, and 0 where it anticommutes with a stabilizer.
+        """
+        n = self.n
+        destab_anti = self.anticommutes(x, z, destabilizers=True)
+        values = np.zeros(len(x), dtype=np.int8)
+        commuting = ~self.anticommutes(x, z).any(axis=1)
+        if not commuting.any():
+            return values
+        # A commuting product equals +-(product of the stabilizers whose destabilizers anticommute with it)
+        selected = destab_anti[commuting]
+        acc_x = np.zeros((len(selected), self.x.shape[1]), dtype=np.uint64)
+        acc_z = np.zeros_like(acc_x)
+        acc_r = np.zeros(len(selected), dtype=np.int64)
+        for i in np.flatnonzero(selected.any(axis=0)):
+            rows = selected[:, i]
+            row_x, row_z = self.x[n + i], self.z[n + i]
+            exponent = 2 * acc_r[rows] + 2 * int(self.r[n + i]) + _phase_exponents(row_x, row_z, acc_x[rows], acc_z[rows])
+            acc_r[rows] = (exponent % 4 == 2)
+            acc_x[rows] ^= row_x
+            acc_z[rows] ^= row_z
+        values[commuting] = 1 - 2 * acc_r
+        return values
+
+    def expectation(self, paulis):
+        """
+        Expectation value of a Pauli product on the current state.
+
+        :param paulis: Dictionary qubit index -> "X", "Y" or "Z".
+        :return: +1 or -1 if the product (or its negative) stabilizes the state, else 0.
+        """
+        x, z = self.pauli_words([paulis])
+        return int(self.expectations(x, z)[0])
@@ -0,0 +1,239 @@
+"""
+Checkpointed, resumable sweeps of requests over network configurations and seeds.
+
+A sweep is a directory holding
+
+- ``manifest.json``: the runner options and every task, one (configuration, request,
+  seed) run each, together with the content hash of every configuration. It is written
+  once, atomically, when the sweep is created,
+- ``done/<task>.json``: the result record of every finished task (see
+  `batch_runner.StarRequestRunner.run_record`), each written atomically (to a temporary
+  file, synced, then renamed) as soon as the task finishes.
+
+`run_sweep` runs the tasks without a completion record, in chunks of tasks on the same
+configuration so that a worker builds its runner once per chunk, spread over a pool of
+worker processes. A sweep that is interrupted at any point (crash, preemption) is resumed
+by running it again: finished tasks are skipped, a task that was running is repeated, and
+a task that raised is left without a record, reported and retried on the next run. A
+configuration file that changed since the sweep was created is refused, so results never
+mix networks. `collect` gathers the records in task order.
+
+Usage::
+
+    python sweep.py create sweeps/noisy --configs network_configs/*_noisy.yaml --requests requests.jsonl \\
+        --seeds 100 --backend fast
+    python sweep.py run sweeps/noisy --workers 8       # again after an interruption to resume
+    python sweep.py status sweeps/noisy
+    python sweep.py collect sweeps/noisy --output results.jsonl --store results/noisy
+"""
+import argparse
+import json
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from results import config_hash
+
+MANIFEST = "manifest.json"
+DONE = "done"
+
+
+def _write_atomic(filename, content):
+    """
+    Write `content` (a JSON-serializable object) so that `filename` either keeps its previous
+    state or holds the complete new content, also when the process dies halfway.
+    """
+    temporary = f"{filename}.{os.getpid()}.tmp"
+    with open(temporary, 'w') as f:
+        json.dump(content, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, filename)
+
+
+def create_sweep(directory, configs, requests, seeds=None, **runner_kwargs):
+    """
+    Write the manifest of a new sweep. Creating a sweep that already exists with the same
+    tasks and options does nothing, so the creating command can be repeated on restart.
+
+    :param directory: Directory of the sweep.
+    :param configs: Paths of the YAML network configurations.
+    :param requests: List of star or graph request dictionaries (see `batch_runner.read_requests`).
+    :param seeds: Seeds to run every request with. By default every request runs once with its own seed.
+    :param runner_kwargs: Passed on to `batch_runner.StarRequestRunner` (e.g. backend, protocol,
+        verify), except "wait_budget" and "max_sim_time", which configure a `watchdog.Watchdog`.
+    :return: The manifest.
+    """
+    tasks = []
+    for config in configs:
+        for request in requests:
+            if "event" in request:
+                raise ValueError("Topology events cannot be swept; tasks run in any order.")
+            for seed in (seeds if seeds is not None else [request.get("seed")]):
+                tasks.append({"id": f"task_{len(tasks):07d}", "config": config, "request": {**request, "seed": seed}})
+    manifest = {
+        "configs": {config: config_hash(config) for config in configs},
+        "runner": runner_kwargs,
+        "tasks": tasks,
+    }
+    os.makedirs(os.path.join(directory, DONE), exist_ok=True)
+    manifest_file = os.path.join(directory, MANIFEST)
+    if os.path.exists(manifest_file):
+        existing = load_manifest(directory)
+        if existing != json.loads(json.dumps(manifest)):
+            raise ValueError(f"A different sweep already exists in {directory}")
+        return existing
+    _write_atomic(manifest_file, manifest)
+    return manifest
+
+
+def load_manifest(directory):
+    with open(os.path.join(directory, MANIFEST), 'r') as f:
+        return json.load(f)
+
+
+def finished_tasks(directory):
+    """
+    Ids of the tasks with a completion record.
+    """
+    return {name[:-len(".json")] for name in os.listdir(os.path.join(directory, DONE)) if name.endswith(".json")}
+
+
+def _run_chunk(directory, config, tasks, runner_kwargs):
+    """
+    Worker: run tasks on one configuration and write a completion record after each.
+
+    :return: List of (task id, error message) of the tasks that raised.
+    """
+    from batch_runner import StarRequestRunner
+    from watchdog import Watchdog
+
+    runner_kwargs = dict(runner_kwargs)
+    budgets = {key: runner_kwargs.pop(key) for key in ("wait_budget", "max_sim_time") if key in runner_kwargs}
+    watchdog = Watchdog(**budgets) if any(value is not None for value in budgets.values()) else None
+    runner = StarRequestRunner(config, watchdog=watchdog, **runner_kwargs)
+    errors = []
+    for task in tasks:
+        try:
+            record = runner.run_record(task["request"])
+        except Exception as error:
+            errors.append((task["id"], f"{type(error).__name__}: {error}"))
+            continue
+        _write_atomic(os.path.join(directory, DONE, f"{task['id']}.json"), {"task": task["id"], **record})
+    return errors
+
+
+def run_sweep(directory, workers=None, chunk_size=50, progress=print):
+    """
+    Run the unfinished tasks of a sweep in a pool of worker processes.
+
+    :param directory: Directory of the sweep (see `create_sweep`).
+    :param workers: Number of worker processes; defaults to the number of cores.
+    :param chunk_size: Maximum number of tasks a worker runs on one runner.
+    :param progress: Called with a status line after every chunk, or None.
+    :return: List of (task id, error message) of the tasks that raised; they stay unfinished.
+    """
+    manifest = load_manifest(directory)
+    for config, expected in manifest["configs"].items():
+        if config_hash(config) != expected:
+            raise ValueError(f"{config} changed since the sweep was created")
+    # Temporaries of records whose writer died before the rename
+    for name in os.listdir(os.path.join(directory, DONE)):
+        if name.endswith(".tmp"):
+            os.remove(os.path.join(directory, DONE, name))
+    done = finished_tasks(directory)
+    pending = defaultdict(list)
+    for task in manifest["tasks"]:
+        if task["id"] not in done:
+            pending[task["config"]].append(task)
+    chunks = [(config, tasks[start:start + chunk_size])
+              for config, tasks in pending.items() for start in range(0, len(tasks), chunk_size)]
+
+    total, finished = len(manifest["tasks"]), len(done)
+    errors = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_run_chunk, directory, config, tasks, manifest["runner"]): len(tasks)
+                   for config, tasks in chunks}
+        for future in as_completed(futures):
+            chunk_errors = future.result()
+            errors += chunk_errors
+            finished += futures[future] - len(chunk_errors)
+            if progress is not None:
+                progress(f"{finished}/{total} tasks finished, {len(errors)} failed")
+    return errors
+
+
+def collect(directory):
+    """
+    Completion records of the finished tasks, in task order. Each record carries its "task"
+    id and the "config" it ran on.
+    """
+    manifest = load_manifest(directory)
+    done = finished_tasks(directory)
+    records = []
+    for task in manifest["tasks"]:
+        if task["id"] in done:
+            with open(os.path.join(directory, DONE, f"{task['id']}.json"), 'r') as f:
+                records.append({**json.load(f), "config": task["config"]})
+    return records
+
+
+def main():
+    import tracing
+    from batch_runner import read_requests
+    from results import ResultsStore
+
+    parser = argparse.ArgumentParser(description="Checkpointed, resumable sweeps of requests.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="Write the manifest of a new sweep.")
+    create.add_argument("directory")
+    create.add_argument("--configs", nargs="+", required=True, help="YAML network configurations.")
+    create.add_argument("--requests", required=True, help="JSONL file of requests (see batch_runner.read_requests).")
+    create.add_argument("--seeds", type=int, default=None, help="Run every request with seeds 0 .. SEEDS - 1.")
+    create.add_argument("--backend", default="netsquid", choices=["netsquid", "fast"])
+    create.add_argument("--protocol", default="sequential", choices=["sequential", "fusion"])
+    create.add_argument("--verify", action="store_true")
+    create.add_argument("--wait-budget", type=float, default=None, help="Watchdog wait budget (ns), see watchdog.py.")
+    create.add_argument("--max-sim-time", type=float, default=None, help="Watchdog simulated time budget (ns).")
+    run = commands.add_parser("run", help="Run (or resume) the unfinished tasks of a sweep.")
+    run.add_argument("directory")
+    run.add_argument("--workers", type=int, default=None)
+    run.add_argument("--chunk-size", type=int, default=50)
+    status = commands.add_parser("status", help="Report the progress of a sweep.")
+    status.add_argument("directory")
+    gather = commands.add_parser("collect", help="Write the records of the finished tasks.")
+    gather.add_argument("directory")
+    gather.add_argument("--output", default="results.jsonl", help="JSONL file the records are appended to.")
+    gather.add_argument("--store", default=None, help="Directory of a columnar results store (see results.py).")
+    args = parser.parse_args()
+
+    if args.command == "create":
+        requests = list(read_requests(args.requests))
+        manifest = create_sweep(args.directory, args.configs, requests,
+                                range(args.seeds) if args.seeds is not None else None,
+                                backend=args.backend, protocol=args.protocol, verify=args.verify,
+                                wait_budget=args.wait_budget, max_sim_time=args.max_sim_time)
+        print(f"Sweep of {len(manifest['tasks'])} tasks in {args.directory}")
+    elif args.command == "run":
+        tracing.disable()
+        errors = run_sweep(args.directory, workers=args.workers, chunk_size=args.chunk_size)
+        for task, error in errors:
+            print(f"{task} failed: {error}")
+    elif args.command == "status":
+        total, done = len(load_manifest(args.directory)["tasks"]), len(finished_tasks(args.directory))
+        print(f"{done}/{total} tasks finished")
+    else:
+        records = collect(args.directory)
+        store = ResultsStore(args.store) if args.store is not None else None
+        with open(args.output, 'a') as out:
+            for record in records:
+                out.write(json.dumps(record) + "\n")
+                if store is not None and "error" not in record:
+                    store.append(record)
+        if store is not None:
+            store.close()
+        print(f"Wrote {len(records)} records to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""
+The stabilizer backend against NetSquid on every supported network configuration (see backend_agreement.py).
+
+Skipped where NetSquid or SquidASM is not installed.
+"""
+import glob
+import os
+
+import pytest
+
+pytest.importorskip("netsquid")
+pytest.importorskip("squidasm")
+
+import tracing
+from backend_agreement import agreement, disagreements, random_requests
+
+# Their devices have 2 qubits, too few for the star protocols, and network_config.yaml is
+# not even connected
+UNSUPPORTED = {"config.yaml", "network_config.yaml"}
+CONFIGS = [config_file for config_file in sorted(glob.glob(os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "network_configs", "*.yaml")))
+    if os.path.basename(config_file) not in UNSUPPORTED]
+
+
+@pytest.mark.parametrize("protocol", ["sequential", "fusion"])
+@pytest.mark.parametrize("config_file", CONFIGS, ids=os.path.basename)
+def test_backends_agree(config_file, protocol):
+    tracing.disable()
+    report = agreement(config_file, random_requests(config_file, 2, 3), range(100), protocol=protocol)
+    assert disagreements(report, max_distance=0.25, max_time_error=0.05) == []
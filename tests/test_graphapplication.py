@@ -0,0 +1,102 @@
+"""
+Protocols of graphapplication.py, run on the stabilizer backend (see fast_backend.py).
+
+The node programs are squidasm programs, so these tests are skipped where SquidASM is not
+installed; they do not run NetSquid itself.
+"""
+import glob
+import os
+import random
+
+import networkx as nx
+import pytest
+
+pytest.importorskip("squidasm")
+
+import tracing
+from backend_agreement import random_requests
+from batch_runner import StarRequestRunner
+
+IDEAL_CONFIGS = sorted(glob.glob(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                              "network_configs", "*_ideal.yaml")))
+SMALL_WORLD = next(config_file for config_file in IDEAL_CONFIGS
+                   if os.path.basename(config_file) == "smallworld_config_ideal.yaml")
+
+
+@pytest.fixture(autouse=True)
+def no_tracing():
+    tracing.disable()
+
+
+@pytest.mark.parametrize("config_file", IDEAL_CONFIGS, ids=os.path.basename)
+def test_fusion_stars_are_exact(config_file):
+    runner = StarRequestRunner(config_file, backend="fast", protocol="fusion", verify=True)
+    # More leaves than a fusion batch, so that the center fuses several batches
+    for center, leaves in random_requests(config_file, 3, 7):
+        for seed in range(3):
+            assert runner.run_request(center, leaves, seed=seed)["fidelity"] == 1
+
+
+@pytest.mark.parametrize("config_file", IDEAL_CONFIGS, ids=os.path.basename)
+def test_planned_graphs_are_exact(config_file):
+    runner = StarRequestRunner(config_file, backend="fast", verify=True)
+    nodes = runner.routing.nodes()
+    for seed in range(5):
+        rng = random.Random(seed)
+        vertices = rng.sample(nodes, 6)
+        edges = [(vertices[a], vertices[b]) for a, b in nx.gnp_random_graph(6, 0.5, seed=seed).edges()]
+        if not edges:
+            continue
+        plan = runner.planner.plan(edges)
+        assert runner.run_graph_request(plan, seed=seed)["fidelity"] == 1
+
+
+@pytest.mark.parametrize("protocol", ["sequential", "fusion"])
+def test_expired_chain_pairs_are_regenerated(protocol):
+    request = ("node_0", ["node_3", "node_5", "node_7"])
+    results = {}
+    for cutoff in (None, 1e9, 1.):
+        runner = StarRequestRunner(SMALL_WORLD, backend="fast", protocol=protocol, verify=True, early_swap=True)
+        # The program-level cutoff NetSquid runs use (the fast backend's own is left off): with 1 ns,
+        # every pair a repeater checks has expired by the time its other link arrives
+        for program in runner.programs.values():
+            program.cutoff = cutoff
+        results[cutoff] = runner.run_request(*request, seed=1)
+    assert results[None]["epr_discarded"] == results[1e9]["epr_discarded"] == 0
+    assert results[1e9]["epr_pairs"] == results[None]["epr_pairs"]
+    regenerated = results[1.]
+    assert regenerated["epr_discarded"] > 0
+    assert regenerated["epr_pairs"] == results[None]["epr_pairs"] + regenerated["epr_discarded"]
+    assert regenerated["sim_time"] > results[None]["sim_time"]
+    if protocol == "fusion":
+        assert results[None]["fidelity"] == regenerated["fidelity"] == 1
+    else:
+        # The sequential protocol does not correct its merges yet; the cutoff must not change its state
+        assert regenerated["fidelity"] == results[None]["fidelity"]
+
+
+def test_redundant_attachment_keeps_first_completed_route():
+    center, leaf = "node_0", "node_7"
+    routes = StarRequestRunner(SMALL_WORLD, backend="fast").routing.disjoint_paths(center, leaf, 2)
+    assert len(routes) == 2 and len(routes[1]) > len(routes[0])
+
+    def attach(redundancy, lossy_route=None):
+        # A link that loses every pair makes its route fail
+        loss = None if lossy_route is None else {tuple(routes[lossy_route][1:3]): 1.}
+        runner = StarRequestRunner(SMALL_WORLD, backend="fast", protocol="fusion", verify=True,
+                                   redundancy=redundancy, loss=loss)
+        return runner.run_request(center, [leaf], seed=1)
+
+    single = attach(1)
+    # Both routes succeed: the shorter one completes first, and the longer one is not waited for
+    both = attach(2)
+    # Only the longer route succeeds: it is kept in the same round
+    longer = attach(2, lossy_route=0)
+    # Only the shorter route succeeds
+    shorter = attach(2, lossy_route=1)
+    for result in (both, longer, shorter):
+        assert result["fidelity"] == 1
+        assert result["attachment_rounds"] == [1]
+    assert longer["epr_lost"] > 0 and shorter["epr_lost"] > 0
+    assert both["chain_latencies"] == shorter["chain_latencies"] == single["chain_latencies"]
+    assert longer["chain_latencies"][0] > single["chain_latencies"][0]
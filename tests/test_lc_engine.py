@@ -0,0 +1,69 @@
+"""
+Local corrections of lc_engine.py against a dense state-vector simulation of the graph states.
+"""
+import itertools
+import random
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from lc_engine import GraphState, lc_corrections, search_orbit
+
+_GATES = {
+    "H": np.array([[1, 1], [1, -1]]) / np.sqrt(2),
+    "S": np.diag([1, 1j]),
+    "Z": np.diag([1, -1]),
+}
+
+
+def graph_state_vector(graph):
+    """
+    Amplitudes (-1)^(number of edges with both ends 1) / sqrt(2^n), one tensor axis per vertex.
+    """
+    vertices = graph.vertices
+    position = {v: i for i, v in enumerate(vertices)}
+    psi = np.empty((2,) * len(vertices), dtype=complex)
+    for bits in itertools.product((0, 1), repeat=len(vertices)):
+        parity = sum(bits[position[a]] & bits[position[b]] for a, b in graph.edges())
+        psi[bits] = (-1) ** parity
+    return psi / np.sqrt(psi.size), position
+
+
+def apply_corrections(psi, position, corrections):
+    for v, gates in corrections.items():
+        for gate in gates:
+            psi = np.moveaxis(np.tensordot(_GATES[gate], psi, axes=(1, position[v])), 0, position[v])
+    return psi
+
+
+def assert_same_state(psi, phi):
+    # Equal up to a global phase
+    assert abs(np.vdot(psi, phi)) == pytest.approx(1)
+
+
+def random_graph(seed, n=6):
+    G = nx.gnp_random_graph(n, 0.5, seed=seed)
+    return GraphState.from_edges(G.edges(), vertices=G.nodes())
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_lc_corrections_implement_local_complementations(seed):
+    rng = random.Random(seed)
+    graph = random_graph(seed)
+    sequence = [rng.choice(graph.vertices) for _ in range(rng.randint(1, 5))]
+    complemented = graph.copy()
+    for v in sequence:
+        complemented.local_complement(v)
+    psi, position = graph_state_vector(graph)
+    assert_same_state(apply_corrections(psi, position, lc_corrections(graph, sequence)),
+                      graph_state_vector(complemented)[0])
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_orbit_corrections_map_result_back_to_target(seed):
+    target = random_graph(seed)
+    # Cheapest member: the fewest edges
+    result = search_orbit(target, lambda graph: graph.num_edges, max_depth=3)
+    psi, position = graph_state_vector(result.graph)
+    assert_same_state(apply_corrections(psi, position, result.corrections()), graph_state_vector(target)[0])
@@ -0,0 +1,71 @@
+"""
+Payload encoding, packed Bell-state cases and frame schedules of messages.py.
+"""
+import itertools
+import random
+
+import networkx as nx
+import pytest
+
+from messages import (OP_CASE, OP_CONFIRMATION, OP_CUTOFF, OP_FAILURE, OP_OUTCOME, OP_ROUTE, OP_SYNC,
+                      FrameSchedule, combine_case, decode, decode_frame, encode, encode_frame, pack_case,
+                      unpack_case)
+from routing import RoutingTable
+
+OPCODES = (OP_SYNC, OP_CONFIRMATION, OP_CASE, OP_OUTCOME, OP_FAILURE, OP_CUTOFF, OP_ROUTE)
+CASES = ("00", "01", "10", "11", "-00", "-01", "-10", "-11")
+
+
+def test_payloads_round_trip():
+    assert len(set(OPCODES)) == len(OPCODES)
+    payloads = []
+    for opcode, value in itertools.product(OPCODES, range(16)):
+        message = encode(opcode, value)
+        assert len(message) == 1
+        assert decode(message) == (opcode, value)
+        payloads.append(ord(message))
+    assert decode_frame(encode_frame(payloads)) == payloads
+
+
+def test_cases_round_trip():
+    assert [unpack_case(pack_case(case)) for case in CASES] == list(CASES)
+    assert pack_case("-10") == 0b110
+
+
+def test_combine_case_matches_check_case():
+    pytest.importorskip("squidasm")
+    from graphapplication import GraphStateDistribution
+    check_case = GraphStateDistribution.check_case
+    for case, r0, r1 in itertools.product(CASES, (0, 1), (0, 1)):
+        assert unpack_case(combine_case(pack_case(case), r0, r1)) == check_case(case, f"{r0}{r1}"), (case, r0, r1)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_frame_schedules_agree(seed):
+    rng = random.Random(seed)
+    G = nx.connected_watts_strogatz_graph(15, 4, 0.3, seed=seed)
+    routing = RoutingTable(G)
+    nodes = list(G.nodes())
+    broadcasts = rng.sample(nodes, 2)
+    unicasts = [routing.path(*rng.sample(nodes, 2)) for _ in range(4)]
+    schedules = {node: FrameSchedule(node, routing, broadcasts, unicasts) for node in nodes}
+
+    # Every frame a node sends is the frame its neighbour expects, with the same items in the same order
+    for node, schedule in schedules.items():
+        for round_, hops in schedule.sends.items():
+            for peer, items in hops.items():
+                assert G.has_edge(node, peer)
+                assert schedules[peer].recvs[round_][node] == items
+        for round_, hops in schedule.recvs.items():
+            for peer, items in hops.items():
+                assert schedules[peer].sends[round_][node] == items
+
+    # Broadcasts reach every other node, unicasts the end of their path, each exactly once
+    for index, source in enumerate(broadcasts):
+        receivers = [node for node, schedule in schedules.items() if ("b", index) in schedule.delivers]
+        assert sorted(receivers) == sorted(set(nodes) - {source})
+    for index, path in enumerate(unicasts):
+        receivers = [node for node, schedule in schedules.items() if ("u", index) in schedule.delivers]
+        assert receivers == [path[-1]]
+    # Aggregation never sends more frames than payload hops
+    assert sum(s.num_frames() for s in schedules.values()) <= sum(s.num_payloads() for s in schedules.values())
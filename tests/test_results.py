@@ -0,0 +1,38 @@
+"""
+Columnar results store of results.py.
+"""
+import numpy as np
+
+from results import RaggedColumn, ResultsStore
+
+
+def test_star_graph_and_partial_records(tmp_path):
+    records = [
+        {"id": "s", "seed": 3, "center": "node_1", "leaves": ["node_0", "node_2"], "sim_time": 1e6,
+         "chain_latencies": [2e5, 3e5], "attachment_rounds": [1, 2], "epr_pairs": 5},
+        {"id": "g", "edges": [["node_0", "node_1"], ["node_1", "node_2"]], "stars": [["node_1", ["node_0"]]],
+         "sim_time": 2e6},
+    ]
+    with ResultsStore(str(tmp_path), batch_size=1) as store:
+        for record in records:
+            store.append(record)
+    columns = ResultsStore(str(tmp_path)).load()
+    assert list(columns["center"]) == ["node_1", ""]
+    assert list(columns["run_id"]) == [0, 1]
+    assert list(columns["epr_pairs"]) == [5, -1]
+    assert list(columns["chain_latencies"][0]) == [2e5, 3e5]
+    assert list(columns["attachment_rounds"][1]) == []
+    assert list(columns["edges"][1]) == ["node_0", "node_1", "node_1", "node_2"]
+
+
+def test_take_matches_row_by_row():
+    rng = np.random.default_rng(0)
+    lengths = rng.integers(0, 4, 50)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    column = RaggedColumn(rng.random(offsets[-1]), offsets)
+    for rows in (slice(None), slice(5, 20, 3), rng.random(50) < 0.3, rng.permutation(50)[:10], []):
+        taken = column.take(rows)
+        expected = np.arange(50)[rows]
+        assert len(taken) == len(expected)
+        for i, row in enumerate(expected):
+            assert np.array_equal(taken[i], column[row])
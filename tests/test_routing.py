@@ -0,0 +1,52 @@
+"""
+Incremental route repair of routing.RoutingTable against a fresh Dijkstra run.
+"""
+import random
+
+import networkx as nx
+import pytest
+
+from routing import RoutingTable
+
+
+def random_graph(seed, weighted):
+    rng = random.Random(seed)
+    G = nx.gnm_random_graph(12, 24, seed=seed)
+    if weighted:
+        for a, b in G.edges():
+            # Integer weights, so that equal-length routes occur as well
+            G[a][b]["weight"] = rng.randint(1, 5)
+    return G
+
+
+def assert_matches_dijkstra(routing):
+    for source in routing.nodes():
+        distances, _ = nx.single_source_dijkstra(routing.G, source, weight=routing.weight)
+        paths = routing._source_paths(source)
+        assert set(routing._distances[source]) == set(distances) == set(paths)
+        for node, distance in distances.items():
+            assert routing._distances[source][node] == pytest.approx(distance)
+            path = paths[node]
+            assert path[0] == source and path[-1] == node
+            assert all(routing.G.has_edge(a, b) for a, b in zip(path, path[1:]))
+            assert sum(routing._length(a, b) for a, b in zip(path, path[1:])) == pytest.approx(distance)
+        tree = routing.tree(source)
+        assert tree.height == max(len(path) - 1 for path in paths.values())
+
+
+@pytest.mark.parametrize("weighted", [False, True])
+@pytest.mark.parametrize("seed", range(10))
+def test_repaired_routes_are_shortest_paths(seed, weighted):
+    rng = random.Random(seed)
+    G = random_graph(seed, weighted)
+    routing = RoutingTable(G)
+    for source in routing.nodes():
+        routing.tree(source)
+    for _ in range(30):
+        edges = list(G.edges())
+        missing = [(a, b) for a in G for b in G if a < b and not G.has_edge(a, b)]
+        if edges and (not missing or rng.random() < 0.5):
+            routing.remove_edge(*rng.choice(edges))
+        else:
+            routing.add_edge(*rng.choice(missing), **({"weight": rng.randint(1, 5)} if weighted else {}))
+        assert_matches_dijkstra(routing)
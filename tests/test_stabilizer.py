@@ -0,0 +1,117 @@
+"""
+The stabilizer tableau against a dense state-vector simulation of the same random Clifford circuits.
+"""
+import itertools
+
+import numpy as np
+import pytest
+
+from stabilizer import StabilizerTableau
+
+_H = np.array([[1, 1], [1, -1]]) / np.sqrt(2)
+_S = np.diag([1, 1j])
+_MATRICES = {
+    "I": np.eye(2),
+    "X": np.array([[0, 1], [1, 0]]),
+    "Y": np.array([[0, -1j], [1j, 0]]),
+    "Z": np.diag([1, -1]),
+}
+_SINGLE = {"h": _H, "s": _S, "sdg": _S.conj().T, "x_gate": _MATRICES["X"], "y_gate": _MATRICES["Y"],
+           "z_gate": _MATRICES["Z"]}
+
+
+class StateVector:
+    """
+    Dense state of qubit slots, one tensor axis per slot.
+    """
+
+    def __init__(self):
+        self.psi = np.ones((), dtype=complex)
+
+    def add_qubit(self):
+        self.psi = np.multiply.outer(self.psi, np.array([1, 0], dtype=complex))
+
+    def apply(self, matrix, *qubits):
+        k = len(qubits)
+        gate = matrix.reshape((2,) * 2 * k)
+        self.psi = np.moveaxis(np.tensordot(gate, self.psi, axes=(range(k, 2 * k), qubits)), range(k), qubits)
+
+    def probability_one(self, q):
+        return float(np.sum(np.abs(np.take(self.psi, 1, axis=q)) ** 2))
+
+    def project(self, q, outcome):
+        keep = np.zeros(2)
+        keep[outcome] = 1
+        self.apply(np.diag(keep), q)
+        self.psi /= np.linalg.norm(self.psi)
+
+    def expectation(self, paulis):
+        phi = self.psi
+        for q, name in paulis.items():
+            phi = np.moveaxis(np.tensordot(_MATRICES[name], phi, axes=(1, q)), 0, q)
+        return float(np.vdot(self.psi, phi).real)
+
+
+def assert_same_state(tableau, dense, rng, samples=40):
+    """
+    Compare single-qubit, two-qubit and random Pauli products on every slot.
+    """
+    n = dense.psi.ndim
+    products = [{q: name} for q in range(n) for name in "XYZ"]
+    products += [{a: p, b: r} for a, b in itertools.combinations(range(n), 2) for p in "XZ" for r in "XZ"]
+    products += [{q: name for q, name in enumerate(rng.choice(list("IXYZ"), n)) if name != "I"}
+                 for _ in range(samples)]
+    for product in products:
+        if not product:
+            continue
+        assert tableau.expectation(product) == pytest.approx(dense.expectation(product), abs=1e-9), product
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_clifford_circuits(seed):
+    rng = np.random.default_rng(seed)
+    # Capacity 1 forces the tableau to grow while the circuit runs
+    tableau = StabilizerTableau(capacity=1, rng=np.random.default_rng(seed))
+    dense = StateVector()
+    qubits = []
+    for step in range(60):
+        action = rng.random()
+        if len(qubits) < 2 or (action < 0.1 and len(qubits) < 7):
+            q = tableau.allocate()
+            while dense.psi.ndim < tableau.n:
+                dense.add_qubit()
+            qubits.append(q)
+        elif action < 0.55:
+            name = rng.choice(list(_SINGLE))
+            q = int(rng.choice(qubits))
+            getattr(tableau, name)(q)
+            dense.apply(_SINGLE[name], q)
+        elif action < 0.85:
+            a, b = (int(q) for q in rng.choice(qubits, 2, replace=False))
+            if rng.random() < 0.5:
+                tableau.cnot(a, b)
+                dense.apply(np.array([[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 0, 1], [0, 0, 1, 0]]), a, b)
+            else:
+                tableau.cz(a, b)
+                dense.apply(np.diag([1, 1, 1, -1]), a, b)
+        else:
+            q = int(rng.choice(qubits))
+            p1 = dense.probability_one(q)
+            outcome = tableau.measure(q)
+            if p1 < 1e-9 or p1 > 1 - 1e-9:
+                assert outcome == round(p1)
+            else:
+                assert p1 == pytest.approx(0.5)
+            dense.project(q, outcome)
+        assert_same_state(tableau, dense, rng)
+
+
+def test_release_resets_slot():
+    tableau = StabilizerTableau(capacity=2, rng=np.random.default_rng(1))
+    a, b = tableau.allocate(), tableau.allocate()
+    tableau.h(a)
+    tableau.cnot(a, b)
+    tableau.release(b)
+    assert tableau.expectation({b: "Z"}) == 1
+    assert tableau.expectation({a: "Z"}) in (-1, 1)
+    assert tableau.allocate() == b
@@ -0,0 +1,79 @@
+"""
+Interrupting and resuming a sweep of sweep.py.
+
+The workers run the node programs, so these tests are skipped where SquidASM is not installed.
+"""
+import os
+
+import pytest
+
+pytest.importorskip("squidasm")
+
+import sweep
+import tracing
+from batch_runner import StarRequestRunner
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      "network_configs", "smallworld_config_ideal.yaml")
+REQUESTS = [{"id": "a", "center": "node_0", "leaves": ["node_3", "node_5"]},
+            {"id": "b", "center": "node_7", "leaves": ["node_1", "node_2", "node_9"]}]
+
+
+@pytest.fixture(autouse=True)
+def no_tracing():
+    tracing.disable()
+
+
+def read_done(directory):
+    done = os.path.join(directory, sweep.DONE)
+    records = {}
+    for name in os.listdir(done):
+        with open(os.path.join(done, name), 'rb') as f:
+            records[name] = f.read()
+    return records
+
+
+def test_interrupted_sweep_resumes_without_repeating_or_losing_runs(tmp_path, monkeypatch):
+    directory = str(tmp_path / "sweep")
+    manifest = sweep.create_sweep(directory, [CONFIG], REQUESTS, seeds=range(4), backend="fast", protocol="fusion",
+                                  verify=True)
+    tasks = manifest["tasks"]
+
+    # A worker is interrupted during its fourth task, and another one while writing a record
+    run_record = StarRequestRunner.run_record
+    calls = []
+
+    def interrupted_run_record(runner, request):
+        calls.append(request)
+        if len(calls) == 4:
+            raise KeyboardInterrupt
+        return run_record(runner, request)
+
+    monkeypatch.setattr(StarRequestRunner, "run_record", interrupted_run_record)
+    with pytest.raises(KeyboardInterrupt):
+        sweep._run_chunk(directory, CONFIG, tasks, manifest["runner"])
+    monkeypatch.undo()
+    interrupted = read_done(directory)
+    with open(os.path.join(directory, sweep.DONE, f"{tasks[5]['id']}.json.1234.tmp"), 'w') as f:
+        f.write('{"task": ')
+    assert sorted(sweep.finished_tasks(directory)) == [task["id"] for task in tasks[:3]]
+
+    # Creating the sweep again is a no-op, and the resumed run only runs the unfinished tasks
+    assert sweep.create_sweep(directory, [CONFIG], REQUESTS, seeds=range(4), backend="fast",
+                              protocol="fusion", verify=True) == manifest
+    progress = []
+    assert sweep.run_sweep(directory, workers=2, chunk_size=2, progress=progress.append) == []
+    assert progress[-1] == f"{len(tasks)}/{len(tasks)} tasks finished, 0 failed"
+    resumed = read_done(directory)
+    # The finished records are kept as they were (their wall times would differ after a rerun)
+    assert {name: resumed[name] for name in interrupted} == interrupted
+    assert sorted(resumed) == sorted(f"{task['id']}.json" for task in tasks)
+
+    records = sweep.collect(directory)
+    assert [record["task"] for record in records] == [task["id"] for task in tasks]
+    assert [(record["id"], record["seed"]) for record in records] == [
+        (task["request"]["id"], task["request"]["seed"]) for task in tasks]
+    assert all(record["fidelity"] == 1 for record in records)
+    # Nothing is left to run
+    assert sweep.run_sweep(directory, workers=1, progress=None) == []
+    assert read_done(directory) == resumed
@@ -0,0 +1,23 @@
+"""
+Layout cache of visualization.py.
+"""
+import networkx as nx
+
+from visualization import layout_positions, topology_hash
+
+
+def test_cached_layout_keeps_node_labels(tmp_path):
+    G = nx.path_graph(5)
+    computed = layout_positions(G, seed=1, cache_dir=str(tmp_path))
+    cached = layout_positions(G, seed=1, cache_dir=str(tmp_path))
+    assert set(cached) == set(G.nodes())
+    for node in G:
+        assert (cached[node] == computed[node]).all()
+
+
+def test_labels_of_different_types_do_not_share_a_layout(tmp_path):
+    G = nx.path_graph(5)
+    H = nx.relabel_nodes(G, str)
+    assert topology_hash(G) != topology_hash(H)
+    layout_positions(G, seed=1, cache_dir=str(tmp_path))
+    assert set(layout_positions(H, seed=1, cache_dir=str(tmp_path))) == set(H.nodes())
@@ -0,0 +1,64 @@
+"""
+Deadlock reports of watchdog.py, on programs run by the stabilizer backend (see fast_backend.py).
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from fast_backend import FastNetwork
+from watchdog import FastTimer, SimulationStalled, Watchdog
+
+
+class WaitingProgram:
+    """
+    Minimal node program: receive one message from each of `peers` in turn, then return.
+    """
+
+    def __init__(self, node_name, peers, neighbours):
+        self.node_name = node_name
+        self.peers = peers
+        self.meta = SimpleNamespace(csockets=neighbours, epr_sockets=[])
+
+    def sim_time(self):
+        return self.clock()
+
+    def run(self, context):
+        for peer in self.peers:
+            yield from context.csockets[peer].recv()
+        return self.node_name
+
+
+def line_network(nodes):
+    links = [{"stack1": a, "stack2": b, "typ": "perfect"} for a, b in zip(nodes, nodes[1:])]
+    clinks = [{"stack1": a, "stack2": b, "typ": "default", "cfg": {"delay": 10.}} for a, b in zip(nodes, nodes[1:])]
+    return FastNetwork({"stacks": [{"name": node} for node in nodes], "links": links, "clinks": clinks})
+
+
+def test_deadlock_is_reported():
+    network = line_network(["node_0", "node_1", "node_2", "node_3"])
+    # node_0 and node_1 wait on each other; node_3 waits on node_2, which returns without sending
+    programs = {
+        "node_0": WaitingProgram("node_0", ["node_1"], ["node_1"]),
+        "node_1": WaitingProgram("node_1", ["node_0"], ["node_0", "node_2"]),
+        "node_2": WaitingProgram("node_2", [], ["node_1", "node_3"]),
+        "node_3": WaitingProgram("node_3", ["node_2"], ["node_2"]),
+    }
+    watchdog = Watchdog(wait_budget=1e3, timer=FastTimer(network))
+    for program in programs.values():
+        watchdog.watch(program)
+
+    with pytest.raises(RuntimeError, match="blocked node programs"):
+        network.run(programs, seed=0)
+    # The budget timers are passive, so the run ended instead of aborting
+    assert watchdog.blocked() == ["node_0", "node_1", "node_3"]
+    with pytest.raises(SimulationStalled) as stall:
+        watchdog.check()
+
+    stall = stall.value
+    assert stall.sim_time == 0
+    assert list(stall.waits) == ["node_0", "node_1", "node_3"]
+    assert {node: (wait["op"], wait["peers"]) for node, wait in stall.waits.items()} == {
+        "node_0": ("recv", ["node_1"]), "node_1": ("recv", ["node_0"]), "node_3": ("recv", ["node_2"])}
+    assert [sorted(cycle) for cycle in stall.cycles] == [["node_0", "node_1"]]
+    assert stall.returned == ["node_2"]
+    assert "deadlock: " in str(stall) and "node_2 has returned but node_3 wait on it" in str(stall)
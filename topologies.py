@@ -0,0 +1,255 @@
+"""
+Seeded network topologies and the squidasm network configurations built from them.
+
+Every generator returns a connected topology as a list of ``(i, j)`` links between the
+nodes ``0 .. num_nodes - 1``, which `network_config` turns into a configuration
+dictionary and `write_network` into a YAML file, both with the same layout as the files in
+``network_configs/`` (node ``i`` is the stack ``node_i``). The same seed always yields the
+same topology, and `sample_link_cfgs` draws seeded per-link noise parameters.
+
+`write_network` streams the YAML to disk, with the device and link profiles written once
+as anchors, so it handles networks of tens of thousands of nodes; with ``routes=True`` it
+also writes the routing table (see `routing.RoutingTable.save`) next to the YAML, which
+`batch_runner.StarRequestRunner` then loads instead of computing shortest paths.
+
+Usage::
+
+    python topologies.py barabasi_albert 10000 network_configs/ba10k.yaml --seed 3 --noisy --heterogeneous
+"""
+import argparse
+import math
+import random
+
+import networkx as nx
+import numpy as np
+
+from routing import RoutingTable, routes_file
+
+# Device and link profiles, as used for the configurations in network_configs/
+PERFECT_QDEVICE_CFG = {
+    'num_qubits': 4,
+    'T1': 0,
+    'T2': 0,
+    'init_time': 0,
+    'single_qubit_gate_time': 0,
+    'two_qubit_gate_time': 0,
+    'measure_time': 0,
+    'single_qubit_gate_depolar_prob': 0.0,
+    'two_qubit_gate_depolar_prob': 0.0,
+}
+
+NOISY_QDEVICE_CFG = {
+    'num_qubits': 4,
+    'T1': 500_000_000,
+    'T2': 500_000_000,
+    'init_time': 10_000,
+    'single_qubit_gate_time': 10_000,
+    'two_qubit_gate_time': 10_000,
+    'measure_time': 10_000,
+    'single_qubit_gate_depolar_prob': 0.5,
+    'two_qubit_gate_depolar_prob': 0.5,
+}
+
+LINK_CFG = {
+    'fidelity': 0.97,
+    'prob_success': 0.2,
+    'length': 10,
+}
+
+
+def small_world(num_nodes, k=4, p=0.1, seed=None):
+    """
+    Connected Watts-Strogatz small-world topology: a ring where every node is linked to its
+    `k` nearest neighbours, with each link rewired with probability `p`.
+    """
+    if num_nodes <= k:
+        return [(i, j) for i in range(num_nodes) for j in range(i + 1, num_nodes)]
+    G = nx.connected_watts_strogatz_graph(num_nodes, k, p, seed=seed)
+    return sorted(tuple(sorted(edge)) for edge in G.edges())
+
+
+def ring(num_nodes, seed=None):
+    """
+    Ring topology. The seed is accepted for a uniform signature and ignored.
+    """
+    return [(i, i + 1) for i in range(num_nodes - 1)] + ([(0, num_nodes - 1)] if num_nodes > 2 else [])
+
+
+def grid(num_nodes, seed=None):
+    """
+    Near-square grid topology with `num_nodes` nodes filled in row by row. The seed is ignored.
+    """
+    cols = math.ceil(math.sqrt(num_nodes))
+    links = []
+    for i in range(num_nodes):
+        if (i + 1) % cols and i + 1 < num_nodes:
+            links.append((i, i + 1))
+        if i + cols < num_nodes:
+            links.append((i, i + cols))
+    return links
+
+
+def random_topology(num_nodes, degree=3, seed=None):
+    """
+    Connected random topology with an average degree of about `degree`: a uniformly random
+    spanning tree plus uniformly random extra links.
+    """
+    rng = random.Random(seed)
+    order = list(range(num_nodes))
+    rng.shuffle(order)
+    links = {tuple(sorted((order[i], order[rng.randrange(i)]))) for i in range(1, num_nodes)}
+    target = min(num_nodes * degree // 2, num_nodes * (num_nodes - 1) // 2)
+    while len(links) < target:
+        a, b = rng.sample(range(num_nodes), 2)
+        links.add((min(a, b), max(a, b)))
+    return sorted(links)
+
+
+def barabasi_albert(num_nodes, m=2, seed=None):
+    """
+    Barabasi-Albert scale-free topology: nodes join one by one and link to `m` existing nodes
+    chosen with probability proportional to their degree.
+    """
+    if num_nodes <= m:
+        return small_world(num_nodes, k=m)
+    G = nx.barabasi_albert_graph(num_nodes, m, seed=seed)
+    return sorted(tuple(sorted(edge)) for edge in G.edges())
+
+
+def hierarchical(num_nodes, cluster_size=10, k=4, p=0.1, seed=None):
+    """
+    Two-level topology: consecutive blocks of `cluster_size` nodes form small-world clusters,
+    whose first nodes act as gateways joined by a small-world backbone.
+    """
+    rng = random.Random(seed)
+    links = []
+    gateways = list(range(0, num_nodes, cluster_size))
+    for gateway in gateways:
+        size = min(cluster_size, num_nodes - gateway)
+        links += [(gateway + i, gateway + j) for i, j in small_world(size, k=k, p=p, seed=rng.randrange(2 ** 32))]
+    links += [(gateways[i], gateways[j])
+              for i, j in small_world(len(gateways), k=k, p=p, seed=rng.randrange(2 ** 32))]
+    return sorted(links)
+
+
+TOPOLOGIES = {
+    "small_world": small_world,
+    "ring": ring,
+    "grid": grid,
+    "random": random_topology,
+    "barabasi_albert": barabasi_albert,
+    "hierarchical": hierarchical,
+}
+
+
+def sample_link_cfgs(links, fidelity=(0.9, 0.99), prob_success=(0.1, 0.3), length=(5, 20), seed=None):
+    """
+    Draw heterogeneous depolarising link parameters, each uniformly from its (low, high) range.
+
+    :return: List with one link `cfg` dictionary per link. The classical links of a noisy
+        configuration get the same length.
+    """
+    rng = np.random.default_rng(seed)
+    samples = [np.round(rng.uniform(low, high, len(links)), 4) for low, high in (fidelity, prob_success, length)]
+    return [{'fidelity': float(f), 'prob_success': float(q), 'length': float(l)} for f, q, l in zip(*samples)]
+
+
+def network_config(num_nodes, links, noisy=False, link_cfgs=None):
+    """
+    Build a network configuration dictionary for the given topology.
+
+    :param num_nodes: Number of nodes.
+    :param links: List of (i, j) links.
+    :param noisy: If True, use the noisy device profile, depolarising links and clinks with a
+        length; otherwise perfect devices, perfect links and instant clinks.
+    :param link_cfgs: Optional per-link `cfg` dictionaries (see `sample_link_cfgs`) replacing
+        the shared link profile of a noisy configuration.
+    """
+    qdevice_cfg = NOISY_QDEVICE_CFG if noisy else PERFECT_QDEVICE_CFG
+    stacks = [{'name': f'node_{i}', 'qdevice_typ': 'generic', 'qdevice_cfg': qdevice_cfg} for i in range(num_nodes)]
+    link_entries = []
+    clink_entries = []
+    for n, (i, j) in enumerate(links):
+        if noisy:
+            cfg = link_cfgs[n] if link_cfgs is not None else LINK_CFG
+            link_entries.append({'stack1': f'node_{i}', 'stack2': f'node_{j}', 'typ': 'depolarise', 'cfg': cfg})
+            clink_entries.append({'stack1': f'node_{i}', 'stack2': f'node_{j}', 'typ': 'default',
+                                  'cfg': {'length': cfg['length']}})
+        else:
+            link_entries.append({'stack1': f'node_{i}', 'stack2': f'node_{j}', 'typ': 'perfect'})
+            clink_entries.append({'stack1': f'node_{i}', 'stack2': f'node_{j}', 'typ': 'instant'})
+    return {'stacks': stacks, 'links': link_entries, 'clinks': clink_entries}
+
+
+def _write_mapping(f, mapping, indent):
+    for key, value in mapping.items():
+        f.write(f"{indent}{key}: {value}\n")
+
+
+def write_network(filename, num_nodes, links, noisy=False, link_cfgs=None, routes=False):
+    """
+    Stream the network configuration of `network_config` to a YAML file.
+
+    The file is written entry by entry, with the device profile (and the shared link profile)
+    written once as an anchor that every stack (link) merges, so memory use does not grow
+    with the size of the network. The layout is the one of ``network_configs/gen_network_yaml.py``.
+
+    :param routes: If True, also save the routing table of the topology to `routing.routes_file`.
+        Its cost grows quadratically with the number of nodes, to minutes for 10000 nodes.
+    """
+    profile = 'noisy_qdevice_cfg' if noisy else 'perfect_qdevice_cfg'
+    with open(filename, 'w') as f:
+        f.write(f"{profile}: &{profile}\n")
+        _write_mapping(f, NOISY_QDEVICE_CFG if noisy else PERFECT_QDEVICE_CFG, "  ")
+        f.write("stacks:\n")
+        for i in range(num_nodes):
+            f.write(f"- name: node_{i}\n  qdevice_typ: generic\n  qdevice_cfg:\n    <<: *{profile}\n")
+        if noisy and link_cfgs is None:
+            f.write("link_cfg: &link_cfg\n")
+            _write_mapping(f, LINK_CFG, "  ")
+        f.write("links:\n")
+        for n, (i, j) in enumerate(links):
+            f.write(f"- stack1: node_{i}\n  stack2: node_{j}\n")
+            if not noisy:
+                f.write("  typ: perfect\n")
+            elif link_cfgs is None:
+                f.write("  typ: depolarise\n  cfg:\n    <<: *link_cfg\n")
+            else:
+                f.write("  typ: depolarise\n  cfg:\n")
+                _write_mapping(f, link_cfgs[n], "    ")
+        f.write("clinks:\n")
+        for n, (i, j) in enumerate(links):
+            f.write(f"- stack1: node_{i}\n  stack2: node_{j}\n")
+            if noisy:
+                length = (link_cfgs[n] if link_cfgs is not None else LINK_CFG)['length']
+                f.write(f"  typ: default\n  cfg:\n    length: {length}\n")
+            else:
+                f.write("  typ: instant\n")
+
+    if routes:
+        G = nx.Graph()
+        G.add_nodes_from(f'node_{i}' for i in range(num_nodes))
+        G.add_edges_from((f'node_{i}', f'node_{j}') for i, j in links)
+        RoutingTable(G).save(routes_file(filename))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a seeded network configuration.")
+    parser.add_argument("topology", choices=list(TOPOLOGIES))
+    parser.add_argument("num_nodes", type=int)
+    parser.add_argument("output", help="YAML file to write.")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--noisy", action="store_true", help="Noisy devices and depolarising links.")
+    parser.add_argument("--heterogeneous", action="store_true",
+                        help="Sample the parameters of every noisy link (see sample_link_cfgs).")
+    parser.add_argument("--routes", action="store_true", help="Also write the precomputed routing table.")
+    args = parser.parse_args()
+
+    links = TOPOLOGIES[args.topology](args.num_nodes, seed=args.seed)
+    link_cfgs = sample_link_cfgs(links, seed=args.seed) if args.noisy and args.heterogeneous else None
+    write_network(args.output, args.num_nodes, links, noisy=args.noisy, link_cfgs=link_cfgs, routes=args.routes)
+    print(f"Wrote {args.output}: {args.num_nodes} nodes, {len(links)} links")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Level-gated, lazily formatted protocol tracing.
+
+Node programs emit trace records through one `Tracer` per (node, subsystem) pair, e.g.
+``tracer.info("[CENTER %s] Step %s complete", node, step)``. A disabled record costs a
+single integer comparison: the message is only formatted, and the simulation clock only
+read, once a record passes its subsystem's level. Enabled records are handed to sinks:
+
+- `ConsoleSink` prints ``<time>us: <message>`` lines (the protocol progress output),
+- `LoggingSink` forwards to the node's logger (``logs/info.log`` in `run_simulation.py`),
+- `JsonlSink` and `BinarySink` write machine-readable traces for later analysis.
+
+Verbosity and sinks are set per subsystem with `configure`, and `disable` switches
+tracing off entirely, which is what production batch runs should use. Subsystems used
+by `GraphStateDistribution` are "star" (star generation steps), "epr" (EPR pair and chain
+generation) and "correction" (Pauli corrections).
+"""
+import json
+import logging
+import struct
+import weakref
+
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+OFF = logging.CRITICAL + 10
+
+_LEVEL_NAMES = {"DEBUG": DEBUG, "INFO": INFO, "WARNING": WARNING, "OFF": OFF}
+
+# Registry of live tracers, so that configuration changes reach tracers created earlier
+_tracers = weakref.WeakSet()
+_config = {"levels": {"*": INFO}, "sinks": {}}
+
+
+def _level(level):
+    return _LEVEL_NAMES[level.upper()] if isinstance(level, str) else level
+
+
+class Tracer:
+    """
+    Trace emitter of one subsystem on one node.
+
+    :param node: Name of the node emitting the records.
+    :param subsystem: Name of the protocol subsystem, used to look up level and sinks.
+    :param clock: Callable returning the current simulation time.
+    :param logger: Logger used by `LoggingSink` for this node.
+    """
+
+    __slots__ = ("node", "subsystem", "clock", "logger", "level", "sinks", "__weakref__")
+
+    def __init__(self, node, subsystem, clock, logger=None):
+        self.node = node
+        self.subsystem = subsystem
+        self.clock = clock
+        self.logger = logger
+        self._apply_config()
+        _tracers.add(self)
+
+    def _apply_config(self):
+        levels, sinks = _config["levels"], _config["sinks"]
+        self.level = levels.get(self.subsystem, levels["*"])
+        self.sinks = sinks.get(self.subsystem, sinks.get("*", ()))
+        if not self.sinks:
+            self.level = OFF
+
+    def enabled(self, level=INFO):
+        """
+        Cheap check to guard the computation of expensive trace arguments.
+        """
+        return level >= self.level
+
+    def _emit(self, level, msg, args):
+        time = self.clock()
+        for sink in self.sinks:
+            sink.emit(self, time, level, msg, args)
+
+    def log(self, level, msg, *args):
+        if level >= self.level:
+            self._emit(level, msg, args)
+
+    def debug(self, msg, *args):
+        if DEBUG >= self.level:
+            self._emit(DEBUG, msg, args)
+
+    def info(self, msg, *args):
+        if INFO >= self.level:
+            self._emit(INFO, msg, args)
+
+    def warning(self, msg, *args):
+        if WARNING >= self.level:
+            self._emit(WARNING, msg, args)
+
+
+def get_tracer(node, subsystem, clock, logger=None):
+    """
+    Create the `Tracer` of `subsystem` on `node`, configured by the current settings.
+    """
+    return Tracer(node, subsystem, clock, logger)
+
+
+def configure(levels=None, sinks=None):
+    """
+    Set trace levels and sinks per subsystem.
+
+    Keys are subsystem names or "*" for every subsystem not listed explicitly. Levels may
+    be given as numbers or as "DEBUG", "INFO", "WARNING" or "OFF".
+
+    :param levels: Dictionary subsystem -> level, merged into the current levels.
+    :param sinks: Dictionary subsystem -> list of sinks, merged into the current sinks.
+    """
+    if levels:
+        _config["levels"].update({subsystem: _level(level) for subsystem, level in levels.items()})
+    if sinks:
+        _config["sinks"].update(sinks)
+    for tracer in list(_tracers):
+        tracer._apply_config()
+
+
+def parse_levels(spec):
+    """
+    Parse a level specification such as ``"INFO"`` or ``"*=OFF,epr=DEBUG"`` into a dictionary.
+    """
+    levels = {}
+    for entry in spec.split(","):
+        subsystem, _, level = entry.rpartition("=")
+        levels[subsystem or "*"] = _level(level.strip())
+    return levels
+
+
+def disable():
+    """
+    Switch tracing off for every subsystem.
+    """
+    _config["levels"] = {"*": OFF}
+    for tracer in list(_tracers):
+        tracer._apply_config()
+
+
+def close():
+    """
+    Flush and close every configured sink that writes to a file.
+    """
+    for sinks in _config["sinks"].values():
+        for sink in sinks:
+            sink.close()
+
+
+class ConsoleSink:
+    """
+    Print records as ``<time>us: <message>``.
+    """
+
+    def emit(self, tracer, time, level, msg, args):
+        print(f"{time}us: {msg % args if args else msg}")
+
+    def close(self):
+        pass
+
+
+class LoggingSink:
+    """
+    Forward records to the node logger of the tracer, which formats them lazily itself.
+    """
+
+    def emit(self, tracer, time, level, msg, args):
+        logger = tracer.logger if tracer.logger is not None else logging.getLogger(tracer.node)
+        logger.log(level, msg, *args)
+
+    def close(self):
+        pass
+
+
+class JsonlSink:
+    """
+    Write one JSON object per record with the simulation time, node, subsystem, level and message.
+
+    :param filename: Path of the JSONL trace file.
+    """
+
+    def __init__(self, filename):
+        self.file = open(filename, 'w')
+
+    def emit(self, tracer, time, level, msg, args):
+        self.file.write(json.dumps({"t": time, "node": tracer.node, "sub": tracer.subsystem, "lvl": level,
+                                    "msg": msg % args if args else msg}) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class BinarySink:
+    """
+    Compact binary trace.
+
+    Node names, subsystems and message formats are interned: the first time a string is
+    seen it is written once as a definition record, and trace records refer to it by a
+    16-bit id. A trace record is the header ``<dHHHBB`` (time, node id, subsystem id,
+    format id, level, number of arguments) followed by the arguments, each as a 16-bit
+    length and UTF-8 text, so trace formats should only use ``%s`` placeholders. Use
+    `read_binary_trace` to decode the file.
+
+    :param filename: Path of the binary trace file.
+    """
+
+    _DEFINITION = 0
+    _RECORD = 1
+    _HEADER = struct.Struct("<dHHHBB")
+
+    def __init__(self, filename):
+        self.file = open(filename, 'wb')
+        self.ids = {}
+
+    def _intern(self, text):
+        string_id = self.ids.get(text)
+        if string_id is None:
+            string_id = self.ids[text] = len(self.ids)
+            data = text.encode()
+            self.file.write(struct.pack("<BHH", self._DEFINITION, string_id, len(data)) + data)
+        return string_id
+
+    def emit(self, tracer, time, level, msg, args):
+        header = self._HEADER.pack(time, self._intern(tracer.node), self._intern(tracer.subsystem),
+                                   self._intern(msg), level, len(args))
+        self.file.write(bytes((self._RECORD,)) + header)
+        for arg in args:
+            data = str(arg).encode()
+            self.file.write(struct.pack("<H", len(data)) + data)
+
+    def close(self):
+        self.file.close()
+
+
+def read_binary_trace(filename):
+    """
+    Decode a trace written by `BinarySink`.
+
+    :return: A generator of dictionaries with keys "t", "node", "sub", "lvl" and "msg".
+    """
+    strings = {}
+    header = BinarySink._HEADER
+    with open(filename, 'rb') as f:
+        data = f.read()
+    offset = 0
+    while offset < len(data):
+        kind = data[offset]
+        offset += 1
+        if kind == BinarySink._DEFINITION:
+            string_id, length = struct.unpack_from("<HH", data, offset)
+            offset += 4
+            strings[string_id] = data[offset:offset + length].decode()
+            offset += length
+            continue
+        time, node, subsystem, fmt, level, num_args = header.unpack_from(data, offset)
+        offset += header.size
+        args = []
+        for _ in range(num_args):
+            (length,) = struct.unpack_from("<H", data, offset)
+            offset += 2
+            args.append(data[offset:offset + length].decode())
+            offset += length
+        msg = strings[fmt]
+        yield {"t": time, "node": strings[node], "sub": strings[subsystem], "lvl": level,
+               "msg": msg % tuple(args) if args else msg}
+
+
+# Default configuration: protocol progress to the console, protocol details to the node logs
+configure(sinks={"star": [ConsoleSink()], "*": [LoggingSink()]})
@@ -0,0 +1,326 @@
+"""
+Verification of the star graph states produced by `GraphStateDistribution`.
+
+The star graph state with center ``c`` and leaves ``L`` is the unique state stabilized by
+the generators
+
+    K_c = X_c prod_{l in L} Z_l        and        K_l = Z_c X_l   for every leaf l.
+
+Its fidelity is estimated from the expectation values of these generators in one of two ways.
+
+Local measurements (any backend). A star graph is two-colourable, so two measurement
+settings suffice: ``CENTER_X`` (center in X, leaves in Z) measures K_c, and ``LEAVES_X``
+(center in Z, leaves in X) measures all K_l at once. Runs alternate between the settings,
+and `estimate` turns the outcomes of a batch of runs into generator expectations and the
+two-setting fidelity bound F >= P(K_c = +1) + P(all K_l = +1) - 1 (Toth and Guehne, PRL 94,
+060501).
+
+Exact evaluation (stabilizer backend). `tableau_verification` reads the generator values
+and the exact fidelity of each run's final state straight from the tableau; averaging
+over runs gives the fidelity of the noisy state. `tableau_graph_verification` does the same
+for the arbitrary graph states of planned graph requests (see planner.py).
+
+All evaluation is vectorized over the runs of a batch, with qubit 0 of every array being
+the center and the leaves following in integration order.
+
+Usage::
+
+    python verification.py results.jsonl --min-fidelity 0.9
+
+summarizes every request in a batch results file (see `batch_runner.py`) and exits with
+status 1 if a request falls below the threshold.
+"""
+import argparse
+import json
+import sys
+from collections import defaultdict
+
+import numpy as np
+
+# Measurement settings
+CENTER_X = 0   # center in X, leaves in Z: measures K_c
+LEAVES_X = 1   # center in Z, leaves in X: measures every K_l
+
+
+def measurement_basis(setting, is_center):
+    """
+    Local measurement basis ("X" or "Z") of a star qubit under the given setting.
+    """
+    return "X" if (setting == CENTER_X) == is_center else "Z"
+
+
+def generator_values(settings, outcomes):
+    """
+    Generator eigenvalues observed in every run.
+
+    :param settings: Array (runs,) of measurement settings.
+    :param outcomes: Array (runs, 1 + leaves) of 0/1 outcomes, center first.
+    :return: Float array (runs, 1 + leaves) with +1/-1 for the generators measured in a run
+        (K_c in column 0, K_l in the leaf columns) and NaN for the others.
+    """
+    settings = np.asarray(settings)
+    outcomes = np.asarray(outcomes, dtype=np.int8)
+    values = np.full(outcomes.shape, np.nan)
+    center_runs = settings == CENTER_X
+    leaf_runs = settings == LEAVES_X
+    values[center_runs, 0] = 1 - 2 * np.bitwise_xor.reduce(outcomes[center_runs], axis=1)
+    values[leaf_runs, 1:] = 1 - 2 * (outcomes[leaf_runs, 1:] ^ outcomes[leaf_runs, :1])
+    return values
+
+
+def estimate(settings, outcomes):
+    """
+    Estimate generator expectations and a fidelity lower bound from a batch of measured runs.
+
+    :param settings: Array (runs,) of measurement settings.
+    :param outcomes: Array (runs, 1 + leaves) of 0/1 outcomes, center first.
+    :return: Dictionary with "expectations" and "stderr" per generator, "fidelity_bound"
+        and the number of runs per setting. Quantities without runs are NaN.
+    """
+    values = generator_values(settings, outcomes)
+    counts = np.sum(~np.isnan(values), axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        expectations = np.nansum(values, axis=0) / counts
+        stderr = np.sqrt(np.maximum(0, 1 - expectations ** 2) / counts)
+    center_runs = values[:, 0][~np.isnan(values[:, 0])]
+    leaf_runs = values[np.asarray(settings) == LEAVES_X, 1:]
+    p_center = np.mean(center_runs == 1) if len(center_runs) else np.nan
+    p_leaves = np.mean(np.all(leaf_runs == 1, axis=1)) if len(leaf_runs) else np.nan
+    return {
+        "expectations": expectations,
+        "stderr": stderr,
+        "fidelity_bound": float(max(0., p_center + p_leaves - 1)) if len(center_runs) and len(leaf_runs) else np.nan,
+        "runs": {"center_x": len(center_runs), "leaves_x": len(leaf_runs)},
+    }
+
+
+# ----------------------------------------------------------------------
+# Exact evaluation on a stabilizer tableau
+# ----------------------------------------------------------------------
+def star_generators(center, leaves):
+    """
+    Star graph stabilizer generators as Pauli dictionaries over the given qubit indices.
+    """
+    generators = [{center: "X", **{leaf: "Z" for leaf in leaves}}]
+    generators += [{center: "Z", leaf: "X"} for leaf in leaves]
+    return generators
+
+
+def _products(center, leaves, selection):
+    """
+    Pauli dictionaries and signs of the products of star generators selected by the rows of
+    the boolean array `selection` (products, 1 + leaves).
+    """
+    paulis, signs = [], []
+    for row in selection:
+        a_c, a_l = bool(row[0]), row[1:]
+        weight = int(a_l.sum())
+        # Center carries X^{a_c} Z^{weight}; each selected leaf Z^{a_c} X. XZ = -iY and ZX = iY
+        center_label = {(1, 0): "X", (0, 1): "Z", (1, 1): "Y"}.get((int(a_c), weight % 2))
+        product = {center: center_label} if center_label else {}
+        for leaf, x_bit in zip(leaves, a_l):
+            label = {(1, 0): "X", (0, 1): "Z", (1, 1): "Y"}.get((int(x_bit), int(a_c)))
+            if label:
+                product[leaf] = label
+        exponent = (3 * (weight % 2) + weight) * a_c % 4
+        paulis.append(product)
+        signs.append(1 if exponent == 0 else -1)
+    return paulis, np.array(signs, dtype=np.int8)
+
+
+def _nullspace_gf2(matrix):
+    """
+    Basis (rows) of the null space of a boolean matrix over GF(2).
+    """
+    m = np.array(matrix, dtype=bool)
+    rows, cols = m.shape
+    pivots = []
+    r = 0
+    for c in range(cols):
+        if r == rows:
+            break
+        hits = np.flatnonzero(m[r:, c])
+        if not len(hits):
+            continue
+        p = r + hits[0]
+        m[[r, p]] = m[[p, r]]
+        others = np.flatnonzero(m[:, c])
+        m[others[others != r]] ^= m[r]
+        pivots.append(c)
+        r += 1
+    free = [c for c in range(cols) if c not in pivots]
+    basis = np.zeros((len(free), cols), dtype=bool)
+    for k, f in enumerate(free):
+        basis[k, f] = True
+        basis[k, pivots] = m[:len(pivots), f]
+    return basis
+
+
+def tableau_verification(tableau, center, leaves):
+    """
+    Exact generator values and fidelity of the star qubits of a stabilizer-backend run.
+
+    The fidelity of a stabilizer state with the star graph state is the average of the
+    expectation values over the 2^n elements of the star's stabilizer group. Elements with a
+    nonzero expectation form the subgroup commuting with the state's stabilizers, found as
+    a null space over GF(2); the fidelity is its size over 2^n if all of them have
+    expectation +1, and 0 otherwise.
+
+    :param tableau: `stabilizer.StabilizerTableau` holding the final state.
+    :param center: Tableau index of the center qubit.
+    :param leaves: Tableau indices of the leaf qubits.
+    :return: Tuple (int8 array of generator values, center first, fidelity).
+    """
+    x, z = tableau.pauli_words(star_generators(center, leaves))
+    values = tableau.expectations(x, z)
+    if np.all(values == 1):
+        return values, 1.
+
+    num_qubits = 1 + len(leaves)
+    kernel = _nullspace_gf2(tableau.anticommutes(x, z).T)
+    paulis, signs = _products(center, leaves, kernel)
+    kx, kz = tableau.pauli_words(paulis)
+    if np.any(tableau.expectations(kx, kz) * signs != 1):
+        return values, 0.
+    return values, 2. ** (len(kernel) - num_qubits)
+
+
+def graph_generators(vertices, edges):
+    """
+    Graph state stabilizer generators K_v = X_v prod_{u in N(v)} Z_u as Pauli dictionaries
+    over the given qubit indices, one per vertex.
+    """
+    neighbors = {v: [] for v in vertices}
+    for a, b in edges:
+        neighbors[a].append(b)
+        neighbors[b].append(a)
+    return [{v: "X", **{u: "Z" for u in neighbors[v]}} for v in vertices]
+
+
+def _pauli_products(generators, selection):
+    """
+    Pauli dictionaries and signs of the products of the Pauli dictionaries `generators`
+    selected by the rows of the boolean array `selection`, multiplied in order.
+    """
+    paulis, signs = [], []
+    for row in selection:
+        # Product so far: i^exponent prod_q X_q^x[q] Z_q^z[q]
+        x, z, exponent = {}, {}, 0
+        for generator, selected in zip(generators, row):
+            if not selected:
+                continue
+            for q, label in generator.items():
+                gx, gz = int(label in "XY"), int(label in "ZY")
+                # Y = iXZ, and moving X past the accumulated Z gives ZX = -XZ
+                exponent += (label == "Y") + 2 * (z.get(q, 0) & gx)
+                x[q] = x.get(q, 0) ^ gx
+                z[q] = z.get(q, 0) ^ gz
+        product = {}
+        for q in x:
+            if x[q] and z[q]:
+                product[q] = "Y"
+                exponent -= 1
+            elif x[q] or z[q]:
+                product[q] = "X" if x[q] else "Z"
+        paulis.append(product)
+        signs.append(1 if exponent % 4 == 0 else -1)
+    return paulis, np.array(signs, dtype=np.int8)
+
+
+def tableau_graph_verification(tableau, qubits, edges):
+    """
+    Exact generator values and fidelity of an arbitrary graph state on a stabilizer tableau,
+    computed as in `tableau_verification`.
+
+    :param tableau: `stabilizer.StabilizerTableau` holding the final state.
+    :param qubits: Dictionary vertex -> tableau index of its qubit.
+    :param edges: Edges (a, b) of the requested graph, over the vertices of `qubits`.
+    :return: Tuple (int8 array of generator values, in the order of `qubits`, fidelity).
+    """
+    generators = graph_generators(list(qubits.values()), [(qubits[a], qubits[b]) for a, b in edges])
+    x, z = tableau.pauli_words(generators)
+    values = tableau.expectations(x, z)
+    if np.all(values == 1):
+        return values, 1.
+
+    kernel = _nullspace_gf2(tableau.anticommutes(x, z).T)
+    paulis, signs = _pauli_products(generators, kernel)
+    kx, kz = tableau.pauli_words(paulis)
+    if np.any(tableau.expectations(kx, kz) * signs != 1):
+        return values, 0.
+    return values, 2. ** (len(kernel) - len(qubits))
+
+
+def star_qubits(programs, center, leaves):
+    """
+    Qubit handles holding the star on each node after `GraphStateDistribution` finished, center first.
+    """
+    return [programs[center].center_qubit] + [programs[leaf].epr_qubit_0 for leaf in leaves]
+
+
+# ----------------------------------------------------------------------
+# Batch results
+# ----------------------------------------------------------------------
+def summarize(records):
+    """
+    Verification summary of the run records of one request.
+
+    :param records: Run records (dictionaries as written by `StarRequestRunner.run_requests`)
+        that carry either exact "generator_values" and "fidelity" or "verify_setting" and
+        "verify_outcomes".
+    :return: Dictionary with "runs", "expectations" and "fidelity" (exact mean) or
+        "fidelity_bound" (from local measurements).
+    """
+    exact = [record for record in records if record.get("generator_values") is not None]
+    measured = [record for record in records if record.get("verify_outcomes") is not None]
+    summary = {"runs": len(exact) + len(measured)}
+    if exact:
+        values = np.array([record["generator_values"] for record in exact], dtype=np.int8)
+        summary["expectations"] = values.mean(axis=0)
+        summary["fidelity"] = float(np.mean([record["fidelity"] for record in exact]))
+    if measured:
+        result = estimate([record["verify_setting"] for record in measured],
+                          [record["verify_outcomes"] for record in measured])
+        summary.setdefault("expectations", result["expectations"])
+        summary["fidelity_bound"] = result["fidelity_bound"]
+        summary["runs_per_setting"] = result["runs"]
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize the star state verification of batch results.")
+    parser.add_argument("results", help="JSONL results file written with verification enabled.")
+    parser.add_argument("--min-fidelity", type=float, default=None,
+                        help="Exit with status 1 if a request's fidelity (or fidelity bound) is below this value.")
+    args = parser.parse_args()
+
+    groups = defaultdict(list)
+    with open(args.results, 'r') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                if "event" in record or "error" in record:
+                    continue
+                if "edges" in record:
+                    request = f"graph of {len(record['edges'])} edges"
+                    key = tuple(map(tuple, record["edges"]))
+                else:
+                    request = f"{record['center']} -> {len(record['leaves'])} leaves"
+                    key = (record["center"], tuple(record["leaves"]))
+                groups[(record.get("config_hash"), request, key)].append(record)
+
+    failed = False
+    for (_, request, _), records in groups.items():
+        summary = summarize(records)
+        fidelity = summary.get("fidelity", summary.get("fidelity_bound", np.nan))
+        label = "fidelity" if "fidelity" in summary else "fidelity >="
+        expectations = summary.get("expectations")
+        expectations = " ".join(f"{value:+.2f}" for value in expectations) if expectations is not None else "-"
+        print(f"{request}, {summary['runs']} runs: {label} {fidelity:.3f}  <K> = {expectations}")
+        if args.min_fidelity is not None and not fidelity >= args.min_fidelity:
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
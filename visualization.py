@@ -0,0 +1,431 @@
+"""
+Drawing of network topologies and of graph states overlaid on them.
+
+Node positions are computed once per topology and layout by `layout_positions` and cached
+on disk under ``.layout_cache/``, keyed by a hash of the topology, so repeated drawings
+and overlays of the same network reuse them. For large networks the ``'spectral'``
+layout is much faster than the spring layouts.
+
+Usage::
+
+    python visualization.py network_configs/largesmallworld_config_noisy.yaml requests.jsonl --output-dir figures
+
+renders the star of every request in a JSONL requests file (see batch_runner.py) over the
+network to one image file each, without a display.
+"""
+import argparse
+import hashlib
+import json
+import os
+
+import networkx as nx
+import numpy as np
+import matplotlib.pyplot as plt
+
+LAYOUT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".layout_cache")
+
+
+def _node_key(node):
+    """
+    String key of a node label that tells labels of different types apart (1 and "1").
+    """
+    return f"{type(node).__name__}:{node!r}"
+
+
+def topology_hash(G):
+    """
+    Hash of the nodes and edges of a graph, independent of their order and attributes.
+    """
+    edges = sorted(tuple(sorted((_node_key(u), _node_key(v)))) for u, v in G.edges())
+    content = json.dumps([sorted(_node_key(node) for node in G.nodes()), edges])
+    return hashlib.sha1(content.encode()).hexdigest()[:16]
+
+
+def spectral_layout(G, iterations=300, seed=0):
+    """
+    Spectral layout from the two leading nontrivial eigenvectors of the normalized adjacency
+    matrix, found by orthogonal (power) iteration over the edge list.
+
+    Every iteration costs O(edges), so this scales to networks of tens of thousands of nodes,
+    where networkx's spring and spectral layouts take minutes or need scipy. With few
+    iterations on a poorly connected network the eigenvectors are only approximate, which
+    still yields a smooth layout.
+    """
+    nodes = list(G.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    n = len(nodes)
+    if n < 3:
+        return {node: np.array([float(i), 0.]) for i, node in enumerate(nodes)}
+    u = np.array([index[a] for a, _ in G.edges()], dtype=np.int64)
+    v = np.array([index[b] for _, b in G.edges()], dtype=np.int64)
+    degree = np.maximum(np.bincount(u, minlength=n) + np.bincount(v, minlength=n), 1).astype(float)
+    scale = 1 / np.sqrt(degree)
+    trivial = np.sqrt(degree) / np.linalg.norm(np.sqrt(degree))
+
+    Y = np.random.default_rng(seed).standard_normal((n, 2))
+    for _ in range(iterations):
+        # Y <- (I + D^-1/2 A D^-1/2) Y / 2, which has the same eigenvectors with eigenvalues in [0, 1]
+        Z = Y * scale[:, None]
+        AZ = np.stack([np.bincount(u, weights=Z[v, k], minlength=n) + np.bincount(v, weights=Z[u, k], minlength=n)
+                       for k in range(2)], axis=1)
+        Y = (Y + AZ * scale[:, None]) / 2
+        Y -= np.outer(trivial, trivial @ Y)
+        Y, _ = np.linalg.qr(Y)
+    positions = Y * scale[:, None]
+    positions -= positions.mean(axis=0)
+    positions /= np.abs(positions).max()
+    return {node: positions[i] for i, node in enumerate(nodes)}
+
+
+def _compute_layout(G, layout, seed):
+    if layout == 'spring':
+        return nx.spring_layout(G, seed=seed)
+    elif layout == 'circular':
+        return nx.circular_layout(G)
+    elif layout == 'shell':
+        return nx.shell_layout(G)
+    elif layout == 'kamada_kawai':
+        return nx.kamada_kawai_layout(G)
+    elif layout == 'spectral':
+        return spectral_layout(G, seed=0 if seed is None else seed)
+    else:
+        return nx.random_layout(G, seed=seed)
+
+
+def layout_positions(G, layout='spring', seed=None, cache_dir=LAYOUT_CACHE_DIR):
+    """
+    Node positions of a graph, computed once per topology and layout and cached on disk.
+
+    Parameters
+    ----------
+    G : networkx.Graph
+        The graph to lay out.
+    layout : str, optional
+        Options: 'spring', 'circular', 'shell', 'random', 'kamada_kawai', 'spectral'.
+    seed : int, optional
+        Seed of the randomized layouts. Part of the cache key.
+    cache_dir : str or None, optional
+        Directory of the layout cache. If None, the layout is always recomputed.
+
+    Returns
+    -------
+    dict
+        Maps every node to its (x, y) position.
+    """
+    if cache_dir is None:
+        return _compute_layout(G, layout, seed)
+    filename = os.path.join(cache_dir, f"{topology_hash(G)}_{layout}_{seed}.npz")
+    # Positions are stored in the order of the node keys and mapped back to the graph's own labels
+    nodes = sorted(G.nodes(), key=_node_key)
+    keys = [_node_key(node) for node in nodes]
+    if os.path.exists(filename):
+        cached = np.load(filename)
+        if cached['nodes'].tolist() == keys:
+            return dict(zip(nodes, cached['positions']))
+    pos = _compute_layout(G, layout, seed)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temporary name first, so concurrent drawings never read a partial file
+    temporary = f"{filename}.{os.getpid()}.npz"
+    np.savez(temporary, nodes=np.array(keys), positions=np.array([pos[node] for node in nodes]))
+    os.replace(temporary, filename)
+    return {node: np.asarray(pos[node]) for node in nodes}
+
+
+def visualize_graph(G, show_node_labels=True, show_edge_labels=False, node_size = 500, font_size = 8, layout='spring', node_color='lightblue', seed=None):
+    """
+    Visualize a NetworkX graph using matplotlib.
+
+    Parameters
+    ----------
+    G : networkx.Graph
+        The graph to visualize.
+    show_node_labels : bool, optional
+        If True, node labels from G nodes will be displayed.
+    show_edge_labels : bool, optional
+        If True, edge labels (if any) will be displayed.
+    layout : str, optional
+        The layout method to use for positioning the nodes. 
+        Options: 'spring', 'circular', 'shell', 'random', 'kamada_kawai', 'spectral'.
+        Positions are cached per topology (see `layout_positions`).
+    node_color : str or list, optional
+        Matplotlib color string or list of colors for nodes.
+    seed : int, optional
+        Seed of the randomized layouts.
+
+    """
+    pos = layout_positions(G, layout=layout, seed=seed)
+
+    # Draw the graph
+    nx.draw(G, pos, with_labels=False, node_color=node_color, edge_color='gray', node_size=node_size,font_size=font_size)
+
+    if show_node_labels:
+        # Draw node labels (just the node names by default)
+        labels = {n: n for n in G.nodes()}
+        nx.draw_networkx_labels(G, pos, labels, font_size=font_size)
+
+    if show_edge_labels:
+        # If the graph has attributes for edges, you might select one attribute to display.
+        # By default, let's show the 'weight' if it exists, or 'typ' if no weight.
+        if all('weight' in data for _,_,data in G.edges(data=True)):
+            edge_labels = {(u,v): f"{data.get('weight')}" for u,v,data in G.edges(data=True)}
+        else:
+            # Fall back to showing 'typ' if weight isn't present
+            edge_labels = {(u,v): f"{data.get('typ', '')}" for u,v,data in G.edges(data=True)}
+        
+        nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, font_size=font_size, rotate=False)
+
+    plt.axis('off')
+    plt.show()
+    
+def overlay_positions(G_main, G_overlay, layout='spring', seed=None):
+    """
+    Positions for drawing `G_overlay` over `G_main`: the cached layout of the main graph,
+    plus spring-layout positions for overlay nodes that are not in the main graph (computed
+    with the main nodes frozen, so they never move).
+    """
+    pos = layout_positions(G_main, layout=layout, seed=seed)
+    new_nodes = set(G_overlay.nodes()) - set(G_main.nodes())
+    if new_nodes:
+        # Overlay edges do not take part in the layout
+        combined_graph = nx.Graph()
+        combined_graph.add_nodes_from(G_main.nodes())
+        combined_graph.add_edges_from(G_main.edges())
+        combined_graph.add_nodes_from(new_nodes)
+        pos = nx.spring_layout(combined_graph, pos=pos, fixed=list(G_main.nodes()), seed=seed)
+    return pos
+
+
+def visualize_graph_with_overlay(
+    G_main,
+    G_overlay,
+    node_size=500,
+    main_node_color='lightblue',
+    overlay_node_color='salmon',
+    main_edge_color='gray',
+    overlay_edge_color='red',
+    show_node_labels=True,
+    show_edge_labels=False,
+    font_size=8,
+    edge_font_size=8,
+    layout='spring',
+    seed=None):
+    
+    pos = overlay_positions(G_main, G_overlay, layout=layout, seed=seed)
+
+    # --- Draw the main graph ---
+    nx.draw(
+        G_main,
+        pos,
+        with_labels=False,
+        node_color=main_node_color,
+        edge_color=main_edge_color,
+        node_size=node_size
+    )
+
+    # Optionally label main nodes
+    if show_node_labels:
+        labels_main = {n: str(n) for n in G_main.nodes()}
+        nx.draw_networkx_labels(G_main, pos, labels=labels_main, font_size=font_size)
+
+    # Optionally label main edges
+    if show_edge_labels:
+        if all('weight' in data for _, _, data in G_main.edges(data=True)):
+            edge_labels_main = {(u, v): data['weight'] 
+                                for u, v, data in G_main.edges(data=True)}
+        else:
+            edge_labels_main = {(u, v): data.get('typ', '') 
+                                for u, v, data in G_main.edges(data=True)}
+        nx.draw_networkx_edge_labels(G_main, pos, edge_labels=edge_labels_main,
+                                     font_size=edge_font_size)
+
+    # --- Draw the overlay graph ---
+    # Now we do draw the edges from G_overlay, but they did NOT affect the layout.
+    nx.draw(
+        G_overlay,
+        pos,
+        with_labels=False,
+        node_color=overlay_node_color,
+        edge_color=overlay_edge_color,
+        node_size=node_size
+    )
+    
+    # Optionally label overlay nodes
+    if show_node_labels:
+        labels_overlay = {n: str(n) for n in G_overlay.nodes()}
+        nx.draw_networkx_labels(G_overlay, pos, labels=labels_overlay, font_size=font_size)
+
+    # Optionally label overlay edges
+    if show_edge_labels:
+        if all('weight' in data for _, _, data in G_overlay.edges(data=True)):
+            edge_labels_overlay = {(u, v): data['weight']
+                                   for u, v, data in G_overlay.edges(data=True)}
+        else:
+            edge_labels_overlay = {(u, v): data.get('typ', '')
+                                   for u, v, data in G_overlay.edges(data=True)}
+        nx.draw_networkx_edge_labels(G_overlay, pos, edge_labels=edge_labels_overlay,
+                                     font_size=edge_font_size)
+
+    plt.axis('off')
+    plt.show()
+
+
+def render_overlays(G_main, overlays, output_dir, fmt='png', layout='spring', seed=None, node_size=30,
+                    main_node_color='lightblue', overlay_node_color='salmon', main_edge_color='gray',
+                    overlay_edge_color='red', show_node_labels=False, font_size=8, figsize=(8, 8), dpi=100):
+    """
+    Render many overlays over the same network to image files, without a display.
+
+    The main graph is laid out and drawn only once on an Agg canvas; for every overlay its
+    artists are added, the figure is saved and the artists are removed again.
+
+    Parameters
+    ----------
+    G_main : networkx.Graph
+        The network.
+    overlays : dict
+        Maps an output file name (without extension) to the graph drawn over the network.
+    output_dir : str
+        Directory the images are written to.
+    fmt : str, optional
+        Image format, e.g. 'png' or 'svg'.
+
+    Returns
+    -------
+    list
+        Paths of the written files.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    os.makedirs(output_dir, exist_ok=True)
+    pos = layout_positions(G_main, layout=layout, seed=seed)
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.axis('off')
+    nx.draw_networkx_edges(G_main, pos, ax=ax, edge_color=main_edge_color, node_size=node_size)
+    nx.draw_networkx_nodes(G_main, pos, ax=ax, node_color=main_node_color, node_size=node_size)
+    if show_node_labels:
+        nx.draw_networkx_labels(G_main, pos, ax=ax, font_size=font_size)
+
+    written = []
+    for name, G_overlay in overlays.items():
+        overlay_pos = pos if set(G_overlay.nodes()) <= set(pos) else overlay_positions(G_main, G_overlay, layout, seed)
+        artists = [
+            nx.draw_networkx_edges(G_overlay, overlay_pos, ax=ax, edge_color=overlay_edge_color, node_size=node_size),
+            nx.draw_networkx_nodes(G_overlay, overlay_pos, ax=ax, node_color=overlay_node_color, node_size=node_size),
+        ]
+        if show_node_labels:
+            artists += list(nx.draw_networkx_labels(G_overlay, overlay_pos, ax=ax, font_size=font_size).values())
+        filename = os.path.join(output_dir, f"{name}.{fmt}")
+        fig.savefig(filename)
+        written.append(filename)
+        for artist in artists:
+            for item in (artist if isinstance(artist, list) else [artist]):
+                item.remove()
+    return written
+
+
+def load_heatmap(G, node_values=None, link_values=None, filename=None, layout='spring', seed=None, node_size=30,
+                 cmap='inferno_r', show_node_labels=False, font_size=8, title=None, figsize=(9, 8), dpi=100):
+    """
+    Draw per-node and per-link values, e.g. resource load, as a heatmap over the network.
+
+    Nodes and links are colored by their value on a shared scale per kind; links with a
+    value are also drawn wider, in proportion to it. Nodes and links without a value are
+    drawn in light gray.
+
+    Parameters
+    ----------
+    G : networkx.Graph
+        The network.
+    node_values : dict, optional
+        Maps nodes to values.
+    link_values : dict, optional
+        Maps (a, b) links (tuples or frozensets) to values.
+    filename : str, optional
+        If given, the figure is saved to this file without a display.
+    title : str, optional
+        Title of the figure.
+
+    Returns
+    -------
+    matplotlib.figure.Figure
+        The figure.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.colors import Normalize
+    from matplotlib.figure import Figure
+
+    node_values = node_values or {}
+    link_values = {tuple(link): value for link, value in (link_values or {}).items()}
+    pos = layout_positions(G, layout=layout, seed=seed)
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.axis('off')
+    if title is not None:
+        ax.set_title(title)
+
+    idle_edges = [(u, v) for u, v in G.edges() if (u, v) not in link_values and (v, u) not in link_values]
+    nx.draw_networkx_edges(G, pos, ax=ax, edgelist=idle_edges, edge_color='lightgray', node_size=node_size)
+    if link_values:
+        edges = sorted(link_values, key=link_values.get)
+        values = np.array([link_values[edge] for edge in edges], dtype=float)
+        norm = Normalize(vmin=0, vmax=max(values.max(), 1e-12))
+        nx.draw_networkx_edges(G, pos, ax=ax, edgelist=edges, edge_color=values, edge_cmap=plt.get_cmap(cmap),
+                               edge_vmin=norm.vmin, edge_vmax=norm.vmax, width=1 + 4 * norm(values),
+                               node_size=node_size)
+        fig.colorbar(plt.cm.ScalarMappable(norm=norm, cmap=cmap), ax=ax, shrink=0.6, label='link load')
+
+    idle_nodes = [node for node in G.nodes() if node not in node_values]
+    nx.draw_networkx_nodes(G, pos, ax=ax, nodelist=idle_nodes, node_color='lightgray', node_size=node_size)
+    if node_values:
+        nodes = sorted(node_values, key=node_values.get)
+        values = np.array([node_values[node] for node in nodes], dtype=float)
+        norm = Normalize(vmin=0, vmax=max(values.max(), 1e-12))
+        nx.draw_networkx_nodes(G, pos, ax=ax, nodelist=nodes, node_color=values, cmap=cmap,
+                               vmin=norm.vmin, vmax=norm.vmax, node_size=node_size)
+        fig.colorbar(plt.cm.ScalarMappable(norm=norm, cmap=cmap), ax=ax, shrink=0.6, label='node load')
+    if show_node_labels:
+        nx.draw_networkx_labels(G, pos, ax=ax, font_size=font_size)
+
+    if filename is not None:
+        fig.savefig(filename)
+    return fig
+
+
+def star_overlay(center, leaves):
+    """
+    Star graph of a request, for drawing over the network.
+    """
+    return nx.star_graph([center] + list(leaves))
+
+
+def main():
+    from yaml_to_nx import yaml_to_nx
+
+    parser = argparse.ArgumentParser(description="Render the star of every request over the network to image files.")
+    parser.add_argument("config", help="YAML network configuration.")
+    parser.add_argument("requests", help="JSONL file with one request per line (see batch_runner.py).")
+    parser.add_argument("--output-dir", default="figures")
+    parser.add_argument("--format", default="png")
+    parser.add_argument("--layout", default="spring", help="Layout method; 'spectral' is fastest for large networks.")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--labels", action="store_true", help="Draw node labels.")
+    args = parser.parse_args()
+
+    G = yaml_to_nx(args.config)
+    overlays = {}
+    with open(args.requests, 'r') as f:
+        for number, line in enumerate(f):
+            if line.strip():
+                request = json.loads(line)
+                overlays[str(request.get("id", number))] = star_overlay(request["center"], request["leaves"])
+    written = render_overlays(G, overlays, args.output_dir, fmt=args.format, layout=args.layout, seed=args.seed,
+                              show_node_labels=args.labels)
+    print(f"Wrote {len(written)} images to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
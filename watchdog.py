@@ -0,0 +1,337 @@
+"""
+Stall and deadlock detection for the node programs.
+
+The node programs block on `recv()` of a classical socket, or on `connection.flush()` while
+their EPR requests wait for the peer's matching request. When a protocol goes wrong (two
+nodes disagreeing on the order of messages or on who is on a path), every node ends up
+blocked: the simulation then ends with unfinished programs, or keeps generating events
+without the programs making progress.
+
+A `Watchdog` wraps the programs of a run (like profiling.py, through instance attributes)
+and records for every node what it is waiting on: the socket's peer and the program call
+site of a `recv()`, or the EPR peers of a `flush()`, since which simulated time. The waits
+form a wait-for graph (node -> peers it waits on), whose cycles are deadlocks. The run is
+aborted with `SimulationStalled` as soon as
+
+- a node has waited longer than `wait_budget` ns, or the simulated time passed
+  `max_sim_time` ns, or
+- the simulation ended with programs that did not return (`check`).
+
+The budgets are checked whenever a program resumes and, with a `timer` (`FastTimer` or
+`NetSquidTimer`), by a simulator event at the end of every wait's budget, so a run whose
+blocked programs never resume is aborted although the simulator keeps generating events.
+
+The exception carries the waits, the cycles of the wait-for graph and the nodes that are
+waited on after their program returned. Example::
+
+    watchdog = Watchdog(wait_budget=1e9)
+    runner = StarRequestRunner(config_file, watchdog=watchdog)
+    runner.run_requests(requests, "results.jsonl")   # stalled requests get an "error" record
+"""
+import inspect
+import sys
+
+import networkx as nx
+
+from yaml_to_nx import node_order
+
+
+class SimulationStalled(RuntimeError):
+    """
+    A run was aborted because its node programs stopped making progress.
+
+    :param reason: Why the run was aborted.
+    :param sim_time: Simulated time (ns) of the abort.
+    :param waits: Dictionary node -> wait (see `Watchdog.waits`) of every blocked node.
+    :param cycles: Cycles of the wait-for graph, as lists of nodes.
+    :param returned: Nodes that are waited on although their program has returned.
+    """
+
+    def __init__(self, reason, sim_time, waits, cycles, returned=()):
+        self.reason = reason
+        self.sim_time = sim_time
+        self.waits = waits
+        self.cycles = cycles
+        self.returned = list(returned)
+        lines = [f"{reason} (at {sim_time:.6g} ns)"]
+        for node, wait in waits.items():
+            peers = ", ".join(wait["peers"]) or "local operations"
+            lines.append(f"  {node} waits since {wait['since']:.6g} ns on {wait['op']} from {peers} ({wait['site']})")
+        for cycle in cycles:
+            lines.append(f"  deadlock: {' -> '.join(cycle + cycle[:1])}")
+        for node in self.returned:
+            waiting = ", ".join(other for other, wait in waits.items() if node in wait["peers"])
+            lines.append(f"  {node} has returned but {waiting} wait on it")
+        super().__init__("\n".join(lines))
+
+    def to_dict(self):
+        return {"reason": self.reason, "sim_time": self.sim_time, "waits": self.waits, "cycles": self.cycles,
+                "returned": self.returned}
+
+
+class Watchdog:
+    """
+    Wait-state tracking of the node programs, aborting runs that stall.
+
+    :param wait_budget: Longest simulated time (ns) a node may wait on one operation, or None.
+    :param max_sim_time: Longest simulated time (ns) of a run, or None.
+    :param max_cycles: Maximum number of wait-for cycles reported.
+    :param timer: `FastTimer` or `NetSquidTimer` scheduling the budget checks in the simulator,
+        or None to check only when a program resumes. `batch_runner.StarRequestRunner` sets it
+        for its backend.
+    """
+
+    def __init__(self, wait_budget=None, max_sim_time=None, max_cycles=10, timer=None):
+        self.wait_budget = wait_budget
+        self.max_sim_time = max_sim_time
+        self.max_cycles = max_cycles
+        self.timer = timer
+        self.programs = {}
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the state of the previous run.
+        """
+        self.waits = {}
+        self.finished = set()
+        self._pending_epr = {}
+        self._deadline = None
+        self._started = False
+        if self.timer is not None:
+            self.timer.reset()
+
+    def watch(self, program):
+        """
+        Wrap the `run` method of one program instance. Watching a program twice has no effect.
+
+        :param program: `GraphStateDistribution` instance (or any program with a `node_name`
+            and a `sim_time()` method).
+        :return: The program.
+        """
+        if getattr(program, "watchdog", None) is not None:
+            return program
+        node = program.node_name
+        self.programs[node] = program
+        filename = inspect.getfile(type(program))
+        program.run = self._watched_run(program.run, node, program, filename)
+        program.watchdog = self
+        return program
+
+    # ------------------------------------------------------------------
+    # Wrappers
+    # ------------------------------------------------------------------
+    def _watched_run(self, run, node, program, filename):
+        def watched_run(context):
+            self._attach(context, node, program, filename)
+            if not self._started:
+                self._started = True
+                if self.timer is not None and self.max_sim_time is not None:
+                    self.timer.schedule(self.max_sim_time, self._expire_run)
+            generator = run(context)
+            value, error = None, None
+            while True:
+                try:
+                    item = generator.send(value) if error is None else generator.throw(error)
+                except StopIteration as stop:
+                    self.finished.add(node)
+                    self.waits.pop(node, None)
+                    if self.timer is not None and not self.blocked():
+                        # Pending budget checks must not keep the simulation going
+                        self.timer.finish()
+                    return stop.value
+                self.poll(program.sim_time())
+                try:
+                    value, error = (yield item), None
+                except GeneratorExit:
+                    generator.close()
+                    raise
+                except BaseException as e:
+                    value, error = None, e
+        return watched_run
+
+    def _attach(self, context, node, program, filename):
+        for peer, socket in context.csockets.items():
+            socket.recv = self._watched_recv(socket.recv, node, peer, program, filename)
+        for peer, socket in context.epr_sockets.items():
+            socket.create_keep = self._watched_epr(socket.create_keep, node, peer)
+            socket.recv_keep = self._watched_epr(socket.recv_keep, node, peer)
+        context.connection.flush = self._watched_flush(context.connection.flush, node, program, filename)
+
+    def _watched_recv(self, recv, node, peer, program, filename):
+        def watched_recv(*args, **kwargs):
+            self._wait(node, "recv", [peer], program.sim_time(), _call_site(filename))
+            message = yield from recv(*args, **kwargs)
+            self.waits.pop(node, None)
+            return message
+        return watched_recv
+
+    def _watched_epr(self, request, node, peer):
+        def watched_request(*args, **kwargs):
+            self._pending_epr.setdefault(node, []).append(peer)
+            return request(*args, **kwargs)
+        return watched_request
+
+    def _watched_flush(self, flush, node, program, filename):
+        def watched_flush(*args, **kwargs):
+            peers = self._pending_epr.pop(node, [])
+            self._wait(node, "epr" if peers else "flush", sorted(set(peers)), program.sim_time(),
+                       _call_site(filename))
+            result = yield from flush(*args, **kwargs)
+            self.waits.pop(node, None)
+            return result
+        return watched_flush
+
+    def _wait(self, node, op, peers, since, site):
+        wait = self.waits[node] = {"op": op, "peers": peers, "since": since, "site": site}
+        if self.wait_budget is not None:
+            if self._deadline is None:
+                self._deadline = since + self.wait_budget
+            if self.timer is not None:
+                self.timer.schedule(since + self.wait_budget, lambda: self._expire_wait(node, wait))
+
+    def _expire_wait(self, node, wait):
+        # Timer at the end of a wait's budget; the wait may be over already
+        if self.waits.get(node) is wait:
+            raise self.stalled(f"{node} waited longer than the budget of {self.wait_budget:.6g} ns "
+                               f"on {wait['op']}", wait["since"] + self.wait_budget)
+
+    def _expire_run(self):
+        if self.blocked():
+            raise self.stalled(f"Simulated time exceeded the budget of {self.max_sim_time:.6g} ns",
+                               self.max_sim_time)
+
+    # ------------------------------------------------------------------
+    # Checks
+    # ------------------------------------------------------------------
+    def poll(self, now):
+        """
+        Raise `SimulationStalled` if a budget is exceeded at simulated time `now`.
+        """
+        if self.max_sim_time is not None and now > self.max_sim_time:
+            raise self.stalled(f"Simulated time exceeded the budget of {self.max_sim_time:.6g} ns", now)
+        if self._deadline is None or now <= self._deadline:
+            return
+        # The cached deadline belongs to the oldest wait seen; that wait may be over
+        oldest = min(self.waits.items(), key=lambda item: item[1]["since"], default=None)
+        if oldest is None:
+            self._deadline = None
+            return
+        node, wait = oldest
+        self._deadline = wait["since"] + self.wait_budget
+        if now > self._deadline:
+            raise self.stalled(f"{node} waited longer than the budget of {self.wait_budget:.6g} ns "
+                               f"on {wait['op']}", now)
+
+    def blocked(self):
+        """
+        Nodes whose program has not returned.
+        """
+        return [node for node in self.programs if node not in self.finished]
+
+    def check(self, now=None):
+        """
+        Raise `SimulationStalled` if the simulation ended with unfinished programs.
+
+        :param now: Simulated time of the end; by default the clock of the watched programs.
+        """
+        if self.blocked():
+            if now is None:
+                now = max(program.sim_time() for program in self.programs.values())
+            raise self.stalled("Simulation ended with blocked node programs", now)
+
+    def wait_for_graph(self):
+        """
+        Directed graph with an edge from every waiting node to each peer it waits on.
+        """
+        G = nx.DiGraph()
+        for node, wait in self.waits.items():
+            G.add_node(node, **wait)
+            G.add_edges_from((node, peer) for peer in wait["peers"])
+        return G
+
+    def stalled(self, reason, now):
+        """
+        `SimulationStalled` with the current waits and wait-for cycles.
+        """
+        cycles = []
+        for cycle in nx.simple_cycles(self.wait_for_graph()):
+            cycles.append(cycle)
+            if len(cycles) >= self.max_cycles:
+                break
+        waits = {node: self.waits[node] for node in sorted(self.waits, key=node_order)}
+        returned = sorted({peer for wait in waits.values() for peer in wait["peers"] if peer in self.finished}, key=node_order)
+        return SimulationStalled(reason, now, waits, cycles, returned)
+
+
+class FastTimer:
+    """
+    Budget checks of a `Watchdog` as events of the "fast" backend's runtime (see fast_backend.py).
+
+    The events are passive: a run whose only queued events are timers ends (and `Watchdog.check`
+    reports its blocked programs).
+
+    :param network: `fast_backend.FastNetwork` running the watched programs.
+    """
+
+    def __init__(self, network):
+        self.network = network
+
+    def reset(self):
+        pass
+
+    def schedule(self, time, callback):
+        """
+        Call `callback()` at simulated time `time` (ns) of the current run.
+        """
+        self.network.runtime.call_passive(time, callback)
+
+    def finish(self):
+        pass
+
+
+class NetSquidTimer:
+    """
+    Budget checks of a `Watchdog` as NetSquid events of a `pydynaa.Entity`.
+
+    NetSquid cannot tell these events from the ones of the protocol, so `finish` stops the
+    simulation once every watched program has returned.
+    """
+
+    def __init__(self):
+        self._entity = None
+
+    def reset(self):
+        # The entity is created lazily, after the simulator of the run was reset
+        self._entity = None
+
+    def schedule(self, time, callback):
+        """
+        Call `callback()` at simulated time `time` (ns) of the current run.
+        """
+        import netsquid as ns
+
+        if self._entity is None:
+            self._entity = ns.pydynaa.Entity()
+            self._event_type = ns.pydynaa.EventType("WATCHDOG_TIMER", "Watchdog budget check")
+        event = self._entity._schedule_at(max(time, ns.sim_time()), self._event_type)
+        self._entity._wait_once(ns.pydynaa.EventHandler(lambda _: callback()), event=event)
+
+    def finish(self):
+        import netsquid as ns
+
+        if self._entity is not None:
+            ns.sim_stop()
+
+
+def _call_site(filename):
+    """
+    Methods (with line numbers) of the program's module on the current call stack, outermost first.
+    """
+    frame = sys._getframe(2)
+    sites = []
+    while frame is not None:
+        if frame.f_code.co_filename == filename:
+            sites.append(f"{frame.f_code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return " > ".join(reversed(sites))